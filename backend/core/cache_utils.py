@@ -0,0 +1,67 @@
+"""
+本地缓存工具 - 统一缓存目录与 JSON 原子读写
+"""
+import os
+import json
+import hashlib
+import tempfile
+from contextlib import contextmanager
+
+
+def get_cache_dir(*parts):
+    """返回缓存目录（可用环境变量 PYMEDIA_CACHE_DIR 覆盖），不存在时自动创建"""
+    root = os.environ.get('PYMEDIA_CACHE_DIR') or os.path.join(os.path.expanduser('~'), '.pyMediaTools', 'cache')
+    path = os.path.join(root, *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+@contextmanager
+def atomic_writer(path, mode='wb', encoding=None, newline=None):
+    """
+    以临时文件写入，成功后原子替换目标文件，避免进程中断时留下半截文件。
+    newline 与 open() 相同；写 CSV 时传 newline=''，否则 Windows 上会出现 \r\r\n 空行。
+    """
+    directory = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp_')
+    try:
+        with os.fdopen(fd, mode, encoding=encoding, newline=newline) as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def atomic_write_json(path, data):
+    """先写临时文件再替换，避免进程中断时留下半截 JSON"""
+    with atomic_writer(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+
+
+def read_json(path, default=None):
+    """读取 JSON 文件，文件不存在或损坏时返回 default"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def file_signature(path):
+    """文件指纹 (绝对路径, 大小, mtime_ns)，文件不存在时返回 None"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (os.path.realpath(path), st.st_size, st.st_mtime_ns)
+
+
+def signature_cache_path(namespace, signature, suffix, version=1):
+    """按文件指纹生成缓存文件路径：<缓存目录>/<namespace>/<sha1>.<suffix>"""
+    path, size, mtime_ns = signature
+    digest = hashlib.sha1(f"{path}|{size}|{mtime_ns}|{version}".encode('utf-8')).hexdigest()
+    return os.path.join(get_cache_dir(namespace), f"{digest}.{suffix}")
@@ -0,0 +1,226 @@
+"""
+批量 ffmpeg 调度 - 按任务开销分池并发执行，结果保持提交顺序
+
+- 每个任务带开销等级：encode（视频重编码，CPU 占满，少量并发）/ light（抽音频、截图等，大量并发）
+- 每个 ffmpeg 以 -progress pipe:1 运行，按 out_time_us 与预期时长换算单个任务的完成比例
+- 输出文件的时长在工作线程中顺带探测，不再在全部转换完成后串行执行
+- 任务可带回退命令（硬件编码失败时改用软件编码重跑一次）
+- 任一任务失败或被取消时终止正在运行的 ffmpeg，未开始的任务不再执行
+"""
+import os
+import time
+import threading
+import subprocess
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from . import media_probe
+
+COST_ENCODE = 'encode'
+COST_LIGHT = 'light'
+STDERR_TAIL = 200     # 失败时保留的 stderr 末尾行数
+DEFAULT_TIMEOUT = 600.0  # 单个输入、单个输出的命令的超时（秒）
+
+
+def default_workers(cost):
+    """
+    各开销等级的并发数：
+    encode 读取 PYMEDIA_ENCODE_WORKERS，默认 CPU 数 / 4（x264 等编码器自身已多线程）；
+    light 读取 PYMEDIA_LIGHT_WORKERS，默认 CPU 数（最多 16）
+    """
+    cpus = os.cpu_count() or 1
+    if cost == COST_ENCODE:
+        return int(os.environ.get('PYMEDIA_ENCODE_WORKERS', 0)) or max(1, cpus // 4)
+    return int(os.environ.get('PYMEDIA_LIGHT_WORKERS', 0)) or max(1, min(16, cpus))
+
+
+def task_timeout(outputs=1, total_duration=None):
+    """
+    一条命令的超时：合并多个输入或一次输出多路的命令按输出数放大 DEFAULT_TIMEOUT，
+    素材总时长较长时按 0.5 倍速留余量（与 scene_scores._range_timeout 一致）
+    """
+    return max(DEFAULT_TIMEOUT * max(1, outputs), 2.0 * (total_duration or 0.0))
+
+
+def _progress_cmd(cmd):
+    """在 ffmpeg 命令后插入 -progress pipe:1 -nostats，其余参数不变"""
+    return [cmd[0], '-progress', 'pipe:1', '-nostats'] + list(cmd[1:])
+
+
+def run_ffmpeg(cmd, duration=None, progress_callback=None, timeout=DEFAULT_TIMEOUT, stop_event=None):
+    """
+    运行一条 ffmpeg 命令并解析 -progress 输出。
+
+    :param duration: 预期输出时长（秒），用于换算完成比例；未知时只在结束时回调 1.0
+    :param progress_callback: progress_callback(比例 0~1)，在执行 ffmpeg 的线程中调用
+    :param stop_event: 被置位时终止 ffmpeg 并抛出 InterruptedError
+    失败时抛出 subprocess.CalledProcessError / subprocess.TimeoutExpired，与 subprocess.run(check=True) 一致
+    """
+    full_cmd = _progress_cmd(cmd)
+    proc = subprocess.Popen(full_cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE)
+    stderr_tail = deque(maxlen=STDERR_TAIL)
+    reader = threading.Thread(target=lambda: stderr_tail.extend(proc.stderr), daemon=True)
+    reader.start()
+
+    # 超时或取消时由看门狗杀掉进程，主循环阻塞读取 stdout 即可
+    reason = []
+    done_event = threading.Event()
+
+    def _watchdog():
+        deadline = time.monotonic() + timeout if timeout else None
+        while not done_event.wait(0.2):
+            if stop_event is not None and stop_event.is_set():
+                reason.append('stop')
+            elif deadline is not None and time.monotonic() > deadline:
+                reason.append('timeout')
+            else:
+                continue
+            proc.kill()
+            return
+
+    watchdog = threading.Thread(target=_watchdog, daemon=True)
+    watchdog.start()
+    try:
+        for raw in proc.stdout:
+            key, _, value = raw.decode('utf-8', 'replace').strip().partition('=')
+            if key == 'out_time_us' and duration and progress_callback:
+                try:
+                    progress_callback(min(1.0, max(0.0, int(value) / 1e6 / duration)))
+                except ValueError:   # N/A
+                    pass
+        returncode = proc.wait()
+    finally:
+        done_event.set()
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        reader.join(timeout=5)
+        proc.stdout.close()
+        proc.stderr.close()
+
+    stderr = b''.join(stderr_tail)
+    if reason and reason[0] == 'stop':
+        raise InterruptedError("ffmpeg 已终止")
+    if reason and reason[0] == 'timeout':
+        raise subprocess.TimeoutExpired(cmd, timeout, stderr=stderr)
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, cmd, stderr=stderr)
+    if progress_callback:
+        progress_callback(1.0)
+
+
+class ConvertTask:
+    """
+    一条转换命令。
+
+    :param cmd: ffmpeg 命令（不含 -progress 参数）
+    :param output_path: 输出文件路径
+    :param source: 输入文件，duration 为空时用其时长换算进度
+    :param duration: 预期输出时长（秒），如分段导出时的片段长度
+    :param cost: COST_ENCODE / COST_LIGHT
+    :param fallback_cmd: cmd 失败时改用的命令（如软件编码），执行后 fell_back 为 True
+    :param extra_outputs: 同一条命令的其它输出文件（多输入合并命令），结果中紧跟在 output_path 之后
+    :param timeout: 该任务的超时（秒），默认使用 run_tasks 的 timeout；合并命令见 task_timeout
+    """
+
+    def __init__(self, cmd, output_path, source=None, duration=None, cost=COST_ENCODE, fallback_cmd=None,
+                 extra_outputs=(), timeout=None):
+        self.cmd = cmd
+        self.output_path = output_path
+        self.extra_outputs = list(extra_outputs)
+        self.source = source
+        self.duration = duration
+        self.cost = cost
+        self.fallback_cmd = fallback_cmd
+        self.timeout = timeout
+        self.fell_back = False
+
+
+def run_tasks(tasks, workers=None, progress_callback=None, cancel_check=None,
+              probe_output=None, timeout=DEFAULT_TIMEOUT):
+    """
+    并发执行 tasks，按任务顺序返回每个输出文件的 [(输出路径, 输出时长)]。
+
+    :param workers: {开销等级: 并发数}，缺省的等级使用 default_workers()
+    :param progress_callback: progress_callback(完成量, 总数, 说明)，完成量为各任务完成比例之和，
+        在调用线程中执行
+    :param cancel_check: 在调用线程中周期性调用；抛出异常时终止所有 ffmpeg
+    :param probe_output: probe_output(路径) -> 时长，默认 media_probe.get_duration
+    :param timeout: 没有设置 ConvertTask.timeout 的任务使用的超时
+    """
+    probe_output = probe_output or media_probe.get_duration
+    workers = workers or {}
+    total = len(tasks)
+    results = [None] * total
+    fractions = [0.0] * total
+    running = {}          # 任务序号 -> 文件名，用于进度说明
+    stop_event = threading.Event()
+    lock = threading.Lock()
+
+    def _run(i):
+        task = tasks[i]
+        if stop_event.is_set():
+            raise InterruptedError("ffmpeg 已终止")
+        duration = task.duration
+        if duration is None and task.source:
+            duration = media_probe.get_duration(task.source)
+        with lock:
+            running[i] = os.path.basename(task.output_path)
+
+        def _on_progress(fraction):
+            fractions[i] = fraction
+
+        limit = task.timeout or timeout
+
+        try:
+            try:
+                run_ffmpeg(task.cmd, duration, _on_progress, limit, stop_event)
+            except subprocess.CalledProcessError as e:
+                if not task.fallback_cmd:
+                    raise
+                tail = e.stderr.decode('utf-8', 'replace').strip().splitlines()[-1:] if e.stderr else []
+                print(f"[转换] {os.path.basename(task.output_path)} 编码失败，改用回退命令: {' '.join(tail)}")
+                task.fell_back = True
+                fractions[i] = 0.0
+                run_ffmpeg(task.fallback_cmd, duration, _on_progress, limit, stop_event)
+        finally:
+            with lock:
+                running.pop(i, None)
+        return [(path, probe_output(path)) for path in [task.output_path] + task.extra_outputs]
+
+    def _report(done_count):
+        if not progress_callback:
+            return
+        with lock:
+            active = [f"{running[i]} {fractions[i] * 100:.0f}%" for i in sorted(running)]
+        message = ', '.join(active[:3]) + (f" 等 {len(active)} 个" if len(active) > 3 else '')
+        progress_callback(round(sum(fractions), 2), total, message or f"{done_count}/{total}")
+
+    costs = sorted({task.cost for task in tasks})
+    executors = {cost: ThreadPoolExecutor(max_workers=workers.get(cost) or default_workers(cost),
+                                          thread_name_prefix=f"ffmpeg-{cost}")
+                 for cost in costs}
+    futures = {}
+    try:
+        for i, task in enumerate(tasks):
+            futures[executors[task.cost].submit(_run, i)] = i
+        pending = set(futures)
+        done_count = 0
+        while pending:
+            done, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[futures[future]] = future.result()
+                done_count += 1
+            if cancel_check:
+                cancel_check()
+            _report(done_count)
+    except BaseException:
+        stop_event.set()
+        for future in futures:
+            future.cancel()
+        raise
+    finally:
+        for executor in executors.values():
+            executor.shutdown(wait=True)
+    return [item for outputs in results for item in outputs]
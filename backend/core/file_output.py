@@ -0,0 +1,90 @@
+"""
+分类结果输出 - 复制 / 移动 / 硬链接 / reflink / 符号链接 / 仅清单
+
+- hardlink：同一文件系统内零拷贝；跨设备或文件系统不支持时退回复制
+- reflink：写时复制克隆（Linux 用 FICLONE，btrfs / XFS 等；macOS 用 clonefile，APFS），
+  不支持时退回复制，相当于 cp --reflink=auto
+- symlink：指向源文件绝对路径的符号链接
+- manifest：不动文件，只把分组结果写成 JSON 和 CSV
+"""
+import os
+import sys
+import csv
+import errno
+import shutil
+
+from .cache_utils import atomic_writer, atomic_write_json
+
+ACTIONS = ('copy', 'move', 'hardlink', 'reflink', 'symlink', 'manifest')
+MANIFEST_JSON = 'classify_manifest.json'
+MANIFEST_CSV = 'classify_manifest.csv'
+
+_FICLONE = 0x40049409   # linux/fs.h: _IOW(0x94, 9, int)
+
+
+def reflink(src, dst):
+    """写时复制克隆 src 到 dst（dst 不能已存在）；文件系统不支持时抛出 OSError"""
+    if sys.platform.startswith('linux'):
+        import fcntl
+        with open(src, 'rb') as source:
+            fd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+            try:
+                fcntl.ioctl(fd, _FICLONE, source.fileno())
+            except OSError:
+                os.close(fd)
+                os.remove(dst)
+                raise
+            os.close(fd)
+        shutil.copystat(src, dst)
+    elif sys.platform == 'darwin':
+        import ctypes
+        import ctypes.util
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        if libc.clonefile(os.fsencode(src), os.fsencode(dst), 0) != 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), dst)
+    else:
+        raise OSError(errno.EOPNOTSUPP, "当前系统不支持 reflink", dst)
+
+
+def place_file(src, dst, action):
+    """
+    按 action 把 src 放到 dst，返回实际使用的方式（hardlink / reflink 不可用时为 'copy'）。
+    manifest 模式不应调用本函数。
+    """
+    if action == 'move':
+        shutil.move(src, dst)
+        return 'move'
+    if action == 'symlink':
+        os.symlink(os.path.abspath(src), dst)
+        return 'symlink'
+    if action in ('hardlink', 'reflink'):
+        try:
+            if action == 'hardlink':
+                os.link(src, dst)
+            else:
+                reflink(src, dst)
+            return action
+        except OSError as e:
+            if e.errno in (errno.ENOENT, errno.EEXIST):
+                raise
+    shutil.copy2(src, dst)
+    return 'copy'
+
+
+def write_manifest(output_dir, groups):
+    """
+    写出分组清单，返回 (json 路径, csv 路径)。
+    groups 为 [{"group": 序号, "folder": 分组名, "files": [源文件路径, ...]}]
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    json_path = os.path.join(output_dir, MANIFEST_JSON)
+    csv_path = os.path.join(output_dir, MANIFEST_CSV)
+    atomic_write_json(json_path, {"groups": groups})
+    with atomic_writer(csv_path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['group', 'folder', 'file'])
+        for group in groups:
+            for path in group['files']:
+                writer.writerow([group['group'], group['folder'], path])
+    return json_path, csv_path
@@ -1,5 +1,11 @@
 """
 Gladia API 接口 - 从 SW_GenSubTitle/Gladia_API.py 移植
+
+长音频切分后的各段并发上传、轮询（每个 API key 同时进行的段数可配置），
+结果按分段顺序拼接，输出与逐段串行转录一致。
+轮询间隔自适应（短首间隔、指数退避加抖动、遵守 Retry-After），请求复用每线程一个的 requests.Session。
+GLADIA_API_URL 环境变量可指向本地桩服务（见 tests/gladia_stub.py）做离线测量。
+转录结果可按音频文件指纹 + 语种缓存（transcript_cache_path），重新对齐同一音频时不必重复转录。
 """
 import os
 import pathlib
@@ -8,11 +14,15 @@ import json
 import requests
 import time
 import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import platform
 import subprocess
 import random
+from email.utils import parsedate_to_datetime
 from pydub import AudioSegment
 from pydub.silence import detect_silence
+from .cache_utils import atomic_write_json, read_json, file_signature, signature_cache_path
 try:
     from utils import get_ffmpeg_exe
 except ImportError:
@@ -21,28 +31,62 @@ except ImportError:
     def get_ffmpeg_exe():
         return shutil.which('ffmpeg') or 'ffmpeg'
 
-GLADIA_API_URL = "https://api.gladia.io/audio/text/audio-transcription/"
+GLADIA_API_URL = os.environ.get('GLADIA_API_URL', "https://api.gladia.io/audio/text/audio-transcription/")
+POLL_FIRST_INTERVAL = 1.0    # 第一次轮询前的等待（秒）
+POLL_BACKOFF = 1.6           # 每次轮询后等待时间的增长倍数
+POLL_JITTER = 0.2            # 等待时间的随机浮动比例，避免并发分段同时请求
+TRANSCRIPT_CACHE_VERSION = 1
 
-API_keys = []
-cur_api_key = ""
+_local = threading.local()
 
 
-def get_next_api_key():
-    """获取下一个API key"""
-    global API_keys, cur_api_key
+def _session():
+    """当前线程的 requests.Session，上传与轮询复用连接（Session 不保证线程安全，故每线程一个）"""
+    session = getattr(_local, 'session', None)
+    if session is None:
+        session = _local.session = requests.Session()
+    return session
+
+
+def default_concurrency():
+    """每个 API key 同时转录的分段数：读取 PYMEDIA_GLADIA_CONCURRENCY，默认 3"""
+    return max(1, int(os.environ.get('PYMEDIA_GLADIA_CONCURRENCY', 0)) or 3)
+
+
+_key_slots = {}
+_key_slots_lock = threading.Lock()
 
-    if len(API_keys) == 0:
-        return ""
-    
-    if cur_api_key == "":
-        return API_keys[0]
-    
-    cur_index = API_keys.index(cur_api_key)
-    next_index = cur_index + 1
-    if next_index < len(API_keys):
-        return API_keys[next_index]
-    
-    return ""
+
+def _key_slot(api_key):
+    """API key 对应的信号量：进程内所有转录调用（包括并发的字幕任务）共享，限制同一 key 的并发请求数"""
+    with _key_slots_lock:
+        slot = _key_slots.get(api_key)
+        if slot is None:
+            slot = _key_slots[api_key] = threading.BoundedSemaphore(default_concurrency())
+        return slot
+
+
+class KeyRotation:
+    """
+    一次转录调用的 API key 轮换状态。每次调用各自创建，并发任务之间互不影响；
+    同一调用内并发的分段共享此对象，切换 key 时加锁。
+    """
+
+    def __init__(self, api_keys):
+        self.keys = list(api_keys or [])
+        self.current = self.keys[0] if self.keys else ""
+        self._lock = threading.Lock()
+
+    def switch(self, exhausted_key):
+        """
+        exhausted_key 达到限制时切换到下一个 key 并返回（没有可用 key 时返回空串）。
+        多个分段同时发现同一个 key 达到限制时只切换一次，其余直接使用已切换的 key。
+        """
+        with self._lock:
+            if self.current == exhausted_key:
+                index = self.keys.index(exhausted_key) + 1 if exhausted_key in self.keys else len(self.keys)
+                self.current = self.keys[index] if index < len(self.keys) else ""
+            return self.current
 
 
 # 支持的语言
@@ -163,10 +207,11 @@ def split_audio_on_silence(audio_path, output_dir, min_minutes=20.0, max_minutes
 
 def transcribe_local_audio(file_path, api_key="", language_behaviour="automatic single language",
                            language="", diarization=False, toggle_word_timestamps=False,
-                           output_format="json"):
-    """转录本地音频文件"""
-    global cur_api_key
-    
+                           output_format="json", rotation=None):
+    """转录本地音频文件
+
+    :param rotation: KeyRotation，api_key 达到限制时从中切换下一个 key 重试；不传则不重试
+    """
     if language_behaviour == "manual" and language == "":
         language_behaviour = "automatic single language"
     
@@ -176,90 +221,124 @@ def transcribe_local_audio(file_path, api_key="", language_behaviour="automatic
         
     headers = {"x-gladia-key": api_key}
     file_name = os.path.basename(file_path)
-    
-    try:
-        with open(file_path, 'rb') as f:
-            files = {'audio': (file_name, f, 'audio/mpeg')}
-            payload = {
-                "language_behaviour": language_behaviour,
-                "diarization": str(diarization).lower(),
-                "toggle_word_timestamps": str(toggle_word_timestamps).lower(),
-                "output_format": output_format,
-                "language": language
-            }
-            if diarization:
-                payload["diarization_max_speakers"] = 2
-                
-            print(f"\n正在上传并转录本地文件: {file_path} (单词时间戳: {toggle_word_timestamps})...")
-            response = requests.post(GLADIA_API_URL, headers=headers, files=files, data=payload)
-            
-            if 200 <= response.status_code < 300:
-                result_json = response.json()
-                if 'prediction' in result_json or ('output' in result_json and output_format != "json"):
-                    return result_json
-                elif 'result_url' in result_json:
-                    result_url = result_json['result_url']
-                    print(f"文件已提交进行异步处理。结果 URL: {result_url}")
-                    return poll_for_result(result_url, api_key)
+    next_api_key = ""
+
+    # 同一 key 同时进行的上传+轮询数受 _key_slot 限制（跨调用共享）；切换 key 重试前先释放
+    with _key_slot(api_key):
+        try:
+            with open(file_path, 'rb') as f:
+                files = {'audio': (file_name, f, 'audio/mpeg')}
+                payload = {
+                    "language_behaviour": language_behaviour,
+                    "diarization": str(diarization).lower(),
+                    "toggle_word_timestamps": str(toggle_word_timestamps).lower(),
+                    "output_format": output_format,
+                    "language": language
+                }
+                if diarization:
+                    payload["diarization_max_speakers"] = 2
+
+                print(f"\n正在上传并转录本地文件: {file_path} (单词时间戳: {toggle_word_timestamps})...")
+                response = _session().post(GLADIA_API_URL, headers=headers, files=files, data=payload)
+
+                if 200 <= response.status_code < 300:
+                    result_json = response.json()
+                    if 'prediction' in result_json or ('output' in result_json and output_format != "json"):
+                        return result_json
+                    elif 'result_url' in result_json:
+                        result_url = result_json['result_url']
+                        print(f"文件已提交进行异步处理。结果 URL: {result_url}")
+                        return poll_for_result(result_url, api_key)
+                    else:
+                        print("API 响应中未找到 'prediction'/'output' 或 'result_url'。")
+                        print(json.dumps(result_json, indent=2, ensure_ascii=False))
+                        return None
                 else:
-                    print("API 响应中未找到 'prediction'/'output' 或 'result_url'。")
-                    print(json.dumps(result_json, indent=2, ensure_ascii=False))
-                    return None
-            else:
-                print(f"API 请求错误: {response.status_code}")
-                try:
-                    error_info = response.json()
-                    print("错误详情:", error_info)
-                    message = error_info.get("message", "")
-
-                    if "limit exceeded" in message:
-                        print("Gladia达到限制，切换下一个api key重试。")
-                        cur_api_key = get_next_api_key()
-                        if cur_api_key == "":
-                            print("无可用api key，无法继续。")
-                        else:
-                            return transcribe_local_audio(
-                                file_path,
-                                api_key=cur_api_key,
-                                language_behaviour="manual",
-                                language=language,
-                                diarization=False,
-                                toggle_word_timestamps=True,
-                                output_format="json"
-                            )
-                except json.JSONDecodeError:
-                    print("错误详情 (非JSON):", response.text)
-                return None
-    except Exception as e:
-        print(f"发生意外错误: {e}")
+                    print(f"API 请求错误: {response.status_code}")
+                    try:
+                        error_info = response.json()
+                        print("错误详情:", error_info)
+                        message = error_info.get("message", "")
+
+                        if "limit exceeded" in message:
+                            print("Gladia达到限制，切换下一个api key重试。")
+                            next_api_key = rotation.switch(api_key) if rotation else ""
+                            if next_api_key == "":
+                                print("无可用api key，无法继续。")
+                    except json.JSONDecodeError:
+                        print("错误详情 (非JSON):", response.text)
+        except Exception as e:
+            print(f"发生意外错误: {e}")
+            return None
+
+    if next_api_key == "":
+        return None
+    return transcribe_local_audio(
+        file_path,
+        api_key=next_api_key,
+        language_behaviour="manual",
+        language=language,
+        diarization=False,
+        toggle_word_timestamps=True,
+        output_format="json",
+        rotation=rotation
+    )
+
+
+def _retry_after(response):
+    """Retry-After 响应头（秒数或 HTTP 日期）对应的等待秒数，没有或无法解析时返回 None"""
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
         return None
 
 
 def poll_for_result(result_url, api_key, poll_interval_seconds=10, max_attempts=60):
-    """轮询异步任务结果"""
+    """
+    轮询异步任务结果。
+
+    等待间隔从 POLL_FIRST_INTERVAL 起按 POLL_BACKOFF 倍增长（带 ±POLL_JITTER 抖动），上限 poll_interval_seconds；
+    服务端给出 Retry-After 时按其等待。总等待时长不超过 poll_interval_seconds * max_attempts。
+    """
     headers = {"x-gladia-key": api_key, "Accept": "application/json"}
     print(f"开始轮询结果 URL: {result_url}")
-    
-    for attempt in range(max_attempts):
-        print(f"轮询尝试 {attempt + 1}/{max_attempts}...")
+    deadline = time.monotonic() + poll_interval_seconds * max_attempts
+    interval = min(POLL_FIRST_INTERVAL, poll_interval_seconds)
+    delay = interval * random.uniform(1 - POLL_JITTER, 1 + POLL_JITTER)
+    attempt = 0
+
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        time.sleep(min(delay, remaining))
+        attempt += 1
+        interval = min(interval * POLL_BACKOFF, poll_interval_seconds)
+        delay = interval * random.uniform(1 - POLL_JITTER, 1 + POLL_JITTER)
+        print(f"轮询尝试 {attempt}...")
         try:
-            response = requests.get(result_url, headers=headers)
+            response = _session().get(result_url, headers=headers)
             if response.status_code == 200:
                 result_json = response.json()
                 status = result_json.get('status', '').lower()
                 if ('prediction' in result_json or 'output' in result_json) and (status == 'done' or not status):
                     print("异步转录完成！")
                     return result_json
-                elif status == 'processing':
-                    print(f"状态: {status}. 等待 {poll_interval_seconds} 秒后重试...")
                 elif status == 'error':
                     print("转录任务出错。")
                     print(json.dumps(result_json, indent=2, ensure_ascii=False))
                     return None
                 else:
-                    print(f"当前状态: '{status}'. 等待 {poll_interval_seconds} 秒后重试...")
-            elif response.status_code == 202:
-                print(f"服务器接受请求，仍在处理 (状态码 {response.status_code})。等待 {poll_interval_seconds} 秒后重试...")
+                    print(f"当前状态: '{status}'，稍后重试...")
+            elif response.status_code in (202, 429, 503):
+                print(f"服务器仍在处理或请求过多 (状态码 {response.status_code})，稍后重试...")
             else:
                 print(f"轮询时发生错误: {response.status_code}")
                 try:
@@ -267,10 +346,12 @@ def poll_for_result(result_url, api_key, poll_interval_seconds=10, max_attempts=
                 except json.JSONDecodeError:
                     print("错误详情 (非JSON):", response.text)
                 return None
+            retry_after = _retry_after(response)
+            if retry_after is not None:
+                delay = retry_after
         except requests.exceptions.RequestException as e:
             print(f"轮询时发生网络错误: {e}")
-        time.sleep(poll_interval_seconds)
-    print("已达到最大轮询次数，转录可能仍在进行中或已失败。")
+    print("已达到最长轮询时间，转录可能仍在进行中或已失败。")
     return None
 
 
@@ -317,25 +398,80 @@ def get_json_result(transcribe_result, last_result, full_text, start_time):
     return False
 
 
-def transcribe_audio_from_gladia(media_path, api_keys, language, json_path, txt_path, min_minutes=5.0):
-    """通过Gladia转录音频的对外接口"""
+def _transcribe_segment(audio_segm_path, language, rotation):
+    """转录单个分段，失败时最多重试 3 次；每次重试使用当前（可能已切换的）API key"""
+    result_word_ts = None
+    for i in range(3):
+        if rotation.current == "":
+            break
+        result_word_ts = transcribe_local_audio(
+            audio_segm_path,
+            api_key=rotation.current,
+            language_behaviour="manual",
+            language=language,
+            diarization=False,
+            toggle_word_timestamps=True,
+            output_format="json",
+            rotation=rotation
+        )
+
+        if result_word_ts:
+            break
+        else:
+            print(f"转录失败，自动重试{i}")
+    return result_word_ts
+
+
+def transcript_cache_path(media_path, language):
+    """转录结果的缓存文件：按音频文件指纹（路径、大小、修改时间）与语种区分，文件不存在时返回 None"""
+    signature = file_signature(media_path)
+    if signature is None:
+        return None
+    return signature_cache_path('transcripts', signature, f"{language}.json", TRANSCRIPT_CACHE_VERSION)
+
+
+def load_cached_transcript(cache_path, json_path, txt_path):
+    """缓存命中时写出与 transcribe_audio_from_gladia 相同的 json / txt 文件，返回是否命中"""
+    data = read_json(cache_path) if cache_path else None
+    if not isinstance(data, dict) or not isinstance(data.get("utterances"), list):
+        return False
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(data["utterances"], f, indent=2, ensure_ascii=False)
+    with open(txt_path, 'w', encoding='utf-8') as f:
+        f.write(data.get("text", ""))
+    return True
+
+
+def save_cached_transcript(cache_path, json_path, txt_path):
+    """把 transcribe_audio_from_gladia 写出的 json / txt 存入缓存；原子替换，并发任务不会读到半截文件"""
+    if not cache_path:
+        return
+    with open(json_path, 'r', encoding='utf-8') as f:
+        utterances = json.load(f)
+    with open(txt_path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    atomic_write_json(cache_path, {"utterances": utterances, "text": text})
+
+
+def transcribe_audio_from_gladia(media_path, api_keys, language, json_path, txt_path, min_minutes=5.0,
+                                 work_dir=None, max_concurrency=None):
+    """通过Gladia转录音频的对外接口
+
+    :param work_dir: 提取/切分音频的临时目录，并发任务应各自传入独立目录
+    :param max_concurrency: 本次调用同时转录的分段数，默认 default_concurrency()；
+                            同一 key 在所有调用间的并发另受 default_concurrency() 限制
+    """
     print(language)
     if language not in languages:
         print(f"不支持的语种 {language}")
         yield f"不支持的语种 {language}"
         return None
     
-    output_path = "./gladia_tmp"
-
-    global API_keys, cur_api_key
-    API_keys = api_keys
-    if cur_api_key == "":
-        cur_api_key = get_next_api_key()
-    elif cur_api_key not in API_keys:
-        cur_api_key = ""
-        cur_api_key = get_next_api_key()
-        
-    if cur_api_key == "":
+    output_path = work_dir or "./gladia_tmp"
+
+    # key 轮换状态只属于本次调用，并发的字幕任务各自从自己的 key 列表开始
+    rotation = KeyRotation(api_keys)
+    if rotation.current == "":
         print("无可用Gladia Key")
         yield "无可用Gladia Key，请添加Gladia key。"
         raise RuntimeError("无可用Gladia Key，请添加Gladia key。")
@@ -354,49 +490,56 @@ def transcribe_audio_from_gladia(media_path, api_keys, language, json_path, txt_
     print("切分音频")
     yield "切分音频"
     audios_list = split_audio_on_silence(audio_path, output_path, min_minutes=min_minutes)
+    if not audios_list:
+        print("音频为空，没有可转录的分段")
+        yield "音频为空，没有可转录的分段"
+        raise RuntimeError("音频为空，没有可转录的分段")
     
-    # 开始转录
+    # 各段的起始时间为前面各段时长之和（与逐段累加的顺序相同，浮点结果一致）
+    start_times = []
     cur_start_time = 0
-    last_result = []
-    full_text_list = []
-    print("开始转录音频")
+    for _, duration in audios_list:
+        start_times.append(cur_start_time)
+        cur_start_time += duration
+
+    # 开始转录：各段并发提交，完成一段即解析一段，最后按分段顺序拼接
+    segment_results = [[] for _ in audios_list]
+    segment_texts = [[] for _ in audios_list]
+    workers = min(max_concurrency or default_concurrency(), len(audios_list))
+    print(f"开始转录音频（{len(audios_list)} 段，并发 {workers}）")
     yield "开始转录音频"
-    cur_index = 1
-    
     for audio_segm_path, duration in audios_list:
         print(f"{audio_segm_path}: {duration:.1f} 秒")
-        yield f"{audio_segm_path}: {cur_index}/{len(audios_list)}"
-        cur_index += 1
-        result_word_ts = None
-        
-        for i in range(3):
-            result_word_ts = transcribe_local_audio(
-                audio_segm_path,
-                api_key=cur_api_key,
-                language_behaviour="manual",
-                language=language,
-                diarization=False,
-                toggle_word_timestamps=True,
-                output_format="json"
-            )
-
-            if result_word_ts:
-                break
-            else:
-                print(f"转录失败，自动重试{i}")
-                
-        if result_word_ts:
-            ret = get_json_result(result_word_ts, last_result, full_text_list, cur_start_time)
-            if not ret:
-                print("转录结果有问题")
-                yield "转录结果有问题"
-                raise RuntimeError("转录结果有问题")
-        else:
-            print("转录失败----")
-            yield "转录失败----"
-            raise RuntimeError("转录失败----")
-            
-        cur_start_time += duration
+
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="gladia")
+    futures = {executor.submit(_transcribe_segment, path, language, rotation): index
+               for index, (path, _) in enumerate(audios_list)}
+    try:
+        pending = set(futures)
+        done_count = 0
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = futures[future]
+                result_word_ts = future.result()
+                if not result_word_ts:
+                    print("转录失败----")
+                    yield "转录失败----"
+                    raise RuntimeError("转录失败----")
+                ret = get_json_result(result_word_ts, segment_results[index], segment_texts[index],
+                                      start_times[index])
+                if not ret:
+                    print("转录结果有问题")
+                    yield "转录结果有问题"
+                    raise RuntimeError("转录结果有问题")
+                done_count += 1
+                yield f"{audios_list[index][0]}: {done_count}/{len(audios_list)}"
+    finally:
+        # 出错或调用方不再迭代（如任务取消）时，尚未开始的分段不再上传
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    last_result = [part for parts in segment_results for part in parts]
+    full_text_list = [word for words in segment_texts for word in words]
     
     # 直接保存最终的json和txt文件
     with open(json_path, 'w', encoding='utf-8') as f:
@@ -0,0 +1,372 @@
+"""
+汉明距离计算引擎 - 哈希以 uint64 NumPy 数组保存，XOR + popcount 按块向量化
+
+- popcount 优先使用 np.bitwise_count（NumPy 2.0+），否则用 16 位查找表
+- 阈值 0 按哈希值分组；小规模集合按块暴力计算上三角；大规模集合用向量化的多索引哈希生成候选对，
+  估算代价不低于暴力比较时仍按块暴力比较
+- 连通分量用标签传播（每个分量的标签收敛为其中最小的序号），结果与
+  hash_index.cluster_hashes / 旧的两两比较完全一致
+- 视频多帧指纹按逐帧距离的中位数聚类（cluster_fingerprints）
+
+基准测试：python -m core.hamming [数量,...]
+"""
+import sys
+import math
+import time
+
+import numpy as np
+
+from .hash_index import _comb
+
+BRUTE_FORCE_MAX = 8192        # 不超过该数量时直接按块暴力比较
+BLOCK_ELEMENTS = 1 << 22      # 每块距离矩阵的元素数上限（约 4M，uint64 约 32MB）
+PAIR_CHUNK = 1 << 22          # 多索引候选对每批展开的数量上限
+VERIFY_CHUNK = 1 << 18        # 指纹候选对每批校验的数量上限（每对 N 个 uint64）
+MAX_BAND_BITS = 22            # 稠密桶起点表的最大段宽（4M 项）
+CANDIDATE_COST = 4.0          # 展开并校验一个候选对相对一次查表的代价
+BRUTE_FORCE_COST = 0.5        # 暴力比较一对哈希相对一次查表的代价（按块向量化，实测约为一半）
+
+_HAS_BITWISE_COUNT = hasattr(np, 'bitwise_count')
+_LUT16 = None
+
+
+def _lut16():
+    global _LUT16
+    if _LUT16 is None:
+        table = np.zeros(1 << 16, dtype=np.uint8)
+        for bit in range(16):
+            table[1 << bit:1 << (bit + 1)] = table[:1 << bit] + 1
+        _LUT16 = table
+    return _LUT16
+
+
+def popcount64(values):
+    """uint64 数组逐元素 popcount，返回 uint8 数组"""
+    values = np.ascontiguousarray(values, dtype=np.uint64)
+    if _HAS_BITWISE_COUNT:
+        return np.bitwise_count(values)
+    parts = values.view(np.uint16).reshape(values.shape + (4,))
+    return _lut16()[parts].sum(axis=-1, dtype=np.uint8)
+
+
+def to_uint64(hashes):
+    """Python 整数哈希列表 -> uint64 数组"""
+    return np.array([int(h) & 0xFFFFFFFFFFFFFFFF for h in hashes], dtype=np.uint64)
+
+
+def _compress(labels):
+    """指针跳跃，使每个元素直接指向所在树的根"""
+    while True:
+        parents = labels[labels]
+        if np.array_equal(parents, labels):
+            return labels
+        labels[:] = parents
+
+
+def _merge(labels, a, b):
+    """把成对的元素 (a[k], b[k]) 合并到同一分量；根始终是分量中较小的序号"""
+    while len(a):
+        la, lb = labels[a], labels[b]
+        diff = la != lb
+        if not diff.any():
+            return
+        a, b, la, lb = a[diff], b[diff], la[diff], lb[diff]
+        low = np.minimum(la, lb)
+        np.minimum.at(labels, la, low)
+        np.minimum.at(labels, lb, low)
+        _compress(labels)
+
+
+class HammingEngine:
+    """
+    一组 64 位哈希的距离计算。
+
+    :param hashes: Python 整数列表或 uint64 数组
+    """
+
+    def __init__(self, hashes):
+        if isinstance(hashes, np.ndarray):
+            self.hashes = np.ascontiguousarray(hashes, dtype=np.uint64)
+        else:
+            self.hashes = to_uint64(hashes)
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def distances(self, h):
+        """单个哈希到全部哈希的距离（一次数组运算）"""
+        return popcount64(self.hashes ^ np.uint64(int(h) & 0xFFFFFFFFFFFFFFFF))
+
+    def row(self, i):
+        """第 i 个哈希到全部哈希的距离"""
+        return popcount64(self.hashes ^ self.hashes[i])
+
+    def brute_force_pairs(self, threshold):
+        """按块暴力比较上三角，逐块产出距离 <= threshold 的 (i, j) 数组（i < j）"""
+        n = len(self.hashes)
+        rows = max(1, BLOCK_ELEMENTS // max(n, 1))
+        for start in range(0, n, rows):
+            block = self.hashes[start:start + rows]
+            dist = popcount64(block[:, None] ^ self.hashes[None, start:])
+            i, j = np.nonzero(dist <= threshold)
+            j = j + start
+            i = i + start
+            keep = i < j
+            if keep.any():
+                yield i[keep], j[keep]
+
+    def exact_pairs(self):
+        """阈值为 0：按哈希值分组，产出值完全相同的 (i, j)（i < j）"""
+        order = np.argsort(self.hashes, kind='stable')
+        values = self.hashes[order]
+        boundaries = np.flatnonzero(values[1:] != values[:-1]) + 1
+        runs = np.split(order, boundaries)
+        for gap in range(1, max((len(run) for run in runs), default=0)):
+            # 同一组内相隔 gap 个位置的两两组合，按 gap 逐批展开
+            a = [run[:-gap] for run in runs if len(run) > gap]
+            b = [run[gap:] for run in runs if len(run) > gap]
+            a, b = np.concatenate(a), np.concatenate(b)
+            yield np.minimum(a, b), np.maximum(a, b)
+
+    def multi_index_pairs(self, threshold, labels=None, num_bands=None):
+        """
+        向量化多索引哈希：每段对全部哈希批量查表，产出距离 <= threshold 的 (i, j)。
+        段宽不超过 MAX_BAND_BITS 时按键排序后建一张稠密的桶起点表，查表只是两次数组索引；
+        更宽的段（小阈值时）在排序后的键上二分查找桶的起止位置。
+        传入 labels 时跳过已在同一分量中的候选，减少校验量。
+        """
+        n = len(self.hashes)
+        m = num_bands or choose_vector_bands(n, threshold)
+        radius = threshold // m
+        widths = [64 // m + (1 if k < 64 % m else 0) for k in range(m)]
+        all_idx = np.arange(n, dtype=np.int64)
+        shift = 0
+        for width in widths:
+            mask = np.uint64((1 << width) - 1) if width < 64 else np.uint64(0xFFFFFFFFFFFFFFFF)
+            keys = (self.hashes >> np.uint64(shift)) & mask
+            shift += width
+            order = np.argsort(keys, kind='stable')
+            if width <= MAX_BAND_BITS:
+                keys = keys.astype(np.int64)
+                starts = np.zeros((1 << width) + 1, dtype=np.int64)
+                np.cumsum(np.bincount(keys, minlength=1 << width), out=starts[1:])
+            else:
+                sorted_keys = keys[order]
+            for flip in _flip_masks(width, radius):
+                if width <= MAX_BAND_BITS:
+                    query = keys ^ flip
+                    lo = starts[query]
+                    counts = starts[query + 1] - lo
+                else:
+                    query = keys ^ np.uint64(flip)
+                    lo = np.searchsorted(sorted_keys, query, side='left')
+                    counts = np.searchsorted(sorted_keys, query, side='right') - lo
+                nonzero = np.flatnonzero(counts)
+                if not len(nonzero):
+                    continue
+                # 按批展开候选对，避免一次性占用过多内存
+                cum = np.cumsum(counts[nonzero])
+                start_pos = 0
+                while start_pos < len(nonzero):
+                    base = cum[start_pos - 1] if start_pos else 0
+                    end_pos = int(np.searchsorted(cum, base + PAIR_CHUNK, side='right'))
+                    end_pos = max(end_pos, start_pos + 1)
+                    sel = nonzero[start_pos:end_pos]
+                    start_pos = end_pos
+                    c = counts[sel]
+                    total = int(c.sum())
+                    qi = np.repeat(all_idx[sel], c)
+                    offsets = np.arange(total, dtype=np.int64) - np.repeat(np.cumsum(c) - c, c)
+                    cj = order[np.repeat(lo[sel], c) + offsets]
+                    # 每对候选会从两端各查到一次，只保留 i < j 的一半
+                    keep = qi < cj
+                    if labels is not None:
+                        keep &= labels[qi] != labels[cj]
+                    qi, cj = qi[keep], cj[keep]
+                    if not len(qi):
+                        continue
+                    close = popcount64(self.hashes[qi] ^ self.hashes[cj]) <= threshold
+                    if close.any():
+                        yield qi[close], cj[close]
+
+    def pairs(self, threshold, labels=None):
+        """
+        距离 <= threshold 的 (i, j) 数组：阈值 0 按值分组；小规模或估算代价不低于
+        暴力比较时按块暴力比较，否则用多索引哈希
+        """
+        n = len(self.hashes)
+        if threshold <= 0:
+            return self.exact_pairs()
+        if n <= BRUTE_FORCE_MAX:
+            return self.brute_force_pairs(threshold)
+        m, cost = _band_plan(n, threshold)
+        if cost >= BRUTE_FORCE_COST * n * n / 2.0:
+            return self.brute_force_pairs(threshold)
+        return self.multi_index_pairs(threshold, labels=labels, num_bands=m)
+
+    def component_labels(self, threshold):
+        """连通分量标签：距离 <= threshold 的哈希相连，标签为分量中最小的序号"""
+        n = len(self.hashes)
+        labels = np.arange(n, dtype=np.int64)
+        if n < 2:
+            return labels
+        for a, b in self.pairs(threshold, labels):
+            _merge(labels, a, b)
+        return _compress(labels)
+
+
+def _band_plan(n, threshold, bits=64):
+    """
+    估算最优分段数及其代价 (m, cost)：每个翻转组合都要对全部哈希查一次表（代价 n，
+    超过 MAX_BAND_BITS 的宽段改为二分查找，代价乘以 log2 n），加上落入桶中的候选展开校验。
+    """
+    best = None
+    lookup_sparse = math.log2(max(n, 2))
+    for m in range(1, min(bits, threshold + 1) + 1):
+        width = bits // m + (1 if bits % m else 0)
+        radius = threshold // m
+        keys = sum(_comb(bits // m, k) for k in range(radius + 1))
+        lookup = 1.0 if width <= MAX_BAND_BITS else lookup_sparse
+        cost = m * keys * n * (lookup + CANDIDATE_COST * n / float(2 ** (bits // m)))
+        if best is None or cost < best[1]:
+            best = (m, cost)
+    return best
+
+
+def choose_vector_bands(n, threshold, bits=64):
+    """向量化查询的分段数（见 _band_plan）"""
+    return _band_plan(n, max(threshold, 0), bits)[0]
+
+
+def _flip_masks(width, radius):
+    from itertools import combinations
+    masks = [0]
+    for r in range(1, radius + 1):
+        for positions in combinations(range(width), r):
+            mask = 0
+            for p in positions:
+                mask |= 1 << p
+            masks.append(mask)
+    return masks
+
+
+def _groups(unique_labels, inverse, n):
+    """去重后的分量标签 -> 原始序号分组（各组按首个成员排序，组内升序）"""
+    component = unique_labels[inverse]
+    # 分量代表取原始序号中的最小值，保证分组顺序与逐个比较的结果一致
+    first = np.full(len(unique_labels), n, dtype=np.int64)
+    np.minimum.at(first, component, np.arange(n, dtype=np.int64))
+    labels = first[component]
+    order = np.argsort(labels, kind='stable')
+    boundaries = np.flatnonzero(np.diff(labels[order])) + 1
+    return [group.tolist() for group in np.split(order, boundaries)]
+
+
+def cluster_hashes(hashes, threshold):
+    """
+    与 hash_index.cluster_hashes 相同的聚类结果（各组按首个成员排序，组内升序），
+    完全相同的哈希先去重，只对去重后的哈希计算。
+    """
+    values = hashes if isinstance(hashes, np.ndarray) else to_uint64(hashes)
+    n = len(values)
+    if n == 0:
+        return []
+    unique, inverse = np.unique(values, return_inverse=True)
+    unique_labels = HammingEngine(unique).component_labels(threshold)
+    return _groups(unique_labels, inverse.reshape(-1), n)
+
+
+def fingerprint_distances(a, b):
+    """两组等长指纹 (m, N) 的逐帧距离的下中位数"""
+    dist = popcount64(a ^ b)
+    k = (dist.shape[1] - 1) // 2
+    return np.partition(dist, k, axis=1)[:, k]
+
+
+def cluster_fingerprints(fingerprints, threshold):
+    """
+    多帧指纹聚类：两个指纹逐帧（同一采样位置）比较，距离的下中位数 <= threshold 即相连。
+    图片的指纹为同一哈希重复 N 次，因此只有图片时结果与 cluster_hashes 相同。
+
+    中位数 <= t 意味着至少 need = ceil(N/2) 个位置的距离 <= t，由抽屉原理，前
+    N - need + 1 个位置中必有一个满足，只需在这些列上用单哈希引擎找候选，再整体校验。
+    """
+    matrix = np.ascontiguousarray(fingerprints, dtype=np.uint64)
+    n = len(matrix)
+    if n == 0:
+        return []
+    unique, inverse = np.unique(matrix, axis=0, return_inverse=True)
+    frames = unique.shape[1]
+    need = (frames - 1) // 2 + 1
+    labels = np.arange(len(unique), dtype=np.int64)
+    if len(unique) > 1:
+        for column in range(frames - need + 1):
+            engine = HammingEngine(unique[:, column])
+            for a, b in engine.pairs(threshold, labels):
+                for start in range(0, len(a), VERIFY_CHUNK):
+                    qa, qb = a[start:start + VERIFY_CHUNK], b[start:start + VERIFY_CHUNK]
+                    fresh = labels[qa] != labels[qb]
+                    qa, qb = qa[fresh], qb[fresh]
+                    if not len(qa):
+                        continue
+                    close = fingerprint_distances(unique[qa], unique[qb]) <= threshold
+                    if close.any():
+                        _merge(labels, qa[close], qb[close])
+    return _groups(_compress(labels), inverse.reshape(-1), n)
+
+
+def _python_loop_pairs(hashes, threshold):
+    """旧实现：Python 整数两两比较（仅用于基准对比）"""
+    count = 0
+    n = len(hashes)
+    for i in range(n):
+        for j in range(i + 1, n):
+            if bin(hashes[i] ^ hashes[j]).count('1') <= threshold:
+                count += 1
+    return count
+
+
+def _benchmark(sizes, threshold=10):
+    import random
+    from . import hash_index
+    random.seed(0)
+    print(f"NumPy {np.__version__}, bitwise_count={'是' if _HAS_BITWISE_COUNT else '否（使用查找表）'}, 阈值={threshold}")
+    for n in sizes:
+        centers = [random.getrandbits(64) for _ in range(max(1, n // 20))]
+        hashes = []
+        for _ in range(n):
+            if random.random() < 0.5:
+                hashes.append(random.getrandbits(64))
+            else:
+                h = random.choice(centers)
+                for _ in range(random.randint(0, 8)):
+                    h ^= 1 << random.randrange(64)
+                hashes.append(h)
+
+        line = [f"n={n:<7d}"]
+        if n <= 5000:
+            started = time.time()
+            _python_loop_pairs(hashes, threshold)
+            line.append(f"Python 两两比较={time.time() - started:7.2f}s")
+        if n <= 20000:
+            started = time.time()
+            expected = hash_index.cluster_hashes(hashes, threshold)
+            line.append(f"多索引(纯 Python)={time.time() - started:7.2f}s")
+        else:
+            expected = None
+        started = time.time()
+        groups = cluster_hashes(hashes, threshold)
+        line.append(f"NumPy 引擎={time.time() - started:7.2f}s")
+        engine = HammingEngine(hashes)
+        started = time.time()
+        for i in range(min(n, 1000)):
+            engine.row(i)
+        line.append(f"单行距离={(time.time() - started) / min(n, 1000) * 1000:6.3f}ms")
+        if expected is not None:
+            line.append(f"结果一致={groups == expected}")
+        print("  ".join(line))
+
+
+if __name__ == '__main__':
+    counts = [int(x) for x in sys.argv[1].split(',')] if len(sys.argv) > 1 else [2000, 5000, 20000, 100000]
+    _benchmark(counts)
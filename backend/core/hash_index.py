@@ -0,0 +1,175 @@
+"""
+感知哈希近邻索引 - 多索引哈希 (Multi-Index Hashing)
+
+把 64 位哈希切成 m 段，每段建一个倒排表。若两个哈希的汉明距离 <= t，
+由抽屉原理，至少有一段的距离 <= floor(t / m)；查询时只需在每段枚举
+该半径内的翻转组合去查表，再对候选做完整距离校验，避免 O(n²) 两两比较。
+
+纯 Python 实现适合小阈值：10 万个随机哈希在阈值 5 时约 1 秒，阈值 10 时约 30 秒、
+阈值 12 时超过 3 分钟。大阈值请使用 NumPy 引擎 core.hamming，此处仅作无 numpy 时的后备。
+"""
+from itertools import combinations
+
+try:
+    _popcount = int.bit_count          # Python 3.10+
+except AttributeError:                 # pragma: no cover
+    def _popcount(x):
+        return bin(x).count('1')
+
+SLOW_THRESHOLD = 10       # 阈值不低于该值且哈希数不少于 SLOW_SIZE 时纯 Python 聚类明显变慢
+SLOW_SIZE = 20000
+
+
+def hamming_distance(h1, h2):
+    """两个整数哈希的汉明距离"""
+    return _popcount(h1 ^ h2)
+
+
+def _comb(n, k):
+    result = 1
+    for i in range(k):
+        result = result * (n - i) // (i + 1)
+    return result
+
+
+def choose_bands(n, threshold, bits=64):
+    """
+    按代价估算选择分段数：每次查询的代价 ≈ 枚举的键数 + 随机哈希落入这些键的期望候选数。
+    """
+    best = None
+    for m in range(1, min(bits, threshold + 1) + 1):
+        width = bits // m
+        radius = threshold // m
+        keys = sum(_comb(width, k) for k in range(radius + 1))
+        candidates = n * keys / float(2 ** width)
+        cost = m * (keys + candidates)
+        if best is None or cost < best[0]:
+            best = (cost, m)
+    return best[1] if best else 1
+
+
+class MultiIndexHash:
+    """
+    多索引哈希表。
+
+    :param threshold: 汉明距离阈值
+    :param bits: 哈希位数
+    :param num_bands: 分段数，默认按 expected_size 与 threshold 估算
+    """
+
+    def __init__(self, threshold, bits=64, num_bands=None, expected_size=1000):
+        self.threshold = threshold
+        self.bits = bits
+        m = num_bands or choose_bands(expected_size, threshold, bits)
+        self.radius = threshold // m
+        # 各段宽度相差不超过 1 位
+        widths = [bits // m + (1 if i < bits % m else 0) for i in range(m)]
+        self.bands = []
+        shift = 0
+        for width in widths:
+            flips = [0]
+            for r in range(1, self.radius + 1):
+                for positions in combinations(range(width), r):
+                    mask = 0
+                    for p in positions:
+                        mask |= 1 << p
+                    flips.append(mask)
+            self.bands.append((shift, (1 << width) - 1, flips, {}))
+            shift += width
+        self.hashes = []
+
+    def add(self, h):
+        """加入一个哈希，返回其序号"""
+        idx = len(self.hashes)
+        self.hashes.append(h)
+        for shift, mask, _, table in self.bands:
+            key = (h >> shift) & mask
+            bucket = table.get(key)
+            if bucket is None:
+                table[key] = [idx]
+            else:
+                bucket.append(idx)
+        return idx
+
+    def candidates(self, h):
+        """可能在阈值内的候选序号（未经完整距离校验）"""
+        found = set()
+        for shift, mask, flips, table in self.bands:
+            key = (h >> shift) & mask
+            for flip in flips:
+                bucket = table.get(key ^ flip)
+                if bucket:
+                    found.update(bucket)
+        return found
+
+    def query(self, h):
+        """返回汉明距离 <= threshold 的序号列表"""
+        threshold = self.threshold
+        hashes = self.hashes
+        return [j for j in self.candidates(h) if _popcount(h ^ hashes[j]) <= threshold]
+
+
+class UnionFind:
+    def __init__(self, n):
+        self.parent = list(range(n))
+        self.rank = [0] * n
+
+    def find(self, x):
+        parent = self.parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(self, a, b):
+        ra, rb = self.find(a), self.find(b)
+        if ra == rb:
+            return False
+        if self.rank[ra] < self.rank[rb]:
+            ra, rb = rb, ra
+        self.parent[rb] = ra
+        if self.rank[ra] == self.rank[rb]:
+            self.rank[ra] += 1
+        return True
+
+    def groups(self):
+        """按首个成员的顺序返回各组成员（组内升序）"""
+        clusters = {}
+        for i in range(len(self.parent)):
+            clusters.setdefault(self.find(i), []).append(i)
+        return list(clusters.values())
+
+
+def cluster_hashes(hashes, threshold, bits=64):
+    """
+    把汉明距离 <= threshold 的哈希连通为一组（与两两比较 + Union-Find 结果完全一致）。
+    完全相同的哈希先合并，只对去重后的哈希建索引；每个哈希只查询在它之前加入的哈希。
+    大阈值、大数量时较慢（见模块说明），调用方应优先使用 core.hamming.cluster_hashes。
+    """
+    n = len(hashes)
+    uf = UnionFind(n)
+    first_of = {}
+    unique = []
+    for i, h in enumerate(hashes):
+        j = first_of.get(h)
+        if j is None:
+            first_of[h] = i
+            unique.append(i)
+        else:
+            uf.union(j, i)
+
+    if threshold >= SLOW_THRESHOLD and len(unique) >= SLOW_SIZE:
+        print(f"[哈希聚类] 警告: 纯 Python 聚类 {len(unique)} 个哈希（阈值 {threshold}）可能需要数十秒到数分钟，"
+              f"安装 numpy 可使用向量化引擎")
+    if threshold > 0 and len(unique) > 1:
+        index = MultiIndexHash(threshold, bits=bits, expected_size=len(unique))
+        owners = []
+        for i in unique:
+            h = hashes[i]
+            for k in index.query(h):
+                j = owners[k]
+                uf.union(i, j)
+            index.add(h)
+            owners.append(i)
+
+    return uf.groups()
@@ -0,0 +1,263 @@
+"""
+感知哈希持久化缓存 - SQLite，按 路径 + 大小 + mtime 命中
+
+同一文件夹反复分类（调整阈值）时，未变化的文件直接读取上次的哈希，只对新增或修改过的
+文件重新解码。每行保存 dhash / ahash / phash 三列（按需计算，未算过的为 NULL），
+哈希以有符号 int64 存储；视频的多帧指纹存于 <算法>_frames 列（小端 uint64 数组）。
+perceptual_hash.HASH_VERSION 变化时旧记录自动失效。
+"""
+import os
+import time
+import sqlite3
+import threading
+
+from .cache_utils import get_cache_dir
+from . import perceptual_hash
+
+DB_NAME = 'hashes.sqlite3'
+FLUSH_EVERY = 200     # 计算过程中每完成这么多文件写一次库，中途取消也能保留已算出的哈希
+_QUERY_CHUNK = 500    # 单条 SQL 的参数个数上限（SQLite 默认 999）
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS hashes (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    version INTEGER NOT NULL,
+    dhash INTEGER,
+    ahash INTEGER,
+    phash INTEGER,
+    updated REAL NOT NULL
+)
+"""
+# 后续版本新增的列：打开旧库时自动补上
+_ADDED_COLUMNS = [(f"{name}_frames", "BLOB") for name in perceptual_hash.HASH_ALGORITHMS]
+
+
+def _to_signed(h):
+    return h - (1 << 64) if h >= (1 << 63) else h
+
+
+def _to_unsigned(v):
+    return v + (1 << 64) if v < 0 else v
+
+
+def _pack_frames(values):
+    return b''.join(int(v).to_bytes(8, 'little') for v in values)
+
+
+def _unpack_frames(blob):
+    return tuple(int.from_bytes(blob[k:k + 8], 'little') for k in range(0, len(blob), 8))
+
+
+class HashStore:
+    """
+    哈希缓存库。每次操作单独建立连接，可在多个线程中共用同一个实例。
+
+    :param path: 数据库文件路径，默认 <缓存目录>/perceptual_hash/hashes.sqlite3
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(get_cache_dir('perceptual_hash'), DB_NAME)
+        self.version = perceptual_hash.HASH_VERSION
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(_SCHEMA)
+                existing = {row[1] for row in conn.execute("PRAGMA table_info(hashes)")}
+                for column, kind in _ADDED_COLUMNS:
+                    if column not in existing:
+                        conn.execute(f"ALTER TABLE hashes ADD COLUMN {column} {kind}")
+        finally:
+            conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def lookup(self, entries, algorithms=('dhash',), frames=1):
+        """
+        查询缓存：entries 为 [(路径, 大小, mtime_ns)]，返回 {路径: {算法: 哈希}}；
+        只返回大小/mtime/版本都一致且所需算法都已算过的文件。
+        frames > 1 时读取视频指纹列，值为哈希元组（时长未知时为单元素元组）。
+        """
+        wanted = {path: (size, mtime_ns) for path, size, mtime_ns in entries}
+        names = [f"{name}_frames" for name in algorithms] if frames > 1 else list(algorithms)
+        columns = ', '.join(names)
+        found = {}
+        paths = list(wanted)
+        conn = self._connect()
+        try:
+            for start in range(0, len(paths), _QUERY_CHUNK):
+                chunk = paths[start:start + _QUERY_CHUNK]
+                rows = conn.execute(
+                    f"SELECT path, size, mtime_ns, version, {columns} FROM hashes "
+                    f"WHERE path IN ({','.join('?' * len(chunk))})", chunk)
+                for row in rows:
+                    path, size, mtime_ns, version, values = row[0], row[1], row[2], row[3], row[4:]
+                    if (size, mtime_ns) != wanted[path] or version != self.version:
+                        continue
+                    if any(v is None for v in values):
+                        continue
+                    if frames > 1:
+                        if any(len(v) not in (8, frames * 8) for v in values):
+                            continue
+                        found[path] = {name: _unpack_frames(v) for name, v in zip(algorithms, values)}
+                    else:
+                        found[path] = {name: _to_unsigned(v) for name, v in zip(algorithms, values)}
+        finally:
+            conn.close()
+        return found
+
+    def save(self, items):
+        """
+        写入哈希：items 为 [(路径, 大小, mtime_ns, {算法: 哈希或指纹元组})]。
+        文件未变化时与已有的其它算法合并；文件变化时旧的哈希全部作废。
+        """
+        if not items:
+            return
+        now = time.time()
+        names = list(perceptual_hash.HASH_ALGORITHMS) + [f"{name}_frames" for name in perceptual_hash.HASH_ALGORITHMS]
+        rows = []
+        for path, size, mtime_ns, hashes in items:
+            plain, framed = [], []
+            for name in perceptual_hash.HASH_ALGORITHMS:
+                value = hashes.get(name)
+                plain.append(_to_signed(value) if isinstance(value, int) else None)
+                framed.append(_pack_frames(value) if isinstance(value, tuple) else None)
+            rows.append([path, size, mtime_ns, self.version] + plain + framed + [now])
+        same = "hashes.size = excluded.size AND hashes.mtime_ns = excluded.mtime_ns AND hashes.version = excluded.version"
+        merge = ', '.join(
+            f"{name} = CASE WHEN {same} THEN COALESCE(excluded.{name}, hashes.{name}) ELSE excluded.{name} END"
+            for name in names)
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany(
+                    f"INSERT INTO hashes (path, size, mtime_ns, version, {', '.join(names)}, updated) "
+                    f"VALUES ({', '.join('?' * (len(names) + 5))}) ON CONFLICT(path) DO UPDATE SET "
+                    f"{merge}, size = excluded.size, mtime_ns = excluded.mtime_ns, "
+                    "version = excluded.version, updated = excluded.updated", rows)
+        finally:
+            conn.close()
+
+    def move(self, pairs):
+        """文件被移动后同步路径：pairs 为 [(原路径, 新路径)]（移动不改变大小与 mtime）"""
+        if not pairs:
+            return
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany("DELETE FROM hashes WHERE path = ?", [(dst,) for _, dst in pairs])
+                conn.executemany("UPDATE hashes SET path = ? WHERE path = ?", [(dst, src) for src, dst in pairs])
+        finally:
+            conn.close()
+
+    def forget_missing(self, folder, present):
+        """
+        删除 folder 下已不存在的文件的记录，返回删除条数。
+        present 为本次扫描到的路径集合，只对集合之外的路径检查文件是否还在。
+        """
+        prefix = os.path.join(os.path.abspath(folder), '')
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        conn = self._connect()
+        try:
+            stale = [(row[0],) for row in conn.execute(
+                "SELECT path FROM hashes WHERE path >= ? AND path < ?", (prefix, upper))
+                if row[0] not in present and not os.path.exists(row[0])]
+            if stale:
+                with conn:
+                    conn.executemany("DELETE FROM hashes WHERE path = ?", stale)
+        finally:
+            conn.close()
+        return len(stale)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """共享的哈希缓存库（懒加载）"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = HashStore()
+        return _store
+
+
+def hash_files(files, algorithms=('dhash',), store=None, workers=None,
+               progress_callback=None, cancel_check=None, video_frames=1):
+    """
+    带缓存的批量哈希：命中缓存的文件直接返回，其余交给 perceptual_hash.hash_files 计算并写回。
+    返回 (results, cached_count)，results 与 files 等长，元素为 ({算法: 哈希} 或 None, 错误信息)。
+
+    :param files: [(路径, 是否视频)]，路径应为绝对路径
+    :param store: HashStore，默认 get_store()
+    :param video_frames: 视频指纹采样帧数（见 perceptual_hash.hash_files）
+    """
+    store = store or get_store()
+    total = len(files)
+    results = [None] * total
+    entries = {}
+    for i, (path, _) in enumerate(files):
+        try:
+            st = os.stat(path)
+        except OSError as e:
+            results[i] = (None, str(e)[:200])
+            continue
+        entries[i] = (path, st.st_size, st.st_mtime_ns)
+
+    try:
+        if video_frames > 1:
+            cached = store.lookup([e for i, e in entries.items() if not files[i][1]], algorithms)
+            cached.update(store.lookup([e for i, e in entries.items() if files[i][1]], algorithms, video_frames))
+        else:
+            cached = store.lookup(entries.values(), algorithms)
+    except sqlite3.Error as e:
+        print(f"[哈希缓存] 读取失败，全部重新计算: {e}")
+        cached = {}
+    todo = []
+    cached_count = 0
+    for i, (path, _, _) in entries.items():
+        hit = cached.get(path)
+        if hit is not None:
+            results[i] = (hit, None)
+            cached_count += 1
+        else:
+            todo.append(i)
+    if progress_callback:
+        progress_callback(total - len(todo), total)
+    if not todo:
+        return results, cached_count
+
+    pending_save = []
+
+    def _flush():
+        try:
+            store.save(pending_save)
+        except sqlite3.Error as e:
+            print(f"[哈希缓存] 写入失败: {e}")
+        del pending_save[:]
+
+    def _on_result(k, item):
+        i = todo[k]
+        results[i] = item
+        if item[0] is not None:
+            pending_save.append(entries[i] + (item[0],))
+            if len(pending_save) >= FLUSH_EVERY:
+                _flush()
+
+    def _on_progress(done, _total):
+        if progress_callback:
+            progress_callback(total - len(todo) + done, total)
+
+    try:
+        perceptual_hash.hash_files([files[i] for i in todo], algorithms, workers=workers,
+                                   progress_callback=_on_progress, cancel_check=cancel_check,
+                                   result_callback=_on_result, video_frames=video_frames)
+    finally:
+        _flush()
+    return results, cached_count
@@ -0,0 +1,270 @@
+"""
+硬件 H.264 编码器检测与选择 - 与 mediaconvert._get_video_codec_params 的优先级一致
+
+- 先解析 ffmpeg -encoders，再对每个候选做一次极短的试编码（驱动/设备缺失时编码器虽列出但不可用）
+- 结果按 ffmpeg 可执行文件 (路径, 大小, mtime) 缓存到磁盘，服务重启后不再重复检测
+- apply_encoder 把按 libx264 写好的命令改写为硬件编码器命令，原命令可直接作为软件回退
+"""
+import os
+import re
+import sys
+import shutil
+import threading
+import subprocess
+
+from .cache_utils import get_cache_dir, atomic_write_json, read_json, file_signature
+
+SOFTWARE_ENCODER = 'libx264'
+CACHE_VERSION = 1
+VAAPI_DEVICE = os.environ.get('PYMEDIA_VAAPI_DEVICE', '/dev/dri/renderD128')
+
+# 优先级：VideoToolbox (Mac) -> NVENC (Nvidia) -> QSV (Intel) -> VAAPI (Linux) -> AMF (AMD)
+# params：替换 libx264 默认参数；quality：替换 -crf 20（质量优先的压缩模式）
+ENCODERS = {
+    'h264_videotoolbox': {'params': ['-q:v', '70'], 'quality': ['-q:v', '70']},
+    'h264_nvenc': {'params': ['-preset', 'fast'], 'quality': ['-preset', 'fast', '-rc', 'vbr', '-cq', '20']},
+    'h264_qsv': {'params': ['-preset', 'veryfast'], 'quality': ['-preset', 'veryfast', '-global_quality', '20'],
+                 'pix_fmt': 'nv12'},
+    'h264_vaapi': {'params': [], 'quality': ['-rc_mode', 'CQP', '-qp', '20'], 'hwupload': True},
+    'h264_amf': {'params': ['-quality', 'speed'], 'quality': ['-rc', 'cqp', '-qp_i', '20', '-qp_p', '20']},
+}
+PRIORITY = list(ENCODERS)
+
+_detected = None
+_detect_lock = threading.Lock()
+
+
+def _creationflags():
+    return subprocess.CREATE_NO_WINDOW if sys.platform == 'win32' else 0
+
+
+def _cache_path():
+    return os.path.join(get_cache_dir(), 'hw_encoders.json')
+
+
+def _ffmpeg_key():
+    path = shutil.which('ffmpeg')
+    signature = file_signature(path) if path else None
+    if signature is None:
+        return None
+    return f"{signature[0]}|{signature[1]}|{signature[2]}|{sys.platform}|{CACHE_VERSION}"
+
+
+def _listed_encoders():
+    """ffmpeg -encoders 中列出的候选硬件编码器"""
+    try:
+        result = subprocess.run(['ffmpeg', '-hide_banner', '-encoders'], capture_output=True, text=True,
+                                encoding='utf-8', errors='ignore', timeout=30, creationflags=_creationflags())
+    except (OSError, subprocess.SubprocessError) as e:
+        print(f"[编码器] 无法运行 ffmpeg -encoders: {e}")
+        return []
+    names = set()
+    for line in result.stdout.splitlines():
+        parts = line.split()
+        if len(parts) >= 2 and len(parts[0]) == 6 and parts[0].startswith('V'):
+            names.add(parts[1])
+    return [name for name in PRIORITY if name in names]
+
+
+def _test_encode(name):
+    """用 lavfi 生成几帧做一次试编码，成功说明驱动与设备可用"""
+    cmd = ['ffmpeg', '-hide_banner', '-loglevel', 'error']
+    if ENCODERS[name].get('hwupload'):
+        cmd += ['-vaapi_device', VAAPI_DEVICE]
+    cmd += ['-f', 'lavfi', '-i', 'color=c=black:s=256x256:r=25:d=0.2']
+    if ENCODERS[name].get('hwupload'):
+        cmd += ['-vf', 'format=nv12,hwupload']
+    elif ENCODERS[name].get('pix_fmt'):
+        cmd += ['-pix_fmt', ENCODERS[name]['pix_fmt']]
+    cmd += ['-c:v', name] + ENCODERS[name]['params'] + ['-f', 'null', '-']
+    try:
+        result = subprocess.run(cmd, capture_output=True, timeout=30, creationflags=_creationflags())
+    except (OSError, subprocess.SubprocessError):
+        return False
+    return result.returncode == 0
+
+
+def detect(refresh=False):
+    """
+    返回可用的硬件编码器列表（按优先级排序）。
+    进程内只检测一次；磁盘缓存与当前 ffmpeg 可执行文件一致时直接使用。
+    """
+    global _detected
+    with _detect_lock:
+        if _detected is not None and not refresh:
+            return list(_detected)
+        key = _ffmpeg_key()
+        saved = read_json(_cache_path(), default={}) or {}
+        if not refresh and key and saved.get('key') == key and isinstance(saved.get('encoders'), list):
+            _detected = saved['encoders']
+            return list(_detected)
+
+        _detected = [name for name in _listed_encoders() if _test_encode(name)]
+        print(f"[编码器] 可用硬件编码器: {', '.join(_detected) or '无'}")
+        if key:
+            try:
+                atomic_write_json(_cache_path(), {'key': key, 'encoders': _detected})
+            except OSError as e:
+                print(f"[编码器] 写入缓存失败: {e}")
+        return list(_detected)
+
+
+def detect_in_background():
+    """服务启动时在后台线程预先检测，第一次转换请求不必等待试编码"""
+    threading.Thread(target=detect, name="hw-encoder-detect", daemon=True).start()
+
+
+def resolve(choice):
+    """
+    把请求里的 encoder 选项解析为编码器名称。
+    auto：可用的最高优先级硬件编码器，没有则为 libx264；software：libx264；
+    其它值必须是 libx264 或已检测可用的硬件编码器，否则抛出 ValueError。
+    """
+    choice = (choice or 'auto').strip()
+    if choice == 'software' or choice == SOFTWARE_ENCODER:
+        return SOFTWARE_ENCODER
+    available = detect()
+    if choice == 'auto':
+        return available[0] if available else SOFTWARE_ENCODER
+    if choice in available:
+        return choice
+    raise ValueError(f"编码器不可用: {choice}（可用: {', '.join([SOFTWARE_ENCODER] + available)}）")
+
+
+# 不带参数的 ffmpeg 选项；其余以 - 开头的参数都带一个值
+_FLAG_OPTIONS = {'-y', '-n', '-hide_banner', '-nostdin', '-nostats', '-vn', '-an', '-sn', '-dn', '-shortest'}
+_LABEL = re.compile(r'\[([^\]]+)\]')
+
+
+def _output_segments(cmd):
+    """按输出文件切分命令：返回 [(起点, 输出路径下标)]，区间内是该输出的选项"""
+    segments = []
+    start = k = 1
+    while k < len(cmd):
+        if cmd[k] in _FLAG_OPTIONS:
+            k += 1
+        elif cmd[k].startswith('-') and k + 1 < len(cmd):
+            k += 2
+        else:
+            segments.append((start, k))
+            start = k = k + 1
+    return segments
+
+
+def _parse_graph(graph):
+    """把 -filter_complex 拆成 [(输入标签, 滤镜, 输出标签)]"""
+    chains = []
+    for chain in graph.split(';'):
+        head = re.match(r'\s*((?:\[[^\]]+\]\s*)*)', chain)
+        tail = re.search(r'((?:\[[^\]]+\]\s*)*)$', chain[head.end():])
+        body = chain[head.end():head.end() + tail.start()]
+        chains.append((_LABEL.findall(head.group(1)), body, _LABEL.findall(tail.group(1))))
+    return chains
+
+
+def _is_video_label(chains, label, seen=()):
+    """沿滤镜图向上追溯，标签最终来自某个输入的视频流（N:v / N）时为视频"""
+    if re.fullmatch(r'\d+(:v(:\d+)?)?', label):
+        return True
+    for inputs, _, outputs in chains:
+        if label in outputs and label not in seen:
+            return any(_is_video_label(chains, i, seen + (label,)) for i in inputs)
+    return False
+
+
+def _insert_hwupload(out, segments):
+    """
+    为各个改写过的输出插入 format=nv12,hwupload。
+    -filter_complex：为映射到该输出的视频标签追加独立的 [标签]format=nv12,hwupload[hwN] 链并改写 -map；
+    图的最后一条链没有输出标签（自动映射到第一个输出）时先给它加上标签。
+    -vf：直接接在滤镜链末尾；没有滤镜时单独加 -vf。
+    无法确定视频流时返回 None。
+    """
+    graph_index = _option_index(out, '-filter_complex')
+    chains = _parse_graph(out[graph_index + 1]) if graph_index >= 0 else []
+    inserts = []    # [(插入位置, 参数)]，最后从后往前插入
+    for n, (start, end) in enumerate(segments):
+        hw = f"hw{n}"
+        maps = [k for k in range(start, end) if out[k] == '-map' and out[k + 1].startswith('[')]
+        video = [k for k in maps if _is_video_label(chains, out[k + 1][1:-1])]
+        vf = [k for k in range(start, end) if out[k] in ('-vf', '-filter:v')]
+        if video:
+            k = video[0]
+            chains.append(([out[k + 1][1:-1]], 'format=nv12,hwupload', [hw]))
+            out[k + 1] = f"[{hw}]"
+        elif vf:
+            out[vf[0] + 1] += ',format=nv12,hwupload'
+        elif chains and not maps:
+            inputs, body, outputs = chains[-1]
+            if outputs or start != 1 or not any(_is_video_label(chains, i) for i in inputs):
+                return None
+            chains[-1] = (inputs, body, ['out'])
+            chains.append((['out'], 'format=nv12,hwupload', [hw]))
+            audio = [] if '-an' in out[start:end] else ['-map', '0:a?']
+            inserts.append((out.index('-c:v', start), ['-map', f"[{hw}]"] + audio))
+        elif not chains:
+            inserts.append((out.index('-c:v', start), ['-vf', 'format=nv12,hwupload']))
+        else:
+            return None
+    if graph_index >= 0:
+        out[graph_index + 1] = ';'.join(''.join(f"[{i}]" for i in inputs) + body + ''.join(f"[{o}]" for o in outputs)
+                                        for inputs, body, outputs in chains)
+    for k, args in reversed(inserts):
+        out[k:k] = args
+    out[1:1] = ['-vaapi_device', VAAPI_DEVICE]
+    return out
+
+
+def _option_index(cmd, option):
+    try:
+        return cmd.index(option)
+    except ValueError:
+        return -1
+
+
+def apply_encoder(cmd, encoder):
+    """
+    把使用 libx264 的 ffmpeg 命令（可含多个输出）改写为使用 encoder 的命令，返回新列表；
+    不含 libx264 或 encoder 为软件编码器时原样返回 cmd。
+    只改写 libx264 输出自己的参数：-crf 视为质量模式，换成对应编码器的质量参数；
+    -preset 换成编码器自己的默认值；其它输出的参数保持不变。
+    """
+    targets = {k for k in range(len(cmd) - 1) if cmd[k] == '-c:v' and cmd[k + 1] == SOFTWARE_ENCODER}
+    if encoder == SOFTWARE_ENCODER or encoder not in ENCODERS or not targets:
+        return cmd
+    spec = ENCODERS[encoder]
+    segments = [(start, end) for start, end in _output_segments(cmd) if targets & set(range(start, end))]
+    rewrite = {k for start, end in segments for k in range(start, end)}
+    out = []
+    rewritten = []
+    skip = 0
+    for k, arg in enumerate(cmd):
+        if skip:
+            skip -= 1
+            continue
+        if segments and k == segments[0][0]:
+            segment_start = len(out)
+        if k in targets:
+            start, end = next(s for s in segments if s[0] <= k < s[1])
+            out += ['-c:v', encoder] + (spec['quality'] if '-crf' in cmd[start:end] else spec['params'])
+            skip = 1
+        elif k in rewrite and arg in ('-crf', '-preset'):
+            skip = 1
+        elif k in rewrite and arg == '-pix_fmt':
+            skip = 1
+            if not spec.get('hwupload'):
+                out += ['-pix_fmt', spec.get('pix_fmt', cmd[k + 1])]
+        else:
+            out.append(arg)
+        if segments and k == segments[0][1]:
+            rewritten.append((segment_start, len(out) - 1))
+            segments.pop(0)
+
+    if spec.get('hwupload'):
+        # VAAPI 需要把软件帧上传到显存
+        hw_cmd = _insert_hwupload(out, rewritten)
+        if hw_cmd is None:
+            print("[编码器] 无法确定视频输出所在的滤镜链，保持软件编码")
+            return cmd
+        return hw_cmd
+    return out
@@ -0,0 +1,319 @@
+"""
+后台任务队列 - 长耗时接口提交后立即返回 job_id，由有界线程池/进程池执行
+
+- 任务状态持久化到缓存目录（合并写入，不含结果与密钥），服务重启后排队中的任务会重新入队
+- 任务函数内可调用 report_progress / check_cancelled 汇报进度、响应取消
+- CPU 密集型计算可提交到共享进程池 get_process_pool()
+"""
+import os
+import time
+import atexit
+import uuid
+import threading
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from .cache_utils import get_cache_dir, atomic_write_json, read_json
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_ERROR = 'error'
+JOB_CANCELLED = 'cancelled'
+JOB_INTERRUPTED = 'interrupted'
+
+FINISHED_STATES = {JOB_DONE, JOB_ERROR, JOB_CANCELLED, JOB_INTERRUPTED}
+
+
+class JobCancelled(Exception):
+    """任务被取消。业务代码中宽泛的 `except Exception` 之前需先 `except JobCancelled: raise`"""
+
+
+_local = threading.local()
+
+
+def current_job():
+    """返回当前线程正在执行的任务（不在任务中时返回 None）"""
+    return getattr(_local, 'job', None)
+
+
+def report_progress(done=None, total=None, message=None):
+    """在任务中汇报进度；不在任务中调用时什么也不做"""
+    job = current_job()
+    if job is not None:
+        job.update_progress(done, total, message)
+
+
+def check_cancelled():
+    """在任务中检查取消标记，已取消则抛出 JobCancelled"""
+    job = current_job()
+    if job is not None and job.cancel_event.is_set():
+        raise JobCancelled(job.id)
+
+
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+
+def process_pool_workers():
+    """共享进程池的进程数：环境变量 PYMEDIA_PROCESS_WORKERS，默认 CPU 数"""
+    return int(os.environ.get('PYMEDIA_PROCESS_WORKERS', 0)) or (os.cpu_count() or 2)
+
+
+def get_process_pool():
+    """共享进程池（懒加载），供 CPU 密集型计算使用"""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(max_workers=process_pool_workers())
+        return _process_pool
+
+
+class Job:
+    """单个后台任务的状态"""
+
+    def __init__(self, job_id, kind, payload, created=None, secrets=None):
+        self.id = job_id
+        self.kind = kind
+        self.payload = payload
+        self.secrets = secrets or {}
+        self.redacted = []
+        self.status = JOB_QUEUED
+        self.progress = {"done": 0, "total": 0, "message": ""}
+        self.result = None
+        self.error = None
+        self.created = created or time.time()
+        self.started = None
+        self.finished = None
+        self.cancel_event = threading.Event()
+        self.lock = threading.Lock()
+
+    def update_progress(self, done=None, total=None, message=None):
+        with self.lock:
+            if done is not None:
+                self.progress["done"] = done
+            if total is not None:
+                self.progress["total"] = total
+            if message is not None:
+                self.progress["message"] = str(message)
+
+    def to_dict(self, include_result=False, include_payload=False):
+        with self.lock:
+            info = {
+                "job_id": self.id,
+                "kind": self.kind,
+                "status": self.status,
+                "progress": dict(self.progress),
+                "error": self.error,
+                "created": self.created,
+                "started": self.started,
+                "finished": self.finished,
+            }
+            if include_result:
+                info["result"] = self.result
+            if include_payload:
+                info["payload"] = self.payload
+                if self.secrets:
+                    info["redacted"] = sorted(self.secrets)
+        return info
+
+    def handler_payload(self):
+        """交给 handler 的完整参数：持久化参数 + 仅保存在内存中的密钥字段"""
+        if not self.secrets:
+            return self.payload
+        return dict(self.payload, **self.secrets)
+
+    @classmethod
+    def from_dict(cls, info):
+        job = cls(info["job_id"], info["kind"], info.get("payload"), info.get("created"))
+        job.status = info.get("status", JOB_QUEUED)
+        job.progress = info.get("progress") or job.progress
+        job.result = info.get("result")
+        job.error = info.get("error")
+        job.started = info.get("started")
+        job.finished = info.get("finished")
+        job.redacted = info.get("redacted") or []
+        return job
+
+
+class JobManager:
+    """
+    有界任务队列。
+
+    :param name: 队列名称（决定持久化文件名）
+    :param max_workers: 同时执行的任务数，超出的任务排队等待
+    :param persist: 是否把任务状态写入缓存目录
+    :param max_history: 最多保留的已结束任务数
+    :param save_delay: 状态变化后延迟多少秒合并写盘
+    """
+
+    def __init__(self, name, max_workers=None, persist=True, max_history=200, save_delay=1.0):
+        self.name = name
+        self.max_workers = max_workers or max(2, min(4, (os.cpu_count() or 2) // 2))
+        self.max_history = max_history
+        self._handlers = {}
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f"{name}-job")
+        self._store_path = os.path.join(get_cache_dir('jobs'), f"{name}.json") if persist else None
+        self.save_delay = save_delay
+        self._save_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._save_timer = None
+        if self._store_path:
+            atexit.register(self.flush)
+
+    def register(self, kind, handler, secret_fields=()):
+        """
+        注册任务类型。
+
+        :param secret_fields: payload 中只保存在内存、不写入磁盘的字段（如 API Key）；
+                              带这些字段的排队任务在服务重启后无法恢复，会标记为中断
+        """
+        self._handlers[kind] = (handler, tuple(secret_fields))
+
+    def submit(self, kind, payload):
+        if kind not in self._handlers:
+            raise ValueError(f"未知任务类型: {kind}")
+        secret_fields = self._handlers[kind][1]
+        secrets = {k: payload[k] for k in secret_fields if payload.get(k)}
+        payload = {k: v for k, v in payload.items() if k not in secret_fields}
+        job = Job(uuid.uuid4().hex, kind, payload, secrets=secrets)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._trim_history()
+        self._executor.submit(self._run, job)
+        self._save()
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def stats(self):
+        counts = {}
+        for job in self.list():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {"max_workers": self.max_workers, "counts": counts}
+
+    def cancel(self, job_id):
+        """取消任务：排队中的任务直接取消，运行中的任务在下一个检查点退出"""
+        job = self.get(job_id)
+        if job is None:
+            return None
+        if job.status in FINISHED_STATES:
+            return job
+        job.cancel_event.set()
+        with job.lock:
+            if job.status == JOB_QUEUED:
+                job.status = JOB_CANCELLED
+                job.finished = time.time()
+        self._save()
+        return job
+
+    def restore(self):
+        """服务启动时加载持久化任务：排队中的重新入队，执行中的标记为中断"""
+        if not self._store_path:
+            return
+        saved = read_json(self._store_path, default=[]) or []
+        requeue = []
+        with self._lock:
+            for info in saved:
+                try:
+                    job = Job.from_dict(info)
+                except (KeyError, TypeError):
+                    continue
+                if job.status == JOB_RUNNING:
+                    job.status = JOB_INTERRUPTED
+                    job.error = "服务重启，任务中断"
+                    job.finished = time.time()
+                elif job.status == JOB_QUEUED:
+                    if job.kind not in self._handlers:
+                        job.status = JOB_INTERRUPTED
+                        job.error = "任务类型已不可用"
+                        job.finished = time.time()
+                    elif job.redacted:
+                        job.status = JOB_INTERRUPTED
+                        job.error = "任务密钥未持久化，请重新提交"
+                        job.finished = time.time()
+                    else:
+                        requeue.append(job)
+                self._jobs[job.id] = job
+        for job in requeue:
+            self._executor.submit(self._run, job)
+        if saved:
+            print(f"[任务队列:{self.name}] 恢复 {len(saved)} 个任务，重新入队 {len(requeue)} 个")
+        self._save()
+
+    def _run(self, job):
+        with job.lock:
+            if job.cancel_event.is_set() or job.status == JOB_CANCELLED:
+                job.status = JOB_CANCELLED
+                job.finished = job.finished or time.time()
+                job.secrets = {}
+                return
+            job.status = JOB_RUNNING
+            job.started = time.time()
+        self._save()
+
+        handler = self._handlers[job.kind][0]
+        _local.job = job
+        try:
+            result = handler(job.handler_payload())
+            with job.lock:
+                job.result = result
+                job.status = JOB_DONE
+                job.secrets = {}
+        except JobCancelled:
+            with job.lock:
+                job.status = JOB_CANCELLED
+                job.secrets = {}
+        except Exception as e:
+            traceback.print_exc()
+            with job.lock:
+                job.status = JOB_ERROR
+                job.error = str(e)
+                job.secrets = {}
+        finally:
+            _local.job = None
+            with job.lock:
+                job.finished = time.time()
+            self._save()
+
+    def _trim_history(self):
+        finished = [jid for jid, j in self._jobs.items() if j.status in FINISHED_STATES]
+        for jid in finished[:max(0, len(self._jobs) - self.max_history)]:
+            del self._jobs[jid]
+
+    def _save(self):
+        """标记状态已变化：save_delay 秒内的多次变化合并为一次写盘"""
+        if not self._store_path:
+            return
+        with self._save_lock:
+            if self._save_timer is not None:
+                return
+            self._save_timer = threading.Timer(self.save_delay, self.flush)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def flush(self):
+        """立即写盘。只保存恢复所需的元数据：不含结果，参数仅保留排队中任务的（已去掉密钥字段）"""
+        if not self._store_path:
+            return
+        with self._save_lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+        with self._write_lock:
+            with self._lock:
+                jobs = list(self._jobs.values())
+            data = [job.to_dict(include_payload=job.status == JOB_QUEUED) for job in jobs]
+            try:
+                atomic_write_json(self._store_path, data)
+            except Exception as e:
+                print(f"[任务队列:{self.name}] 保存任务状态失败: {e}")
@@ -0,0 +1,90 @@
+"""
+Logo 叠加 - 预缩放的 logo 缓存 + 单文件 / 多文件合并的 ffmpeg 滤镜图
+
+- logo 按 (文件指纹, 宽, 高) 预先缩放成 PNG 缓存，滤镜图里不再有 [1:v]scale
+- logo 作为单帧输入（不加 -loop 1，否则每个输出帧都要重新解码一次 PNG），
+  overlay 在 logo 流结束后保持最后一帧（eof_action=repeat）
+- 合并模式：多个输入共用一个 ffmpeg 进程，logo 只读一次、经 split 分给各路，分摊进程启动与初始化开销
+"""
+import os
+import tempfile
+import subprocess
+
+from .cache_utils import file_signature, signature_cache_path
+
+CACHE_NAMESPACE = 'logo_overlay'
+CACHE_VERSION = 1
+CANVAS = (1080, 1920)    # 竖屏画布
+
+
+def prescaled_logo(logo_path, width, height):
+    """
+    返回缩放到 width x height 的 logo 缓存路径；缩放失败时返回 None（调用方退回滤镜内缩放）。
+    缩放同样由 ffmpeg 完成，与滤镜图内 scale 的像素结果一致。
+    """
+    signature = file_signature(logo_path)
+    if signature is None:
+        return None
+    path = signature_cache_path(CACHE_NAMESPACE, signature, f"{width}x{height}.png", CACHE_VERSION)
+    if os.path.exists(path):
+        return path
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp_', suffix='.png')
+    os.close(fd)
+    try:
+        subprocess.run(['ffmpeg', '-y', '-i', logo_path, '-vf', f'scale={width}:{height}',
+                        '-frames:v', '1', tmp_path], check=True, capture_output=True, timeout=60)
+        os.replace(tmp_path, path)
+    except (OSError, subprocess.SubprocessError) as e:
+        print(f"[Logo] 预缩放失败，改为滤镜内缩放: {logo_path} ({e})")
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        return None
+    return path
+
+
+def _canvas_chain(label_in, label_out):
+    w, h = CANVAS
+    return (f"{label_in}scale={w}:{h}:force_original_aspect_ratio=decrease,"
+            f"pad={w}:{h}:(ow-iw)/2:(oh-ih)/2{label_out}")
+
+
+def build_overlay_cmd(inputs, outputs, logo_path, pos, audio_bitrate='128k'):
+    """
+    生成把 logo 叠加到 1080x1920 画布上的 ffmpeg 命令（视频编码为 libx264，可由 hw_encoders 改写）。
+
+    :param inputs: 输入文件列表；多于一个时生成合并命令，每个输入对应 outputs 中同位置的输出
+    :param pos: {'x', 'y', 'w', 'h'}
+    """
+    logo = prescaled_logo(logo_path, pos['w'], pos['h'])
+    logo_scale = '' if logo else f"scale={pos['w']}:{pos['h']}"
+    logo = logo or logo_path
+    overlay = f"overlay={pos['x']}:{pos['y']}:eof_action=repeat"
+    n = len(inputs)
+
+    cmd = ['ffmpeg', '-y']
+    for path in inputs:
+        cmd += ['-i', path]
+    cmd += ['-i', logo]
+
+    if n == 1:
+        chains = [_canvas_chain('[0:v]', '[v]')]
+        logo_label = '[1:v]'
+        if logo_scale:
+            chains.append(f"[1:v]{logo_scale}[logo]")
+            logo_label = '[logo]'
+        chains.append(f"[v]{logo_label}{overlay}")
+        return cmd + ['-filter_complex', ';'.join(chains),
+                      '-c:v', 'libx264', '-c:a', 'aac', '-b:a', audio_bitrate, outputs[0]]
+
+    split = f"{logo_scale},split={n}" if logo_scale else f"split={n}"
+    chains = [f"[{n}:v]{split}" + ''.join(f"[l{i}]" for i in range(n))]
+    for i in range(n):
+        chains.append(_canvas_chain(f"[{i}:v]", f"[v{i}]"))
+        chains.append(f"[v{i}][l{i}]{overlay}[o{i}]")
+    cmd += ['-filter_complex', ';'.join(chains)]
+    for i, output in enumerate(outputs):
+        cmd += ['-map', f'[o{i}]', '-map', f'{i}:a?',
+                '-c:v', 'libx264', '-c:a', 'aac', '-b:a', audio_bitrate, output]
+    return cmd
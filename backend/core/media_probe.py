@@ -0,0 +1,245 @@
+"""
+媒体探测缓存 - 一次 ffprobe 调用同时取回 format + streams 信息
+
+结果按 (路径, 大小, mtime) 缓存在进程内 LRU 中，并定期持久化到缓存目录，
+同一文件被多个接口反复查询时长/帧率/分辨率时不再重复启动 ffprobe。
+关键帧索引（智能裁切用）也存放在同一个缓存中。
+"""
+import os
+import json
+import atexit
+import subprocess
+import threading
+from collections import OrderedDict
+
+from .cache_utils import get_cache_dir, atomic_write_json, read_json, file_signature
+
+MAX_ENTRIES = 4096
+SAVE_DELAY = 2.0
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+_loaded = False
+_dirty = False
+_save_timer = None
+
+
+def _store_path():
+    return os.path.join(get_cache_dir(), 'media_probe.json')
+
+
+def _ffprobe_cmd():
+    return os.environ.get('FFPROBE_PATH', 'ffprobe')
+
+
+def _cache_key(signature):
+    path, size, mtime_ns = signature
+    return f"{path}|{size}|{mtime_ns}"
+
+
+def _ensure_loaded():
+    """首次使用时从磁盘加载缓存（调用方需持有 _lock）"""
+    global _loaded
+    if _loaded:
+        return
+    _loaded = True
+    saved = read_json(_store_path(), default={}) or {}
+    if isinstance(saved, dict):
+        for key, info in list(saved.items())[-MAX_ENTRIES:]:
+            _cache[key] = info
+
+
+def _cache_get(key):
+    with _lock:
+        _ensure_loaded()
+        value = _cache.get(key)
+        if value is not None:
+            _cache.move_to_end(key)
+        return value
+
+
+def _cache_put(key, value):
+    with _lock:
+        _ensure_loaded()
+        _cache[key] = value
+        _cache.move_to_end(key)
+        while len(_cache) > MAX_ENTRIES:
+            _cache.popitem(last=False)
+        _schedule_save()
+
+
+def _save():
+    global _dirty, _save_timer
+    with _lock:
+        if not _dirty:
+            return
+        data = dict(_cache)
+        _dirty = False
+        _save_timer = None
+    try:
+        atomic_write_json(_store_path(), data)
+    except Exception as e:
+        print(f"[媒体探测] 缓存保存失败: {e}")
+
+
+def _schedule_save():
+    """合并短时间内的多次写入，延迟落盘（调用方需持有 _lock）"""
+    global _dirty, _save_timer
+    _dirty = True
+    if _save_timer is None:
+        _save_timer = threading.Timer(SAVE_DELAY, _save)
+        _save_timer.daemon = True
+        _save_timer.start()
+
+
+atexit.register(_save)
+
+
+def probe(file_path, timeout=30):
+    """
+    返回 ffprobe 的完整 JSON 信息 {"format": {...}, "streams": [...]}。
+    文件不存在或探测失败时返回 None（失败结果不缓存）。
+    """
+    signature = file_signature(file_path)
+    if signature is None:
+        return None
+    key = _cache_key(signature)
+
+    info = _cache_get(key)
+    if info is not None:
+        return info
+
+    cmd = [
+        _ffprobe_cmd(), '-v', 'error',
+        '-show_format', '-show_streams',
+        '-of', 'json',
+        file_path
+    ]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8',
+                                errors='replace', timeout=timeout)
+        if result.returncode != 0:
+            print(f"[媒体探测] ffprobe 失败: {file_path} -> {result.stderr.strip()[:200]}")
+            return None
+        info = json.loads(result.stdout or '{}')
+    except Exception as e:
+        print(f"[媒体探测] ffprobe 异常: {file_path} -> {e}")
+        return None
+
+    info = {"format": info.get("format", {}), "streams": info.get("streams", [])}
+    _cache_put(key, info)
+    return info
+
+
+def get_keyframes(file_path, timeout=120):
+    """
+    第一条视频流的关键帧索引 [[时间, 包序号, 是否封闭], ...]。时间已减去 format start_time，
+    与 ffmpeg -ss 的时间轴一致；包序号按解码顺序计数，两个关键帧序号之差即两者之间的包数。
+    关键帧之后（解码顺序）出现显示时间更早的包时，该 GOP 为开放 GOP（前导帧参考上一个 GOP），
+    "是否封闭" 为 False，不能作为流复制的起止点。
+    只读取包头（不解码），结果与 probe 信息共用同一个缓存。失败时返回 None。
+    """
+    signature = file_signature(file_path)
+    if signature is None:
+        return None
+    key = _cache_key(signature) + "|keyframes2"
+    keyframes = _cache_get(key)
+    if keyframes is not None:
+        return keyframes
+
+    cmd = [
+        _ffprobe_cmd(), '-v', 'error',
+        '-select_streams', 'v:0',
+        '-show_entries', 'packet=pts_time,flags',
+        '-of', 'csv=p=0',
+        file_path
+    ]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8',
+                                errors='replace', timeout=timeout)
+        if result.returncode != 0:
+            print(f"[媒体探测] 关键帧索引失败: {file_path} -> {result.stderr.strip()[:200]}")
+            return None
+    except Exception as e:
+        print(f"[媒体探测] 关键帧索引异常: {file_path} -> {e}")
+        return None
+
+    info = probe(file_path) or {"format": {}}
+    try:
+        start_time = float(info["format"].get("start_time") or 0.0)
+    except (TypeError, ValueError):
+        start_time = 0.0
+    keyframes = []
+    for index, line in enumerate(result.stdout.splitlines()):
+        pts_time, _, flags = line.partition(',')
+        try:
+            pts = round(float(pts_time) - start_time, 6)
+        except ValueError:
+            continue
+        if 'K' in flags:
+            keyframes.append([pts, index, True])
+        elif keyframes and pts < keyframes[-1][0]:
+            keyframes[-1][2] = False
+    _cache_put(key, keyframes)
+    return keyframes
+
+
+def _positive_float(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if value > 0 else None
+
+
+def _parse_rate(rate):
+    """解析 "30000/1001" 形式的帧率"""
+    try:
+        if '/' in rate:
+            num, den = rate.split('/')
+            return float(num) / float(den) if float(den) else None
+        return float(rate)
+    except (TypeError, ValueError):
+        return None
+
+
+def first_stream(info, codec_type):
+    """返回指定类型（video/audio）的第一条流"""
+    for stream in (info or {}).get("streams", []):
+        if stream.get("codec_type") == codec_type:
+            return stream
+    return None
+
+
+def get_duration(file_path):
+    """文件时长（秒）：优先 format 级时长，其次视频流、任意流的时长"""
+    info = probe(file_path)
+    if not info:
+        return None
+    duration = _positive_float(info["format"].get("duration"))
+    if duration:
+        return duration
+    video = first_stream(info, "video")
+    if video:
+        duration = _positive_float(video.get("duration"))
+        if duration:
+            return duration
+    for stream in info["streams"]:
+        duration = _positive_float(stream.get("duration"))
+        if duration:
+            return duration
+    return None
+
+
+def get_video_info(file_path):
+    """第一条视频流的帧率、宽高与编码，没有视频流时返回 None"""
+    video = first_stream(probe(file_path), "video")
+    if not video:
+        return None
+    return {
+        "fps": _parse_rate(video.get("r_frame_rate") or "") or _parse_rate(video.get("avg_frame_rate") or ""),
+        "width": video.get("width"),
+        "height": video.get("height"),
+        "codec": video.get("codec_name"),
+        "pix_fmt": video.get("pix_fmt"),
+    }
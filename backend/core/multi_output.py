@@ -0,0 +1,89 @@
+"""
+多目标转换 - 一个源文件一次解码，经 split / asplit 同时输出多个模式
+
+各目标的编码参数与 /api/media/convert 单模式命令一致；视频经 split 分给各视频目标
+（logo 目标在分支上缩放、叠加），音频经 asplit 分给所有带音频的目标。
+源文件没有视频流时跳过视频目标，没有音频流时跳过纯音频目标。
+"""
+from .logo_overlay import prescaled_logo, CANVAS
+
+# 模式 -> (输出后缀, 是否需要视频, 编码参数)
+TARGETS = {
+    'h264': ('_h264.mp4', True, ['-c:v', 'libx264', '-c:a', 'aac', '-avoid_negative_ts', 'make_zero']),
+    'x264': ('_x264.mp4', True, ['-c:v', 'libx264', '-crf', '20', '-c:a', 'aac', '-avoid_negative_ts', 'make_zero']),
+    'dnxhr': ('_dnxhr.mov', True, ['-c:v', 'dnxhd', '-profile:v', 'dnxhr_hq', '-c:a', 'pcm_s16le',
+                                   '-avoid_negative_ts', 'make_zero']),
+    'dnxhr_hqx': ('_dnxhr_hqx.mov', True, ['-c:v', 'dnxhd', '-profile:v', 'dnxhr_hqx', '-c:a', 'pcm_s16le',
+                                           '-avoid_negative_ts', 'make_zero']),
+    'mp3': ('.mp3', False, ['-acodec', 'libmp3lame', '-b:a', '192k']),
+    'wav': ('.wav', False, ['-acodec', 'pcm_s16le']),
+}
+LOGO_ARGS = ['-c:v', 'libx264', '-c:a', 'aac', '-b:a', '128k']
+LOGO_ARGS_NO_FILE = ['-c:v', 'libx264', '-c:a', 'aac']   # logo 文件缺失时与单模式一样只做格式转换
+
+
+def build_multi_output_cmd(source, targets, has_video=True, has_audio=True):
+    """
+    生成一次解码、多路输出的 ffmpeg 命令。
+
+    :param targets: [(模式, 输出路径, logo)]，logo 为 (logo 路径, {'x','y','w','h'})、
+        logo 文件缺失时为 False、非 logo 模式为 None；模式须在 TARGETS 中或带 logo 参数
+    :return: (cmd, [实际生成的输出路径], [(跳过的模式, 原因)])；没有可生成的输出时 cmd 为 None
+    """
+    selected, skipped = [], []
+    for mode, output_path, logo in targets:
+        needs_video = True if logo is not None else TARGETS[mode][1]
+        if needs_video and not has_video:
+            skipped.append((mode, "源文件没有视频流"))
+        elif not needs_video and not has_audio:
+            skipped.append((mode, "源文件没有音频流"))
+        else:
+            selected.append((mode, output_path, logo))
+    if not selected:
+        return None, [], skipped
+
+    video_targets = [t for t in selected if t[2] is not None or TARGETS[t[0]][1]]
+    cmd = ['ffmpeg', '-y', '-i', source]
+    logo_inputs = {}
+    for mode, _, logo in video_targets:
+        if logo:
+            logo_path, pos = logo
+            logo_inputs[mode] = (len(logo_inputs) + 1, pos, prescaled_logo(logo_path, pos['w'], pos['h']))
+            cmd += ['-i', logo_inputs[mode][2] or logo_path]
+
+    chains = []
+    nv, na = len(video_targets), len(selected) if has_audio else 0
+    if nv:
+        chains.append("[0:v]split=%d%s" % (nv, ''.join(f"[s{i}]" for i in range(nv))))
+    if na:
+        chains.append("[0:a]asplit=%d%s" % (na, ''.join(f"[a{i}]" for i in range(na))))
+
+    w, h = CANVAS
+    video_labels = {}
+    for i, (mode, _, logo) in enumerate(video_targets):
+        video_labels[mode] = f"[s{i}]"
+        if mode in logo_inputs:
+            index, pos, prescaled = logo_inputs[mode]
+            logo_label = f"[{index}:v]"
+            if not prescaled:
+                chains.append(f"[{index}:v]scale={pos['w']}:{pos['h']}[l{i}]")
+                logo_label = f"[l{i}]"
+            chains.append(f"[s{i}]scale={w}:{h}:force_original_aspect_ratio=decrease,"
+                          f"pad={w}:{h}:(ow-iw)/2:(oh-ih)/2[c{i}]")
+            chains.append(f"[c{i}]{logo_label}overlay={pos['x']}:{pos['y']}:eof_action=repeat[o{i}]")
+            video_labels[mode] = f"[o{i}]"
+    cmd += ['-filter_complex', ';'.join(chains)]
+
+    outputs = []
+    for k, (mode, output_path, logo) in enumerate(selected):
+        if mode in video_labels:
+            cmd += ['-map', video_labels[mode]]
+        if na:
+            cmd += ['-map', f"[a{k}]"]
+        if logo is not None:
+            cmd += LOGO_ARGS if logo else LOGO_ARGS_NO_FILE
+        else:
+            cmd += TARGETS[mode][2]
+        cmd.append(output_path)
+        outputs.append(output_path)
+    return cmd, outputs, skipped
@@ -0,0 +1,267 @@
+"""
+感知哈希批量计算 - 并行、全程内存解码
+
+- 图片：Pillow draft() 让 JPEG 解码时直接按 1/2~1/8 缩小并只解灰度，再 LANCZOS 缩到哈希尺寸
+- 视频：ffmpeg 解出首帧后直接缩小为灰度 rawvideo 写到管道，不再落临时 JPEG；
+  指纹模式下一次解码按时长均匀取 N 帧（长视频只解关键帧），每帧一个哈希组成定长指纹
+- 算法：dhash（默认，与旧实现位布局一致：第 row 行第 col 列左像素 < 右像素时置位
+  row * 8 + col）、ahash（像素 > 均值）、phash（32x32 DCT 低频 8x8 > 中位数，需要 numpy）；
+  同一次解码可同时算出多种哈希
+- 并行：图片按批提交到共享进程池（解码与缩放是 CPU 密集）；视频的解码在 ffmpeg
+  子进程中完成，用线程池并发启动
+"""
+import os
+import math
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+HASH_SIZE = 8
+HASH_ALGORITHMS = ('dhash', 'ahash', 'phash')
+HASH_VERSION = 1     # 解码或哈希计算方式变化时递增，使持久化的哈希缓存失效
+IMAGE_CHUNK = 32     # 每个进程池任务处理的图片数，摊薄进程间传输开销
+VIDEO_TIMEOUT = 30
+PREVIEW_SCALE = 8    # 视频帧在 ffmpeg 中先缩到哈希尺寸的 8 倍（72x64），再由 Pillow 精确缩放
+PHASH_FACTOR = 4     # pHash 在 hash_size * 4 的图上做 DCT
+VIDEO_FRAMES = 8     # 多帧视频指纹（需显式开启）的默认采样帧数
+KEYFRAMES_ONLY_AFTER = 120.0  # 超过该时长（秒）的视频采样时只解关键帧
+
+
+def default_workers():
+    """并发数：环境变量 PYMEDIA_HASH_WORKERS，默认 CPU 数（最多 8）"""
+    return int(os.environ.get('PYMEDIA_HASH_WORKERS', 0)) or max(1, min(8, os.cpu_count() or 1))
+
+
+def _bits_to_int(bits):
+    """按行优先顺序的布尔数组/序列 -> 整数，第 k 个元素为第 k 位"""
+    if np is not None and isinstance(bits, np.ndarray):
+        return int.from_bytes(np.packbits(bits.ravel(), bitorder='little').tobytes(), 'little')
+    value = 0
+    for k, bit in enumerate(bits):
+        if bit:
+            value |= 1 << k
+    return value
+
+
+def dhash_from_pixels(pixels, hash_size=HASH_SIZE):
+    """(hash_size+1) x hash_size 的灰度像素（行优先的 bytes）-> 整数 dHash"""
+    width = hash_size + 1
+    if np is not None:
+        grid = np.frombuffer(bytes(pixels), dtype=np.uint8).reshape(hash_size, width)
+        return _bits_to_int(grid[:, :-1] < grid[:, 1:])
+    return _bits_to_int(pixels[row * width + col] < pixels[row * width + col + 1]
+                        for row in range(hash_size) for col in range(hash_size))
+
+
+def ahash_from_pixels(pixels):
+    """hash_size x hash_size 的灰度像素 -> 整数 aHash（像素 > 均值时置位）"""
+    pixels = bytes(pixels)
+    if np is not None:
+        grid = np.frombuffer(pixels, dtype=np.uint8)
+        return _bits_to_int(grid > grid.mean())
+    mean = sum(pixels) / float(len(pixels))
+    return _bits_to_int(p > mean for p in pixels)
+
+
+def _dct_matrix(n):
+    return np.array([[math.cos(math.pi * (2 * x + 1) * k / (2.0 * n)) for x in range(n)]
+                     for k in range(n)], dtype=np.float64)
+
+
+def phash_from_pixels(pixels, hash_size=HASH_SIZE):
+    """(hash_size*4)^2 的灰度像素 -> 整数 pHash（DCT 低频系数 > 中位数时置位）"""
+    if np is None:
+        raise RuntimeError("pHash 需要 numpy")
+    n = hash_size * PHASH_FACTOR
+    grid = np.frombuffer(bytes(pixels), dtype=np.uint8).reshape(n, n).astype(np.float64)
+    dct = _dct_matrix(n)
+    low = (dct @ grid @ dct.T)[:hash_size, :hash_size]
+    return _bits_to_int(low > np.median(low))
+
+
+def _sizes(algorithms, hash_size):
+    sizes = {'dhash': (hash_size + 1, hash_size), 'ahash': (hash_size, hash_size),
+             'phash': (hash_size * PHASH_FACTOR, hash_size * PHASH_FACTOR)}
+    return [sizes[name] for name in algorithms]
+
+
+def hash_gray_image(img, algorithms=('dhash',), hash_size=HASH_SIZE):
+    """对灰度 PIL 图计算指定的哈希，返回 {算法: 整数哈希}"""
+    from PIL import Image
+    result = {}
+    for name, size in zip(algorithms, _sizes(algorithms, hash_size)):
+        pixels = img.resize(size, Image.LANCZOS).tobytes()
+        if name == 'dhash':
+            result[name] = dhash_from_pixels(pixels, hash_size)
+        elif name == 'ahash':
+            result[name] = ahash_from_pixels(pixels)
+        else:
+            result[name] = phash_from_pixels(pixels, hash_size)
+    return result
+
+
+def load_image_gray(image_path, hash_size=HASH_SIZE):
+    """
+    读取图片为灰度 PIL 图。JPEG 借助 draft() 直接按 DCT 缩放解出不小于 pHash 尺寸的灰度图；
+    缩放目标固定，不随所需算法变化，保证同一文件的各种哈希与缓存的结果一致。
+    """
+    from PIL import Image
+    side = hash_size * PHASH_FACTOR
+    with Image.open(image_path) as img:
+        img.draft('L', (side, side))
+        return img.convert('L')
+
+
+def load_video_gray(video_path, hash_size=HASH_SIZE, timeout=VIDEO_TIMEOUT):
+    """
+    视频首帧：ffmpeg 先按面积平均缩到 dHash 尺寸的 PREVIEW_SCALE 倍并转灰度，
+    原始像素经管道读回，之后与图片走同一个 LANCZOS 缩放，哈希与旧的“截图再读取”结果基本一致。
+    """
+    from PIL import Image
+    preview = ((hash_size + 1) * PREVIEW_SCALE, hash_size * PREVIEW_SCALE)
+    cmd = ['ffmpeg', '-hide_banner', '-nostdin', '-loglevel', 'error',
+           '-threads', '1', '-ss', '0', '-i', video_path, '-frames:v', '1',
+           '-vf', f'scale={preview[0]}:{preview[1]}:flags=area,format=gray',
+           '-f', 'rawvideo', '-pix_fmt', 'gray', '-']
+    result = subprocess.run(cmd, capture_output=True, timeout=timeout)
+    frame_bytes = preview[0] * preview[1]
+    if result.returncode != 0 or len(result.stdout) < frame_bytes:
+        error = result.stderr.decode('utf-8', errors='replace').strip()
+        raise RuntimeError(error[:200] or "未能解码视频首帧")
+    return Image.frombytes('L', preview, result.stdout[:frame_bytes])
+
+
+def load_video_frames(video_path, count, duration, hash_size=HASH_SIZE, timeout=VIDEO_TIMEOUT):
+    """
+    一次解码均匀采样 count 帧：fps 滤镜按 duration / count 的间隔取每个区间中点附近的帧，
+    返回灰度 PIL 图列表。短视频逐帧解码，采样时刻精确，不受 GOP 长度影响（同一素材
+    不同编码参数的副本才能逐帧对上）；长视频只解关键帧（-skip_frame nokey），此时采样
+    间隔远大于 GOP，误差可以接受。结尾处帧不足时 ffmpeg 可能少输出几帧，调用方按需补齐。
+    """
+    from PIL import Image
+    preview = ((hash_size + 1) * PREVIEW_SCALE, hash_size * PREVIEW_SCALE)
+    step = duration / count
+    cmd = ['ffmpeg', '-hide_banner', '-nostdin', '-loglevel', 'error', '-threads', '1']
+    if duration > KEYFRAMES_ONLY_AFTER:
+        cmd += ['-skip_frame', 'nokey']
+    timeout = max(timeout, duration)
+    cmd += ['-i', video_path, '-an', '-sn', '-dn',
+            '-vf', (f'fps=fps={count}/{duration:.6f}:start_time={step / 2:.6f},'
+                    f'scale={preview[0]}:{preview[1]}:flags=area,format=gray'),
+            '-frames:v', str(count), '-f', 'rawvideo', '-pix_fmt', 'gray', '-']
+    result = subprocess.run(cmd, capture_output=True, timeout=timeout)
+    frame_bytes = preview[0] * preview[1]
+    frames = [Image.frombytes('L', preview, result.stdout[k:k + frame_bytes])
+              for k in range(0, len(result.stdout) - frame_bytes + 1, frame_bytes)]
+    if not frames:
+        error = result.stderr.decode('utf-8', errors='replace').strip()
+        raise RuntimeError(error[:200] or "未能解码视频帧")
+    return frames
+
+
+def video_fingerprint(video_path, algorithms=('dhash',), frames=VIDEO_FRAMES, hash_size=HASH_SIZE,
+                      timeout=VIDEO_TIMEOUT):
+    """
+    视频指纹：{算法: 长度为 frames 的哈希元组}。
+    时长未知时退化为首帧哈希的单元素元组。
+    """
+    from . import media_probe
+    duration = media_probe.get_duration(video_path)
+    if not duration or duration <= 0:
+        result = hash_gray_image(load_video_gray(video_path, hash_size, timeout), algorithms, hash_size)
+        return {name: (value,) for name, value in result.items()}
+    images = load_video_frames(video_path, frames, duration, hash_size, timeout)
+    images += [images[-1]] * (frames - len(images))
+    per_frame = [hash_gray_image(img, algorithms, hash_size) for img in images]
+    return {name: tuple(item[name] for item in per_frame) for name in algorithms}
+
+
+def image_dhash(image_path, hash_size=HASH_SIZE):
+    """图片 dHash"""
+    return hash_gray_image(load_image_gray(image_path, hash_size), hash_size=hash_size)['dhash']
+
+
+def video_dhash(video_path, hash_size=HASH_SIZE, timeout=VIDEO_TIMEOUT):
+    """视频首帧 dHash"""
+    return hash_gray_image(load_video_gray(video_path, hash_size, timeout), hash_size=hash_size)['dhash']
+
+
+def _hash_image_chunk(paths, algorithms=('dhash',), hash_size=HASH_SIZE):
+    """进程池任务：返回 [({算法: 哈希} 或 None, 错误信息)]"""
+    results = []
+    for path in paths:
+        try:
+            img = load_image_gray(path, hash_size)
+            results.append((hash_gray_image(img, algorithms, hash_size), None))
+        except Exception as e:
+            results.append((None, str(e)[:200]))
+    return results
+
+
+def _hash_video(path, algorithms=('dhash',), hash_size=HASH_SIZE, frames=1):
+    """线程池任务：返回 [({算法: 哈希或指纹元组} 或 None, 错误信息)]，与图片批次的结果格式一致"""
+    try:
+        if frames > 1:
+            return [(video_fingerprint(path, algorithms, frames, hash_size), None)]
+        return [(hash_gray_image(load_video_gray(path, hash_size), algorithms, hash_size), None)]
+    except Exception as e:
+        return [(None, str(e)[:200])]
+
+
+def hash_files(files, algorithms=('dhash',), workers=None, hash_size=HASH_SIZE,
+               progress_callback=None, cancel_check=None, result_callback=None, video_frames=1):
+    """
+    批量计算感知哈希，返回与 files 等长的 [({算法: 哈希} 或 None, 错误信息)]；
+    video_frames > 1 时视频的值为指纹元组（见 video_fingerprint）。
+
+    :param files: [(路径, 是否视频)]
+    :param algorithms: 要计算的算法，取自 HASH_ALGORITHMS
+    :param video_frames: 视频采样帧数，1 表示只取首帧
+    :param workers: 并发启动的 ffmpeg 数，默认 default_workers()；图片使用共享进程池
+    :param progress_callback: progress_callback(done, total)，在调用线程中执行
+    :param cancel_check: 在调用线程中周期性调用；抛出异常时取消尚未开始的任务
+    :param result_callback: result_callback(index, result)，每个文件完成时在调用线程中执行
+    """
+    from .job_queue import get_process_pool
+
+    algorithms = tuple(algorithms)
+    results = [None] * len(files)
+    images = [i for i, (_, is_video) in enumerate(files) if not is_video]
+    videos = [i for i, (_, is_video) in enumerate(files) if is_video]
+    workers = workers or default_workers()
+
+    futures = {}
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="phash") as executor:
+        for i in videos:
+            futures[executor.submit(_hash_video, files[i][0], algorithms, hash_size, video_frames)] = [i]
+        if images:
+            pool = get_process_pool()
+            for start in range(0, len(images), IMAGE_CHUNK):
+                chunk = images[start:start + IMAGE_CHUNK]
+                futures[pool.submit(_hash_image_chunk, [files[i][0] for i in chunk], algorithms, hash_size)] = chunk
+
+        pending = set(futures)
+        done_count = 0
+        try:
+            while pending:
+                done, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                for future in done:
+                    indices = futures[future]
+                    for i, item in zip(indices, future.result()):
+                        results[i] = item
+                        if result_callback:
+                            result_callback(i, item)
+                    done_count += len(indices)
+                if cancel_check:
+                    cancel_check()
+                if progress_callback:
+                    progress_callback(done_count, len(files))
+        except BaseException:
+            for future in pending:
+                future.cancel()
+            raise
+    return results
@@ -0,0 +1,232 @@
+"""
+场景帧导出 - 一次解码按时间点列表批量截帧
+
+旧做法每个时间点启动一次 `ffmpeg -ss t -i file -frames:v 1`，每次都要重新打开、
+定位文件。这里把时间点写成 select 表达式，一次解码输出所有命中的帧，再用 showinfo
+打印的时间戳把输出图片对应回各个时间点。长视频按时间段拆成多个区间，
+由多个 ffmpeg 进程并行处理（每个区间用输入端 -ss 快速定位）。
+"""
+import os
+import re
+import time
+import shutil
+import bisect
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
+
+MAX_TARGETS_PER_PASS = 300   # 单个 select 表达式最多包含的时间点
+MIN_CHUNK_SECONDS = 120.0    # 并行拆分时每个区间的最小跨度
+SEEK_MARGIN = 0.5            # 区间起点相对第一个时间点的提前量（秒）
+TAIL_MARGIN = 2.0            # 区间终点相对最后一个时间点的延后量（秒）
+TIME_EPS = 1e-4              # 时间戳比较容差，避免浮点误差错过恰好落在时间点上的帧
+
+_PTS_RE = re.compile(r'pts_time:\s*(-?[0-9.]+)')
+
+
+def default_workers():
+    return max(1, min(4, os.cpu_count() or 1))
+
+
+def extract_frame(file_path, t, output_path, quality=2, timeout=30):
+    """单帧截取（逐帧模式，也用作批量模式的兜底）"""
+    cmd = [
+        'ffmpeg', '-y',
+        '-ss', f'{t:.3f}',
+        '-i', file_path,
+        '-frames:v', '1'
+    ]
+    if not output_path.lower().endswith('.png'):
+        cmd.extend(['-q:v', str(quality)])
+    cmd.append(output_path)
+    subprocess.run(cmd, check=True, capture_output=True, timeout=timeout)
+
+
+def _plan_chunks(order, times, workers):
+    """按时间顺序把时间点切分为若干区间：每段不超过 MAX_TARGETS_PER_PASS 个点，
+    并在跨度足够长时按 workers 数均分，便于并行"""
+    if not order:
+        return []
+    span = times[order[-1]] - times[order[0]]
+    parts = 1
+    if workers > 1:
+        parts = max(1, min(workers, int(span // MIN_CHUNK_SECONDS)))
+    parts = max(parts, -(-len(order) // MAX_TARGETS_PER_PASS))
+    size = -(-len(order) // parts)
+    return [order[i:i + size] for i in range(0, len(order), size)]
+
+
+def _select_expr(rel_times):
+    # 选中满足 prev_t < r <= t 的帧（即时间点 r 之后的第一帧）；区间第一帧 prev_t 为 NaN
+    terms = [f"lte({r - TIME_EPS:.6f},t)*(isnan(prev_t)+gt({r - TIME_EPS:.6f},prev_t))" for r in rel_times]
+    return "select='" + "+".join(terms) + "',showinfo"
+
+
+class _Chunk:
+    """一个区间的截帧任务"""
+
+    def __init__(self, indices, times, work_dir, ext, quality):
+        self.indices = indices
+        # 与逐帧模式的 -ss {t:.3f} 保持一致，按毫秒取整
+        times = {i: round(times[i], 3) for i in indices}
+        first = times[indices[0]]
+        last = times[indices[-1]]
+        self.start = max(0.0, first - SEEK_MARGIN)
+        self.length = last - self.start + TAIL_MARGIN
+        self.rel_times = [times[i] - self.start for i in indices]
+        self.dir = tempfile.mkdtemp(prefix='.frames_', dir=work_dir)
+        self.ext = ext
+        self.quality = quality
+        self.selected = 0
+        self.proc = None
+        self.cancelled = False
+
+    def run(self, file_path, timeout):
+        script_path = os.path.join(self.dir, 'select.txt')
+        with open(script_path, 'w', encoding='utf-8') as f:
+            f.write(_select_expr(self.rel_times))
+        cmd = ['ffmpeg', '-hide_banner', '-nostdin', '-y']
+        if self.start > 0:
+            cmd += ['-ss', f'{self.start:.3f}']
+        cmd += [
+            '-t', f'{self.length:.3f}',
+            '-i', file_path,
+            '-an', '-sn', '-dn',
+            '-filter_script:v', script_path,
+            '-vsync', '0'
+        ]
+        if self.ext != 'png':
+            cmd += ['-q:v', str(self.quality)]
+        cmd.append(os.path.join(self.dir, f'frame_%06d.{self.ext}'))
+
+        pts_times = []
+        deadline = time.time() + timeout
+        self.proc = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                     stderr=subprocess.PIPE, text=True, encoding='utf-8', errors='replace')
+        tail = []
+        try:
+            for line in self.proc.stderr:
+                if 'showinfo' in line and 'pts_time' in line:
+                    match = _PTS_RE.search(line)
+                    if match:
+                        pts_times.append(float(match.group(1)))
+                        self.selected = len(pts_times)
+                else:
+                    tail = (tail + [line.strip()])[-5:]
+                if time.time() > deadline:
+                    raise subprocess.TimeoutExpired(cmd, timeout)
+            self.proc.wait()
+        finally:
+            if self.proc.poll() is None:
+                self.proc.kill()
+                self.proc.wait()
+        if self.cancelled:
+            return None
+        if self.proc.returncode != 0:
+            raise RuntimeError(f"ffmpeg 返回 {self.proc.returncode}: {' | '.join(tail)[:200]}")
+        return pts_times
+
+    def kill(self):
+        self.cancelled = True
+        proc = self.proc
+        if proc is not None and proc.poll() is None:
+            proc.kill()
+
+
+def _place_chunk_outputs(chunk, pts_times, output_paths, results):
+    """把区间输出的图片按时间戳对应回各个时间点，移动/复制到目标路径"""
+    frames = [os.path.join(chunk.dir, f'frame_{n:06d}.{chunk.ext}') for n in range(1, len(pts_times) + 1)]
+    if not all(os.path.exists(p) for p in frames):
+        raise RuntimeError("输出帧数与 showinfo 记录不一致")
+    used = {}
+    for idx, rel in zip(chunk.indices, chunk.rel_times):
+        pos = bisect.bisect_left(pts_times, rel - 2 * TIME_EPS)
+        if pos >= len(frames):
+            results[idx] = {"status": "error", "error": "时间点超出视频范围"}
+            continue
+        target = output_paths[idx]
+        if pos in used:
+            shutil.copyfile(used[pos], target)
+        else:
+            os.replace(frames[pos], target)
+            used[pos] = target
+        results[idx] = {"status": "ok"}
+
+
+def extract_frames(file_path, times, output_paths, quality=2, workers=None, timeout=None,
+                   progress_callback=None, cancel_check=None):
+    """
+    按时间点列表批量截帧。
+
+    :param times: 时间点（秒），顺序任意
+    :param output_paths: 与 times 一一对应的输出路径，扩展名决定格式（.png / .jpg）
+    :param workers: 并行 ffmpeg 进程数，默认按 CPU 数（最多 4）
+    :param timeout: 单个区间的超时（秒），默认按区间跨度估算
+    :param progress_callback: progress_callback(done, total)，在调用线程中执行
+    :param cancel_check: 在调用线程中周期性调用，抛出异常即中止所有 ffmpeg 进程
+    :return: 与 times 对应的结果列表 [{"status": "ok"} | {"status": "error", "error": ...}]
+    """
+    total = len(times)
+    results = [None] * total
+    if not total:
+        return results
+
+    workers = workers or default_workers()
+    ext = 'png' if output_paths[0].lower().endswith('.png') else 'jpg'
+    work_dir = os.path.dirname(os.path.abspath(output_paths[0]))
+    order = sorted(range(total), key=lambda i: times[i])
+    chunks = [_Chunk(indices, times, work_dir, ext, quality) for indices in _plan_chunks(order, times, workers)]
+
+    def run_chunk(chunk):
+        chunk_timeout = timeout or (300 + 4 * chunk.length)
+        pts_times = chunk.run(file_path, chunk_timeout)
+        if pts_times is not None:
+            _place_chunk_outputs(chunk, pts_times, output_paths, results)
+
+    failed_chunks = []
+    try:
+        with ThreadPoolExecutor(max_workers=min(workers, len(chunks))) as executor:
+            futures = {executor.submit(run_chunk, chunk): chunk for chunk in chunks}
+            pending = set(futures)
+            try:
+                while pending:
+                    done, pending = wait(pending, timeout=0.5, return_when=FIRST_EXCEPTION)
+                    for future in done:
+                        if future.exception() is not None:
+                            failed_chunks.append((futures[future], future.exception()))
+                    if cancel_check:
+                        cancel_check()
+                    if progress_callback:
+                        progress_callback(min(total, sum(c.selected for c in chunks)), total)
+            except BaseException:
+                for chunk in chunks:
+                    chunk.kill()
+                raise
+    finally:
+        for chunk in chunks:
+            shutil.rmtree(chunk.dir, ignore_errors=True)
+
+    # 批量模式失败的区间逐帧兜底
+    for chunk, error in failed_chunks:
+        print(f"[场景帧] 区间 {chunk.start:.1f}s 批量截帧失败，改为逐帧: {error}")
+        for idx in chunk.indices:
+            if results[idx] is not None:
+                continue
+            if cancel_check:
+                cancel_check()
+            try:
+                extract_frame(file_path, times[idx], output_paths[idx], quality)
+                results[idx] = {"status": "ok"}
+            except subprocess.TimeoutExpired:
+                results[idx] = {"status": "timeout"}
+            except subprocess.CalledProcessError as e:
+                results[idx] = {
+                    "status": "error",
+                    "error": e.stderr.decode('utf-8', errors='replace')[:200] if e.stderr else str(e)
+                }
+    for idx in range(total):
+        if results[idx] is None:
+            results[idx] = {"status": "error", "error": "未能截取该帧"}
+    if progress_callback:
+        progress_callback(total, total)
+    return results
@@ -0,0 +1,277 @@
+"""
+场景分数缓存 - 一次解码记录每一帧的场景变化分数，阈值/最小间隔可随时重新套用
+
+打分使用 select 滤镜的 scene 值（与旧的 `select='gt(scene,T)'` 检测完全同源），
+通过 metadata=print 输出到 stdout；结果以 (时间戳, 分数) 两个数组压缩缓存在
+缓存目录中，按源文件路径/大小/mtime 命名。调整阈值只需在数组上筛选，不必重新解码。
+
+长视频按时间段拆分给多个 ffmpeg 进程并行打分。每段向前多解码 OVERLAP 秒：
+scene 分数依赖前一帧（以及前一帧的 MAFD），预热之后的帧分数与整段解码完全一致，
+合并时每段只保留自己区间内的帧，接缝处不会重复也不会缺帧。
+"""
+import os
+import sys
+import time
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
+
+import numpy as np
+
+from .cache_utils import atomic_writer, file_signature, signature_cache_path
+from . import media_probe
+
+SCORES_VERSION = 1
+START_SKIP = 0.3          # 开头 0.3 秒内的切换点通常是视频开始，不算真正的场景切换
+MIN_CHUNK_SECONDS = 300.0  # 每个并行区间的最小时长，过短时进程启动与 seek 开销得不偿失
+OVERLAP = 1.0             # 区间向前多解码的预热时长（秒）
+SEAM_PAD = 0.5            # 区间末尾多解码的时长，接缝处重复的帧在合并时去掉
+
+
+def default_workers():
+    """并行打分的进程数：环境变量 PYMEDIA_SCENE_WORKERS，默认 CPU 数（最多 8）"""
+    return int(os.environ.get('PYMEDIA_SCENE_WORKERS', 0)) or max(1, min(8, os.cpu_count() or 1))
+
+
+def _range_timeout(length):
+    """按区间时长估算超时：至少 10 分钟，长区间按 0.5 倍速留余量"""
+    return max(600.0, 2.0 * (length or 0.0))
+
+
+class _ScoreRange:
+    """一个区间的打分任务；keep_from 之前的帧只用于预热，不计入结果"""
+
+    def __init__(self, start=None, length=None, keep_from=None, span=None):
+        self.start = start
+        self.length = length
+        self.keep_from = keep_from
+        self.span = span or length   # 预计解码时长，用于估算超时（末段不加 -t，避免探测时长偏短时截掉结尾）
+        self.position = 0.0   # 已处理到的区间内时间（秒），用于汇总进度
+        self.proc = None
+        self.stopped = False
+
+    def stop(self):
+        self.stopped = True
+        proc = self.proc
+        if proc is not None and proc.poll() is None:
+            proc.kill()
+
+    def run(self, file_path, timeout=None):
+        times, scores = _score_range(file_path, self.start, self.length,
+                                     timeout or _range_timeout(self.span), owner=self)
+        if self.keep_from is not None:
+            keep = next((i for i, t in enumerate(times) if t >= self.keep_from), len(times))
+            times, scores = times[keep:], scores[keep:]
+        return times, scores
+
+
+def _score_range(file_path, start=None, length=None, timeout=600, cancel_check=None,
+                 progress_callback=None, owner=None):
+    """
+    对 [start, start+length) 打分，返回 (times, scores) 两个列表，时间为源文件时间轴。
+    区间内第一帧没有前一帧可比，分数为 0。owner 为 _ScoreRange 时记录进程与进度，供外部终止。
+    """
+    cmd = ['ffmpeg', '-hide_banner', '-nostdin', '-loglevel', 'error']
+    if start:
+        cmd += ['-ss', f'{start:.3f}']
+    if length:
+        cmd += ['-t', f'{length:.3f}']
+    cmd += [
+        '-i', file_path,
+        '-an', '-sn', '-dn',
+        '-vf', "select='gte(scene,0)',metadata=print:file=-",
+        '-f', 'null', '-'
+    ]
+    offset = start or 0.0
+    times, scores = [], []
+    deadline = time.time() + timeout
+    proc = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE, text=True, encoding='utf-8', errors='replace')
+    if owner is not None:
+        owner.proc = proc
+        if owner.stopped:
+            proc.kill()
+    try:
+        for line in proc.stdout:
+            if line.startswith('frame:'):
+                pos = line.find('pts_time:')
+                if pos < 0:
+                    continue
+                try:
+                    t = float(line[pos + 9:].split()[0])
+                except (ValueError, IndexError):
+                    continue
+                times.append(round(t + offset, 6))
+                scores.append(0.0)
+                if len(times) % 500 == 0:
+                    if time.time() > deadline:
+                        raise subprocess.TimeoutExpired(cmd, timeout)
+                    if cancel_check:
+                        cancel_check()
+                    if progress_callback:
+                        progress_callback(t)
+                    if owner is not None:
+                        owner.position = t
+            elif line.startswith('lavfi.scene_score=') and scores:
+                try:
+                    scores[-1] = float(line[18:])
+                except ValueError:
+                    pass
+        stderr_output = proc.stderr.read()
+        proc.wait()
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+    if owner is not None and owner.stopped:
+        raise RuntimeError("场景打分已终止")
+    if proc.returncode != 0:
+        # 中途失败时已解析的帧不完整，不能当作整段结果（否则缺失的分数会被写入缓存）
+        raise RuntimeError(f"FFmpeg 场景打分失败 (returncode={proc.returncode}, 已解析 {len(times)} 帧): "
+                           f"{stderr_output.strip()[:200]}")
+    return times, scores
+
+
+def _save_scores(path, times, scores):
+    with atomic_writer(path) as f:
+        np.savez_compressed(f, times=times, scores=scores)
+
+
+def _load_scores(path):
+    with np.load(path) as data:
+        return data["times"], data["scores"]
+
+
+def _plan_ranges(duration, workers):
+    """把 [0, duration) 均分为若干区间，返回 _ScoreRange 列表"""
+    parts = max(1, min(workers, int(duration // MIN_CHUNK_SECONDS)))
+    if parts == 1:
+        return [_ScoreRange()]
+    step = duration / parts
+    ranges = []
+    for i in range(parts):
+        keep_from = i * step
+        if i == 0:
+            ranges.append(_ScoreRange(length=step + SEAM_PAD))
+        elif i == parts - 1:
+            ranges.append(_ScoreRange(start=keep_from - OVERLAP, keep_from=keep_from,
+                                      span=duration - keep_from + OVERLAP))
+        else:
+            ranges.append(_ScoreRange(start=keep_from - OVERLAP, length=step + OVERLAP + SEAM_PAD, keep_from=keep_from))
+    return ranges
+
+
+def score_file(file_path, workers=None, duration=None, timeout=None, cancel_check=None, progress_callback=None):
+    """
+    解码整个文件打分（不读写缓存），返回 (times, scores) 数组。
+
+    :param workers: 并行 ffmpeg 进程数，默认 default_workers()；时长不足时自动减少
+    :param timeout: 单个区间的超时（秒），默认按区间时长估算
+    :param cancel_check: 在调用线程中周期性调用，抛出异常即终止所有 ffmpeg 进程
+    :param progress_callback: progress_callback(已处理秒数)，在调用线程中执行
+    """
+    workers = workers or default_workers()
+    if duration is None:
+        duration = media_probe.get_duration(file_path) or 0.0
+    ranges = _plan_ranges(duration, workers)
+
+    if len(ranges) == 1:
+        times, scores = _score_range(file_path, timeout=timeout or _range_timeout(duration),
+                                     cancel_check=cancel_check, progress_callback=progress_callback)
+    else:
+        print(f"[场景打分] {os.path.basename(file_path)}: 拆分为 {len(ranges)} 个区间并行打分")
+        with ThreadPoolExecutor(max_workers=len(ranges), thread_name_prefix="scene-score") as executor:
+            futures = [executor.submit(r.run, file_path, timeout) for r in ranges]
+            pending = set(futures)
+            try:
+                while pending:
+                    done, pending = wait(pending, timeout=0.5, return_when=FIRST_EXCEPTION)
+                    for future in done:
+                        if future.exception() is not None:
+                            raise future.exception()
+                    if cancel_check:
+                        cancel_check()
+                    if progress_callback:
+                        progress_callback(sum(r.position for r in ranges))
+            except BaseException:
+                for r in ranges:
+                    r.stop()
+                raise
+        times, scores = [], []
+        for future in futures:
+            part_times, part_scores = future.result()
+            # 各区间按时间顺序拼接；保险起见丢弃不晚于上一段末尾的帧
+            if times and part_times:
+                keep = next((i for i, t in enumerate(part_times) if t > times[-1]), len(part_times))
+                part_times, part_scores = part_times[keep:], part_scores[keep:]
+            times.extend(part_times)
+            scores.extend(part_scores)
+
+    return np.asarray(times, dtype=np.float64), np.asarray(scores, dtype=np.float32)
+
+
+def get_scores(file_path, workers=None, timeout=None, cancel_check=None, progress_callback=None):
+    """
+    返回 (times, scores, cached)：times 为 float64 秒，scores 为 float32 场景分数。
+    已有缓存时直接读取，否则解码打分并写入缓存。
+    """
+    signature = file_signature(file_path)
+    if signature is None:
+        raise FileNotFoundError(file_path)
+    path = signature_cache_path('scene_scores', signature, 'npz', SCORES_VERSION)
+    if os.path.exists(path):
+        try:
+            times, scores = _load_scores(path)
+            return times, scores, True
+        except Exception as e:
+            print(f"[场景打分] 缓存损坏，重新打分: {e}")
+
+    times, scores = score_file(file_path, workers=workers, timeout=timeout,
+                               cancel_check=cancel_check, progress_callback=progress_callback)
+    try:
+        _save_scores(path, times, scores)
+    except Exception as e:
+        print(f"[场景打分] 缓存写入失败: {e}")
+    return times, scores, False
+
+
+def detect_scene_points(times, scores, threshold, min_interval):
+    """
+    按阈值和最小间隔从分数数组中筛选场景切换点，规则与旧的逐行解析一致：
+    分数 > threshold，跳过开头 START_SKIP 秒，与上一个切换点间隔不足 min_interval 的丢弃。
+    """
+    candidates = times[(scores > threshold) & (times >= START_SKIP)]
+    points = []
+    last_time = -min_interval
+    for t in candidates.tolist():
+        if t - last_time < min_interval:
+            continue
+        points.append(t)
+        last_time = t
+    return points
+
+
+def _benchmark(file_path, worker_counts):
+    """并行打分基准：python -m core.scene_scores <视频> [1,2,4,...]，并校验各结果与单进程一致"""
+    duration = media_probe.get_duration(file_path)
+    print(f"文件: {file_path}, 时长: {duration}s, CPU: {os.cpu_count()}")
+    baseline = None
+    for workers in worker_counts:
+        started = time.time()
+        times, scores = score_file(file_path, workers=workers, duration=duration)
+        elapsed = time.time() - started
+        if baseline is None:
+            baseline = (elapsed, times, scores)
+            same = True
+        else:
+            same = (len(times) == len(baseline[1]) and np.array_equal(times, baseline[1])
+                    and np.array_equal(scores, baseline[2]))
+        print(f"workers={workers:<3d} 帧数={len(times):<8d} 耗时={elapsed:7.2f}s "
+              f"加速比={baseline[0] / elapsed:5.2f}x 与单进程一致={same}")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("用法: python -m core.scene_scores <视频文件> [worker 数列表，如 1,2,4,8]")
+        sys.exit(1)
+    counts = [int(x) for x in sys.argv[2].split(',')] if len(sys.argv) > 2 else [1, 2, 4, os.cpu_count() or 1]
+    _benchmark(sys.argv[1], counts)
@@ -0,0 +1,283 @@
+"""
+视频裁切 - 快速（流复制）/ 精确（重编码）/ 智能（只重编码首尾不完整的 GOP）
+
+智能裁切：根据关键帧索引，把 [start, end) 拆为
+    头部 [start, 第一个关键帧) —— 重编码
+    中间 [第一个关键帧, 最后一个关键帧) —— 流复制
+    尾部 [最后一个关键帧, end) —— 重编码
+三段以 MPEG-TS 形式输出（参数集随码流携带，拼接后解码器可直接切换），
+再用 concat 合并视频，音频从源文件一次性精确截取后混流，避免分段音频拼接产生间隙。
+
+批量导出多个片段时（场景拆分）：
+    cut_many —— 有界线程池并行驱动多个 ffmpeg 进程，每个片段用输入端 -ss 定位
+    segment_split —— 一次解码 + segment 封装器，在切分点强制关键帧，一个进程输出所有片段
+"""
+import os
+import shutil
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from . import media_probe
+
+# 与源视频编码匹配的重编码器；其他编码不支持智能裁切，退回精确模式。
+# 只支持 H.264：HEVC 常见的 CRA 开放 GOP 在流复制段开头会带出无法解码的 RASL 帧
+SMART_ENCODERS = {
+    'h264': ['-c:v', 'libx264', '-crf', '18', '-preset', 'fast'],
+}
+MIN_COPY_SECONDS = 1.0  # 可流复制部分短于该值时直接整段重编码
+PART_FORMAT = ('mpegts', 'ts')  # 分段中间文件的封装格式与扩展名
+
+
+def precise_cut(file_path, start, end, output_path, timeout=300):
+    """精确裁切：输入端 -ss 快速定位后精确截取，视频 libx264 CRF 18 重编码"""
+    cmd = [
+        'ffmpeg', '-y',
+        '-ss', f'{start:.3f}',
+        '-i', file_path,
+        '-t', f'{end - start:.3f}',
+        '-c:v', 'libx264', '-crf', '18', '-preset', 'fast',
+        '-c:a', 'aac', '-b:a', '192k',
+        '-avoid_negative_ts', 'make_zero',
+        output_path
+    ]
+    subprocess.run(cmd, check=True, capture_output=True, timeout=timeout)
+
+
+def copy_cut(file_path, start, end, output_path, timeout=300):
+    """快速裁切：流复制，起点落在关键帧上（不精确）"""
+    cmd = [
+        'ffmpeg', '-y',
+        '-ss', f'{start:.3f}',
+        '-i', file_path,
+        '-t', f'{end - start:.3f}',
+        '-c', 'copy',
+        '-avoid_negative_ts', 'make_zero',
+        output_path
+    ]
+    subprocess.run(cmd, check=True, capture_output=True, timeout=timeout)
+
+
+def plan_smart_cut(keyframes, start, end):
+    """
+    根据关键帧索引 [[时间, 包序号, 是否封闭], ...] 返回 (copy_start, copy_end, packet_count)：
+    可流复制的关键帧区间及其包含的包数；没有足够长的完整 GOP 时返回 None。
+    起止点只取封闭 GOP 的关键帧：开放 GOP 的前导帧参考上一个 GOP，流复制后无法解码。
+    """
+    inner = [k for k in keyframes if start <= k[0] <= end and k[2]]
+    if not inner:
+        return None
+    (copy_start, first_packet, _), (copy_end, last_packet, _) = inner[0], inner[-1]
+    if copy_end - copy_start < MIN_COPY_SECONDS or last_packet <= first_packet:
+        return None
+    return copy_start, copy_end, last_packet - first_packet
+
+
+def _encode_part(file_path, start, end, output_path, encoder_args, pix_fmt, timeout):
+    cmd = [
+        'ffmpeg', '-y',
+        '-ss', f'{start:.6f}',
+        '-i', file_path,
+        '-t', f'{end - start:.6f}',
+        '-map', '0:v:0', '-an', '-sn', '-dn',
+    ] + encoder_args
+    if pix_fmt:
+        cmd += ['-pix_fmt', pix_fmt]
+    cmd += ['-f', PART_FORMAT[0], output_path]
+    subprocess.run(cmd, check=True, capture_output=True, timeout=timeout)
+
+
+def _copy_part(file_path, start, packet_count, output_path, timeout):
+    # 流复制按包数截止：-t 按时间截断时，B 帧重排可能多带出下一个 GOP 的帧
+    cmd = [
+        'ffmpeg', '-y',
+        '-ss', f'{start:.6f}',
+        '-i', file_path,
+        '-map', '0:v:0', '-an', '-sn', '-dn',
+        '-c:v', 'copy',
+        '-frames:v', str(packet_count),
+        '-f', PART_FORMAT[0], output_path
+    ]
+    subprocess.run(cmd, check=True, capture_output=True, timeout=timeout)
+
+
+def smart_cut(file_path, start, end, output_path, timeout=300):
+    """
+    智能裁切，帧级精度且只重编码首尾。
+    无法智能裁切（非 H.264、没有关键帧索引或区间内没有完整的封闭 GOP）时退回精确模式。
+
+    :return: {"mode": "smart" | "precise", "copied": 流复制时长, "reencoded": 重编码时长}
+    """
+    info = media_probe.probe(file_path)
+    video = media_probe.first_stream(info, "video")
+    encoder_args = SMART_ENCODERS.get((video or {}).get("codec_name"))
+    keyframes = media_probe.get_keyframes(file_path) if encoder_args else None
+    plan = plan_smart_cut(keyframes, start, end) if keyframes else None
+    if plan is None:
+        precise_cut(file_path, start, end, output_path, timeout)
+        return {"mode": "precise", "copied": 0.0, "reencoded": round(end - start, 3)}
+
+    copy_start, copy_end, packet_count = plan
+    has_audio = media_probe.first_stream(info, "audio") is not None
+    work_dir = tempfile.mkdtemp(prefix='.smartcut_', dir=os.path.dirname(os.path.abspath(output_path)))
+    try:
+        parts = []
+        if copy_start > start:
+            head = os.path.join(work_dir, f'head.{PART_FORMAT[1]}')
+            _encode_part(file_path, start, copy_start, head, encoder_args, video.get("pix_fmt"), timeout)
+            parts.append(head)
+        middle = os.path.join(work_dir, f'middle.{PART_FORMAT[1]}')
+        _copy_part(file_path, copy_start, packet_count, middle, timeout)
+        parts.append(middle)
+        if end > copy_end:
+            tail = os.path.join(work_dir, f'tail.{PART_FORMAT[1]}')
+            _encode_part(file_path, copy_end, end, tail, encoder_args, video.get("pix_fmt"), timeout)
+            parts.append(tail)
+
+        list_path = os.path.join(work_dir, 'parts.txt')
+        with open(list_path, 'w', encoding='utf-8') as f:
+            for part in parts:
+                f.write(f"file '{part}'\n")
+
+        cmd = ['ffmpeg', '-y', '-f', 'concat', '-safe', '0', '-i', list_path]
+        if has_audio:
+            cmd += ['-ss', f'{start:.3f}', '-t', f'{end - start:.3f}', '-i', file_path,
+                    '-map', '0:v:0', '-map', '1:a:0', '-c:a', 'aac', '-b:a', '192k']
+        else:
+            cmd += ['-map', '0:v:0']
+        cmd += ['-c:v', 'copy', '-avoid_negative_ts', 'make_zero', output_path]
+        subprocess.run(cmd, check=True, capture_output=True, timeout=timeout)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    copied = copy_end - copy_start
+    return {"mode": "smart", "copied": round(copied, 3), "reencoded": round((end - start) - copied, 3)}
+
+
+def cut(file_path, start, end, output_path, mode='precise', timeout=300):
+    """按模式裁切（fast / precise / smart），返回实际使用的模式"""
+    if mode == 'fast':
+        copy_cut(file_path, start, end, output_path, timeout)
+        return {"mode": "fast"}
+    if mode == 'smart':
+        return smart_cut(file_path, start, end, output_path, timeout)
+    precise_cut(file_path, start, end, output_path, timeout)
+    return {"mode": "precise"}
+
+
+def default_workers():
+    """并行裁切的 ffmpeg 进程数：环境变量 PYMEDIA_CUT_WORKERS，默认 CPU 数（最多 8）"""
+    return int(os.environ.get('PYMEDIA_CUT_WORKERS', 0)) or max(1, min(8, os.cpu_count() or 1))
+
+
+def cut_many(file_path, items, mode='precise', workers=None, timeout=300,
+             progress_callback=None, cancel_check=None):
+    """
+    并行导出多个片段。
+
+    :param items: [(start, end, output_path), ...]
+    :param progress_callback: progress_callback(done, total)，在调用线程中执行
+    :param cancel_check: 在调用线程中周期性调用；抛出异常时不再启动新的片段，等待进行中的片段结束后抛出
+    :return: 与 items 对应的结果列表 {"status": "ok", ...} / {"status": "error", "error": ...}
+    """
+    total = len(items)
+    results = [None] * total
+    if not total:
+        return results
+    workers = max(1, min(workers or default_workers(), total))
+
+    def run(start, end, output_path):
+        return cut(file_path, start, end, output_path, mode=mode, timeout=timeout)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="cut") as executor:
+        futures = {executor.submit(run, *item): i for i, item in enumerate(items)}
+        pending = set(futures)
+        try:
+            while pending:
+                done, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                for future in done:
+                    i = futures[future]
+                    try:
+                        results[i] = dict(future.result(), status="ok")
+                    except subprocess.TimeoutExpired:
+                        results[i] = {"status": "timeout"}
+                    except subprocess.CalledProcessError as e:
+                        results[i] = {
+                            "status": "error",
+                            "error": e.stderr.decode('utf-8', errors='replace')[-200:] if e.stderr else str(e)
+                        }
+                    except Exception as e:
+                        results[i] = {"status": "error", "error": str(e)}
+                if cancel_check:
+                    cancel_check()
+                if progress_callback:
+                    progress_callback(sum(1 for r in results if r is not None), total)
+        except BaseException:
+            for future in pending:
+                future.cancel()
+            raise
+    return results
+
+
+def plan_segment_split(ranges):
+    """
+    检查片段能否用 segment 封装器一次输出：片段互不重叠，且每个片段正好是相邻切分点之间的一段。
+    返回 (boundaries, piece_indices)：切分点列表与每个片段对应的分段序号；无法一次输出时返回 None。
+    """
+    boundaries = sorted({round(t, 6) for start, end in ranges for t in (start, end)})
+    piece_indices = []
+    for start, end in ranges:
+        k = boundaries.index(round(start, 6))
+        if k + 1 >= len(boundaries) or boundaries[k + 1] != round(end, 6):
+            return None
+        piece_indices.append(k)
+    if len(set(piece_indices)) != len(piece_indices):
+        return None
+    return boundaries, piece_indices
+
+
+def segment_split(file_path, items, timeout=None):
+    """
+    一次解码导出所有片段（精确重编码）：在每个切分点强制关键帧，segment 封装器按切分点分段。
+    片段之间的空隙也会被编码，但只保留请求的片段。
+
+    :param items: [(start, end, output_path), ...]，须满足 plan_segment_split
+    """
+    plan = plan_segment_split([(start, end) for start, end, _ in items])
+    if plan is None:
+        raise ValueError("片段存在重叠，无法一次性分段输出")
+    boundaries, piece_indices = plan
+    base = boundaries[0]
+    total_length = boundaries[-1] - base
+    cut_points = ','.join(f'{t - base:.6f}' for t in boundaries[1:-1])
+    ext = os.path.splitext(items[0][2])[1] or '.mp4'
+
+    work_dir = tempfile.mkdtemp(prefix='.segments_', dir=os.path.dirname(os.path.abspath(items[0][2])))
+    try:
+        cmd = ['ffmpeg', '-y']
+        if base > 0:
+            cmd += ['-ss', f'{base:.6f}']
+        cmd += [
+            '-i', file_path,
+            '-t', f'{total_length:.6f}',
+            '-c:v', 'libx264', '-crf', '18', '-preset', 'fast',
+            '-c:a', 'aac', '-b:a', '192k',
+        ]
+        if cut_points:
+            cmd += ['-force_key_frames', cut_points, '-segment_times', cut_points]
+        else:
+            cmd += ['-segment_time', f'{total_length + 1:.3f}']
+        cmd += [
+            '-f', 'segment', '-reset_timestamps', '1',
+            os.path.join(work_dir, f'piece_%05d{ext}')
+        ]
+        subprocess.run(cmd, check=True, capture_output=True,
+                       timeout=timeout or max(600.0, 4.0 * total_length))
+
+        for (_, _, output_path), k in zip(items, piece_indices):
+            piece = os.path.join(work_dir, f'piece_{k:05d}{ext}')
+            if not os.path.exists(piece):
+                raise RuntimeError(f"分段输出缺失: 第 {k} 段")
+            os.replace(piece, output_path)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
@@ -2,14 +2,49 @@
 字幕对齐核心逻辑 - 从 SW_GenSubTitle/audio_subtitle_gen_and_checker.py 移植
 """
 import os
+from array import array
+from bisect import bisect_left
 from diff_match_patch import diff_match_patch
 import re
 from .subtitle_utils import wirite_to_path, word_split_by, replace_symbols_to_one
 from .srt_to_fcpxml import SrtsToFcpxml
 
 
+_MISSING = float('nan')   # 时间数组中表示"尚未赋值"
+
+
+def _build_alignment_index(diffs):
+    """
+    按 diffs 建立合并文本与源文本 / 生成文本之间的位置映射，全部为紧凑的并行数组。
+    返回 (merge_text, source_in_all, gen_in_all, all_source, all_gen)：
+    source_in_all[i] / gen_in_all[i] 为源 / 生成文本第 i 个字符在合并文本中的位置，
+    all_source[k] / all_gen[k] 为合并文本第 k 个字符在源 / 生成文本中的位置（没有时为 -1）。
+    """
+    total = sum(len(content) for _, content in diffs)
+    source_in_all = array('q')
+    gen_in_all = array('q')
+    all_source = array('q', [-1]) * total
+    all_gen = array('q', [-1]) * total
+    pos = 0
+    for op, content in diffs:
+        n = len(content)
+        if op in (0, 1):
+            all_source[pos:pos + n] = array('q', range(len(source_in_all), len(source_in_all) + n))
+            source_in_all.extend(range(pos, pos + n))
+        if op in (0, -1):
+            all_gen[pos:pos + n] = array('q', range(len(gen_in_all), len(gen_in_all) + n))
+            gen_in_all.extend(range(pos, pos + n))
+        pos += n
+    return ''.join(content for _, content in diffs), source_in_all, gen_in_all, all_source, all_gen
+
+
 def process_diffs_with_audio_positions_strong(params):
-    """处理差异并计算音频位置"""
+    """
+    处理差异并计算音频位置。
+
+    合并文本（diffs 各段依次拼接）的每个字符对应 audio_start / audio_end 两个数组中的一格，
+    先由生成文本的单词时间填充，再按前后文为源文本独有的字符插值，整体为线性时间。
+    """
     diffs = params['diffs']
     source_text_with_no_info = params['source_text_with_no_info']
     translate_text_dict = params['translate_text_dict']
@@ -25,94 +60,25 @@ def process_diffs_with_audio_positions_strong(params):
     seamless_fcpxml = params["seamless_fcpxml"]
     source_srt_path = params.get("source_srt_path")
     fcpxml_path = params.get("fcpxml_path")
-    
-    merge_text = ""
-    source_text = ""
-    generate_text = ""
-    source_store = {}
-    generate_store = {}
-    allstrings = {}
-
-    def get_source_store(index):
-        if index not in source_store:
-            source_store[index] = {}
-        return source_store[index]
-
-    def get_generate_store(index):
-        if index not in generate_store:
-            generate_store[index] = {}
-        return generate_store[index]
-
-    def get_allstrings(index):
-        if index not in allstrings:
-            allstrings[index] = {}
-        return allstrings[index]
 
     # 生成对应关系
-    for i, (op, content) in enumerate(diffs):
-        length_source = len(source_text)
-        length_generate = len(generate_text)
-        length_all = len(merge_text)
-        length_content = len(content)
-        
-        if op == 1:
-            for number in range(0, length_content):
-                index_all = number + length_all
-                index_source = length_source + number
-                source = get_source_store(index_source)
-                all = get_allstrings(index_all)
-                source["index_in_all"] = index_all
-                all["index"] = index_all
-                all["source_index"] = index_source
-                g = merge_text + content
-                all["char"] = source["char"] = g[index_all]
-            source_text += content
-        elif op == -1:
-            for number in range(0, length_content):
-                index_all = number + length_all
-                index_gen = length_generate + number
-                generate = get_generate_store(index_gen)
-                all = get_allstrings(index_all)
-                all["index"] = generate["index_in_all"] = index_all
-                all["gen_index"] = index_gen
-                g = merge_text + content
-                all["char"] = generate["char"] = g[index_all]
-            generate_text += content
-        elif op == 0:
-            for number in range(0, length_content):
-                index_all = number + length_all
-                index_source = length_source + number
-                source = get_source_store(index_source)
-                all = get_allstrings(index_all)
-                source["index_in_all"] = index_all
-                all["index"] = index_all
-                all["source_index"] = index_source
-                g = merge_text + content
-                all["char"] = source["char"] = g[index_all]
-            source_text += content
-            
-            for number in range(0, length_content):
-                index_all = number + length_all
-                index_gen = length_generate + number
-                generate = get_generate_store(index_gen)
-                all = get_allstrings(index_all)
-                all["index"] = generate["index_in_all"] = index_all
-                all["gen_index"] = index_gen
-                g = merge_text + content
-                all["char"] = generate["char"] = g[index_all]
-            generate_text += content
-        merge_text += content
-
-    if len(generate_text) != len(generation_subtitle_text):
-        return f"比较生成文件长度不同{len(generate_text)}和{len(generation_subtitle_text)}"
+    merge_text, source_in_all, gen_in_all, all_source, all_gen = _build_alignment_index(diffs)
+
+    if len(gen_in_all) != len(generation_subtitle_text):
+        return f"比较生成文件长度不同{len(gen_in_all)}和{len(generation_subtitle_text)}"
     
-    if len(source_text) != len(source_text_with_no_info):
-        return f"比较源文件长度不同{len(source_text)}和{len(source_text_with_no_info)}"
+    if len(source_in_all) != len(source_text_with_no_info):
+        return f"比较源文件长度不同{len(source_in_all)}和{len(source_text_with_no_info)}"
 
     alltextLength = len(merge_text)
     audioEnd = generation_subtitle_array[-1]["audio_end"]
-    
-    text = ""
+    audio_start = array('d', [_MISSING]) * alltextLength
+    audio_end = array('d', [_MISSING]) * alltextLength
+
+    def _assigned(value):
+        return value == value   # NaN 不等于自身
+
+    text_length = 0
     istart = True
     lastpoint = 0
     
@@ -127,179 +93,111 @@ def process_diffs_with_audio_positions_strong(params):
                 word["whitespace"] = True
                 currentContent = word_split_by["en"] + word["word"]
             
-            length_generate = len(text)
-            error = None
+            length_generate = text_length
             if "start" in word:
                 start = word["start"]
                 end = word["end"]
-                score = word["score"]
                 wordtext = word["word"]
                 whitespace = word["whitespace"]
                 eva = (end - start) / len(wordtext) if len(wordtext) > 0 else 0
-                if eva > 0.2:
-                    error = f"从生成添加时间,长度大{eva}"
                 newstart = start
                 lastpoint = end
+                last = len(currentContent) - 1
                 
                 for number in range(0, len(currentContent)):
-                    generate = get_generate_store(length_generate + number)
-                    index_all = generate["index_in_all"]
-                    all = get_allstrings(index_all)
-                    all["char_gen_add_in_time"] = currentContent[number]
-                    all["wordtext"] = wordtext
-                    all["score"] = score
-                    all["eva"] = eva
-                    
+                    index_all = gen_in_all[length_generate + number]
                     if whitespace and number == 0:
-                        all["audio_start"] = newstart
-                        all["audio_end"] = newstart
-                    elif number == len(currentContent) - 1:
-                        all["audio_start"] = newstart
-                        all["audio_end"] = end
+                        audio_start[index_all] = newstart
+                        audio_end[index_all] = newstart
+                    elif number == last:
+                        audio_start[index_all] = newstart
+                        audio_end[index_all] = end
                     else:
-                        all["audio_start"] = newstart
+                        audio_start[index_all] = newstart
                         newstart = round(newstart + eva, 3)
-                        all["audio_end"] = newstart
-                    if error:
-                        all["error"] = error
+                        audio_end[index_all] = newstart
             else:
-                word["error"] = error = "从生成添加时间,没有时间"
-                wordtext = word["word"]
+                word["error"] = "从生成添加时间,没有时间"
                 for number in range(0, len(currentContent)):
-                    generate = get_generate_store(length_generate + number)
-                    index_all = generate["index_in_all"]
-                    all = get_allstrings(index_all)
-                    all["char_gen_add_in_time"] = currentContent[number]
-                    all["wordtext"] = wordtext
-                    all["score"] = 0
-                    all["eva"] = 0
-                    all["audio_start"] = lastpoint
-                    all["audio_end"] = lastpoint
-                    if error:
-                        all["error"] = error
-
-            text += currentContent
-
-    if len(text) != len(generation_subtitle_text):
-        return f"从生成添加时间 长度不同{len(text)}和{len(generation_subtitle_text)}"
-
-    merge_text = ""
-    lastOp = None
+                    index_all = gen_in_all[length_generate + number]
+                    audio_start[index_all] = lastpoint
+                    audio_end[index_all] = lastpoint
+
+            text_length += len(currentContent)
+
+    if text_length != len(generation_subtitle_text):
+        return f"从生成添加时间 长度不同{text_length}和{len(generation_subtitle_text)}"
+
+    def _fill(begin, count, newstart, eva):
+        for index_all in range(begin, begin + count):
+            audio_start[index_all] = newstart
+            newstart = round(newstart + eva, 3)
+            audio_end[index_all] = newstart
+
+    length_all = 0
+    lastOp = None   # (op, 段首位置, 段尾位置)
     
-    # 源文本添加时间戳  
-    for i, (op, content) in enumerate(diffs):
-        length_all = len(merge_text)
+    # 源文本添加时间戳：源文本独有的段按前一段（相同 / 生成错误文本）与后一字符的时间插值
+    for op, content in diffs:
         length_content = len(content)
         if op == 1:
+            tail = length_all + length_content - 1
             if lastOp is None:
-                gen_source = None
+                # 生成开头丢失文本
                 audio_durio = 0.1
                 if length_all + length_content >= alltextLength:
                     audio_durio = audioEnd
-                    gen_source = "结束"
-                else:
-                    all_end = get_allstrings(length_all + length_content - 1)
-                    if "audio_start" in all_end:
-                        gen_source = all_end
-                        audio_durio = max(all_end["audio_start"] - 0.1, 0)
-
-                eva = audio_durio / length_content if length_content > 0 else 0
-                newstart = 0
-                for number in range(0, length_content):
-                    index_all = number + length_all
-                    all = get_allstrings(index_all)
-                    all["audio_start"] = newstart
-                    newstart = round(newstart + eva, 3)
-                    all["audio_end"] = newstart
-                    all["eva"] = eva
-                    all["from"] = "生成开头丢失文本"
-                    all["gen"] = gen_source
-
-            elif lastOp['op'] == 0:
-                gen_source = lastOp
-                newstart = lastOp["all_end"]["audio_end"]
-                audio_end = newstart + 0.2
-                if length_all + length_content >= alltextLength:
-                    audio_end = audioEnd
-                    gen_source = "结束"
-                else:
-                    all_end = get_allstrings(length_all + length_content - 1)
-                    if "audio_start" in all_end:
-                        gen_source = all_end
-                        audio_end = max(all_end["audio_start"] - 0.1, 0)
-
-                audio_durio = audio_end - newstart
+                elif _assigned(audio_start[tail]):
+                    audio_durio = max(audio_start[tail] - 0.1, 0)
                 eva = audio_durio / length_content if length_content > 0 else 0
+                _fill(length_all, length_content, 0, eva)
 
-                for number in range(0, length_content):
-                    index_all = number + length_all
-                    all = get_allstrings(index_all)
-                    all["audio_start"] = newstart
-                    newstart = round(newstart + eva, 3)
-                    all["audio_end"] = newstart
-                    all["eva"] = eva
-                    all["from"] = "生成丢失单词"
-                    all["gen"] = gen_source
-
-            elif lastOp['op'] == -1:
-                all_start = lastOp["all_start"]
-                all_end = lastOp["all_end"]
-                newstart = all_start["audio_start"]
-                audio_durio = all_end["audio_end"] - newstart
+            elif lastOp[0] == 0:
+                # 生成丢失单词
+                newstart = audio_end[lastOp[2]]
+                audio_end_at = newstart + 0.2
+                if length_all + length_content >= alltextLength:
+                    audio_end_at = audioEnd
+                elif _assigned(audio_start[tail]):
+                    audio_end_at = max(audio_start[tail] - 0.1, 0)
+                eva = (audio_end_at - newstart) / length_content if length_content > 0 else 0
+                _fill(length_all, length_content, newstart, eva)
+
+            elif lastOp[0] == -1:
+                # 生成错误文本：沿用被替换的生成文本的时间范围
+                newstart = audio_start[lastOp[1]]
+                audio_durio = audio_end[lastOp[2]] - newstart
                 eva = audio_durio / length_content if length_content > 0 else 0
-                for number in range(0, length_content):
-                    index_all = number + length_all
-                    all = get_allstrings(index_all)
-                    all["audio_start"] = newstart
-                    newstart = round(newstart + eva, 3)
-                    all["audio_end"] = newstart
-                    all["eva"] = eva
-                    all["from"] = "生成错误文本"
-                    all["gen"] = lastOp
+                _fill(length_all, length_content, newstart, eva)
             lastOp = None
-        elif op == -1:
-            all_start = get_allstrings(length_all)
-            all_end = get_allstrings(length_all + length_content - 1)
-            lastOp = {
-                "all_start": all_start,
-                "all_end": all_end,
-                "op": op
-            }
-        elif op == 0:
-            all_start = get_allstrings(length_all)
-            all_end = get_allstrings(length_all + length_content - 1)
-            lastOp = {
-                "all_start": all_start,
-                "all_end": all_end,
-                "op": op
-            }
-        merge_text += content
+        elif op in (-1, 0):
+            lastOp = (op, length_all, length_all + length_content - 1)
+        length_all += length_content
 
     # 检查所有源文件字符串都赋予时间戳
-    for x in allstrings.values():
-        if "source_index" in x and "audio_start" not in x:
+    for index_all in range(alltextLength):
+        if all_source[index_all] >= 0 and not _assigned(audio_start[index_all]):
+            x = {"index": index_all, "source_index": all_source[index_all], "char": merge_text[index_all]}
+            if all_gen[index_all] >= 0:
+                x["gen_index"] = all_gen[index_all]
             return f"检查到没有正常赋值{x}"
 
     # 每个单词的结尾处添加0.2长度
-    sorted_values = [allstrings[key] for key in sorted(allstrings.keys())]
-    les = len(sorted_values)
-    for i, s in enumerate(sorted_values):
-        if 0 < i < les - 1:
-            nextitem = sorted_values[i+1]
-            if "audio_start" in nextitem and "audio_end" in s:
-                current_audio_end = s["audio_end"]
-                next_audio_start = nextitem["audio_start"]
-                if next_audio_start - current_audio_end >= 0.3:
-                    s["audio_end"] = round(s["audio_end"] + 0.1, 3)
-                    nextitem["audio_start"] = round(nextitem["audio_start"] - 0.1, 3)
+    for i in range(1, alltextLength - 1):
+        current_audio_end = audio_end[i]
+        next_audio_start = audio_start[i + 1]
+        if next_audio_start - current_audio_end >= 0.3:   # 任一未赋值（NaN）时比较为 False
+            audio_end[i] = round(current_audio_end + 0.1, 3)
+            audio_start[i + 1] = round(next_audio_start - 0.1, 3)
 
     # 生成字幕文件
-    text = ""
+    text_length = 0
     istart = True
     index = 0
-    source_srt = ""
-    trans_srt = ""
-    merge_srt = ""
+    source_length = len(source_in_all)
+    source_srt = []
+    merge_srt = []
+    trans_srt_parts = {k: [] for k in translate_text_dict}
     
     for content in source_text_with_info["contents"]:
         index += 1
@@ -310,42 +208,43 @@ def process_diffs_with_audio_positions_strong(params):
             currentContent = word_split_by["en"] + content["content"]
 
         if content["type"] is not None:
-            source = get_source_store(len(text))
-            endsource = get_source_store(min(len(text + currentContent) - 1, alltextLength - 1))
-            if "index_in_all" not in endsource or "index_in_all" not in source:
+            first = text_length
+            last = min(text_length + len(currentContent) - 1, alltextLength - 1)
+            if not (0 <= first < source_length and 0 <= last < source_length):
                 print(f"不该发生的错误,找不到存储{content}")
                 continue
-            start = get_allstrings(source["index_in_all"])
-            end = get_allstrings(endsource["index_in_all"])
             if index == 1:
                 srt_start = format_time(0)
             else:
-                srt_start = format_time(start["audio_start"])
-            srt_end = format_time(end["audio_end"])
+                srt_start = format_time(audio_start[source_in_all[first]])
+            srt_end = format_time(audio_end[source_in_all[last]])
 
             merge_transContent = ""
             for k, value in translate_text_dict.items():
                 transContentText = value["translate_text_with_info"]["contents"][index-1]['content']
                 merge_transContent += transContentText + "\n"
-                if "trans_srt" in value:
-                    translate_text_dict[k]["trans_srt"] += f"{index}\n{srt_start} --> {srt_end}\n{transContentText}\n\n"
-                else:
-                    translate_text_dict[k]["trans_srt"] = f"{index}\n{srt_start} --> {srt_end}\n{transContentText}\n\n"
+                trans_srt_parts[k].append(f"{index}\n{srt_start} --> {srt_end}\n{transContentText}\n\n")
             
             contentText = content['content']
-            source_srt += f"{index}\n{srt_start} --> {srt_end}\n{contentText}\n\n"
+            source_srt.append(f"{index}\n{srt_start} --> {srt_end}\n{contentText}\n\n")
             
             if gen_merge_srt and merge_transContent != "":
                 merge_transContent = merge_transContent.rstrip("\n")
                 if source_up_order:
-                    merge_srt += f"{index}\n{srt_start} --> {srt_end}\n{contentText}\n{merge_transContent}\n\n"
+                    merge_srt.append(f"{index}\n{srt_start} --> {srt_end}\n{contentText}\n{merge_transContent}\n\n")
                 else:
-                    merge_srt += f"{index}\n{srt_start} --> {srt_end}\n{merge_transContent}\n{contentText}\n\n"
+                    merge_srt.append(f"{index}\n{srt_start} --> {srt_end}\n{merge_transContent}\n{contentText}\n\n")
+
+        text_length += len(currentContent)
 
-        text += currentContent
+    source_srt = "".join(source_srt)
+    merge_srt = "".join(merge_srt)
+    for k, parts in trans_srt_parts.items():
+        if parts:
+            translate_text_dict[k]["trans_srt"] = translate_text_dict[k].get("trans_srt", "") + "".join(parts)
 
-    if len(text) != len(source_text_with_no_info):
-        return f"核对源文本段落长度不同{len(text)}和{len(source_text_with_no_info)}"
+    if text_length != len(source_text_with_no_info):
+        return f"核对源文本段落长度不同{text_length}和{len(source_text_with_no_info)}"
 
     # 写入原srt（可显式指定完整路径，未指定则保持原命名规则）
     if source_srt_path:
@@ -410,11 +309,285 @@ def clean_text(text):
     return text_cleaned
 
 
+ALIGN_MODES = ('char', 'word', 'anchored')
+REGION_TIMEOUT = 1.0          # 词级模式下单个区间（无锚点的 Myers 比较 / 字符级细化）的时间上限（秒）
+REFINE_EQUAL_CHARS = 40       # 词级模式：短于该字符数的相同片段并入两侧的不一致区间一起做字符级细化
+ANCHOR_NGRAM = 6              # anchored 模式：锚点为两侧都只出现一次的连续 6 个词
+ANCHOR_WINDOW = 4000          # anchored 模式：每个窗口至少包含的生成文本字符数
+ANCHOR_BATCH = 8              # anchored 模式：每次提交给进程池的窗口数
+_TOKEN_RE = re.compile(r'\s+|[^\s]+')
+_WORD_RE = re.compile(r'\S+')
+
+
+def char_level_diffs(generation_text, source_text):
+    """字符级差异：diff_match_patch 全文比较（不限时）+ 语义清理"""
+    dmp = diff_match_patch()
+    dmp.Diff_Timeout = 0
+    diffs = dmp.diff_main(generation_text, source_text)
+    dmp.diff_cleanupSemantic(diffs)
+    return diffs
+
+
+def _encode_ids(ids):
+    """整数序列 -> 字符串（每个 id 一个字符，跳过代理区），供 diff_match_patch 做 Myers 比较"""
+    return ''.join(chr(i + 0x800 if i >= 0xD800 else i) for i in ids)
+
+
+def _unique_anchors(a, b, alo, ahi, blo, bhi):
+    """区间内在两侧都只出现一次的 token，按 a 中顺序取 b 下标的最长递增子序列（patience 锚点）"""
+    count_a, count_b = {}, {}
+    for i in range(alo, ahi):
+        count_a[a[i]] = count_a.get(a[i], 0) + 1
+    for j in range(blo, bhi):
+        if count_a.get(b[j]) == 1:
+            count_b[b[j]] = j if b[j] not in count_b else -1
+    pairs = [(i, count_b[a[i]]) for i in range(alo, ahi)
+             if count_a[a[i]] == 1 and count_b.get(a[i], -1) >= 0]
+    if not pairs:
+        return []
+
+    # patience 排序求最长递增子序列
+    tails, tail_index, back = [], [], [-1] * len(pairs)
+    for k, (_, j) in enumerate(pairs):
+        pos = bisect_left(tails, j)
+        if pos == len(tails):
+            tails.append(j)
+            tail_index.append(k)
+        else:
+            tails[pos] = j
+            tail_index[pos] = k
+        back[k] = tail_index[pos - 1] if pos > 0 else -1
+    result = []
+    k = tail_index[-1]
+    while k >= 0:
+        result.append(pairs[k])
+        k = back[k]
+    result.reverse()
+    return result
+
+
+def _myers_matches(a, b, alo, ahi, blo, bhi, matches):
+    """没有唯一锚点的区间：整数序列上的 Myers 差异，相等部分记为匹配"""
+    dmp = diff_match_patch()
+    dmp.Diff_Timeout = REGION_TIMEOUT
+    i, j = alo, blo
+    for op, text in dmp.diff_main(_encode_ids(a[alo:ahi]), _encode_ids(b[blo:bhi]), False):
+        n = len(text)
+        if op == 0:
+            matches.extend(zip(range(i, i + n), range(j, j + n)))
+        if op <= 0:
+            i += n
+        if op >= 0:
+            j += n
+
+
+def _match_token_ids(a, b):
+    """
+    token id 序列的匹配对 [(a 下标, b 下标)]（单调递增）。
+    patience diff：先去掉公共前后缀，以两侧都唯一的 token 为锚点递归切分，没有锚点的小区间用 Myers。
+    """
+    matches = []
+    stack = [('range', 0, len(a), 0, len(b))]
+    while stack:
+        item = stack.pop()
+        if item[0] == 'match':
+            matches.append((item[1], item[2]))
+            continue
+        _, alo, ahi, blo, bhi = item
+        while alo < ahi and blo < bhi and a[alo] == b[blo]:
+            matches.append((alo, blo))
+            alo += 1
+            blo += 1
+        suffix = []
+        while alo < ahi and blo < bhi and a[ahi - 1] == b[bhi - 1]:
+            ahi -= 1
+            bhi -= 1
+            suffix.append(('match', ahi, bhi))
+        stack.extend(suffix)   # 后缀在栈底，最后输出
+        if alo >= ahi or blo >= bhi:
+            continue
+        anchors = _unique_anchors(a, b, alo, ahi, blo, bhi)
+        if not anchors:
+            _myers_matches(a, b, alo, ahi, blo, bhi, matches)
+            continue
+        # 按逆序入栈，出栈顺序即为从前到后
+        bounds = [(alo, blo)] + [(i + 1, j + 1) for i, j in anchors]
+        ends = anchors + [(ahi, bhi)]
+        for (start_a, start_b), (end_a, end_b), k in reversed(list(zip(bounds, ends, range(len(ends))))):
+            if k < len(anchors):
+                stack.append(('match', end_a, end_b))
+            stack.append(('range', start_a, end_a, start_b, end_b))
+    return matches
+
+
+def _refine_regions(diffs):
+    """
+    字符级细化：不一致片段连同夹在其间、短于 REFINE_EQUAL_CHARS 的相同片段合并为一个区间，
+    区间内重新做字符级比较，最后对整个列表做语义清理。
+    重复词较多时词级匹配可能对上另一处出现，这些短相同片段正是字符级比较会重新划分的位置。
+    """
+    dmp = diff_match_patch()
+    dmp.Diff_Timeout = REGION_TIMEOUT
+    refined = []
+    removed, added = [], []
+
+    def _flush():
+        a, b = ''.join(removed), ''.join(added)
+        if a and b:
+            region = dmp.diff_main(a, b)
+            dmp.diff_cleanupSemantic(region)
+            refined.extend(region)
+        elif a:
+            refined.append((-1, a))
+        elif b:
+            refined.append((1, b))
+        removed.clear()
+        added.clear()
+
+    last = len(diffs) - 1
+    for k, (op, text) in enumerate(diffs):
+        if op == 0 and (len(text) >= REFINE_EQUAL_CHARS or k == 0 or k == last):
+            _flush()
+            refined.append((op, text))
+            continue
+        if op <= 0:
+            removed.append(text)
+        if op >= 0:
+            added.append(text)
+    _flush()
+    dmp.diff_cleanupSemantic(refined)
+    return refined
+
+
+def word_level_diffs(generation_text, source_text):
+    """
+    词级差异：两侧切分为词与空白 token 并映射为整数 id，在 id 序列上做 patience / Myers 比较，
+    再用 _refine_regions 对不一致的区间做字符级细化。返回与 char_level_diffs 相同格式的 [(op, text)]。
+    结果是近似的：差异片段能还原两侧文本，但切分不保证与字符级全文比较一致，字幕时间轴可能不同。
+    """
+    tokens_a = _TOKEN_RE.findall(generation_text)
+    tokens_b = _TOKEN_RE.findall(source_text)
+    vocab = {}
+    ids_a = [vocab.setdefault(tok, len(vocab)) for tok in tokens_a]
+    ids_b = [vocab.setdefault(tok, len(vocab)) for tok in tokens_b]
+
+    diffs = []
+    i = j = 0
+    for mi, mj in _match_token_ids(ids_a, ids_b) + [(len(ids_a), len(ids_b))]:
+        if i < mi:
+            diffs.append((-1, ''.join(tokens_a[i:mi])))
+        if j < mj:
+            diffs.append((1, ''.join(tokens_b[j:mj])))
+        if mi < len(ids_a):
+            diffs.append((0, tokens_a[mi]))
+        i, j = mi + 1, mj + 1
+    diff_match_patch().diff_cleanupMerge(diffs)
+    return _refine_regions(diffs)
+
+
+def _ngram_anchors(generation_text, source_text, n=ANCHOR_NGRAM):
+    """
+    两侧都只出现一次的 n 词组，按生成文本中的顺序取源文本位置的最长递增子序列，
+    返回单调递增的 [(生成文本字符位置, 源文本字符位置)]（均为 n 词组首字符）。
+    """
+    words_a = [(m.start(), m.group()) for m in _WORD_RE.finditer(generation_text)]
+    words_b = [(m.start(), m.group()) for m in _WORD_RE.finditer(source_text)]
+    vocab = {}
+    ids_a = [vocab.setdefault(w, len(vocab)) for _, w in words_a]
+    ids_b = [vocab.setdefault(w, len(vocab)) for _, w in words_b]
+    grams_a = [tuple(ids_a[k:k + n]) for k in range(len(ids_a) - n + 1)]
+    grams_b = [tuple(ids_b[k:k + n]) for k in range(len(ids_b) - n + 1)]
+    # 复用 patience 锚点：n 词组即 token，两侧唯一且顺序一致者为锚点
+    gram_ids = {}
+    seq_a = [gram_ids.setdefault(g, len(gram_ids)) for g in grams_a]
+    seq_b = [gram_ids.setdefault(g, len(gram_ids)) for g in grams_b]
+    anchors = _unique_anchors(seq_a, seq_b, 0, len(seq_a), 0, len(seq_b))
+    return [(words_a[i][0], words_b[j][0]) for i, j in anchors]
+
+
+def _anchor_windows(generation_text, source_text, window=ANCHOR_WINDOW):
+    """在锚点处把两侧切成一一对应的窗口 [(生成文本片段, 源文本片段)]，各窗口不少于 window 个字符"""
+    cuts = [(0, 0)]
+    for pos_a, pos_b in _ngram_anchors(generation_text, source_text):
+        if pos_a - cuts[-1][0] >= window and pos_b > cuts[-1][1]:
+            cuts.append((pos_a, pos_b))
+    if len(generation_text) - cuts[-1][0] < window // 2 and len(cuts) > 1:
+        cuts.pop()   # 末尾太短的窗口并入前一个
+    cuts.append((len(generation_text), len(source_text)))
+    return [(generation_text[a0:a1], source_text[b0:b1]) for (a0, b0), (a1, b1) in zip(cuts, cuts[1:])]
+
+
+def _window_batch_diffs(windows):
+    """进程池中执行：逐个窗口做字符级比较"""
+    return [char_level_diffs(gen, src) for gen, src in windows]
+
+
+def anchored_diffs(generation_text, source_text, progress_callback=None, cancel_check=None):
+    """
+    锚点分窗差异：以两侧唯一的 n 词组为锚点把长文本切成互不相关的窗口，
+    各窗口在共享进程池中并行做字符级比较后按顺序拼接。
+    窗口大小固定，总耗时随文本长度近似线性增长，并随进程池大小缩短。
+
+    :param progress_callback: progress_callback(已完成窗口数, 窗口总数)，在调用线程中执行
+    :param cancel_check: 每完成一批窗口在调用线程中调用一次；抛出异常时不再提交新的批次，
+        已排队的批次被取消，异常原样抛出
+    """
+    windows = _anchor_windows(generation_text, source_text)
+    if len(windows) == 1:
+        return char_level_diffs(generation_text, source_text)
+
+    from .job_queue import get_process_pool, process_pool_workers
+    pool = get_process_pool()
+    batches = [windows[k:k + ANCHOR_BATCH] for k in range(0, len(windows), ANCHOR_BATCH)]
+    # 同时在途的批次不超过进程数的两倍，取消时最多等这些批次算完
+    in_flight = max(2, 2 * process_pool_workers())
+    futures = [pool.submit(_window_batch_diffs, batch) for batch in batches[:in_flight]]
+    diffs = []
+    try:
+        for k in range(len(batches)):
+            for window_diffs in futures[k].result():
+                diffs.extend(window_diffs)
+            if progress_callback:
+                progress_callback(min(len(windows), (k + 1) * ANCHOR_BATCH), len(windows))
+            if cancel_check:
+                cancel_check()
+            if len(futures) < len(batches):
+                futures.append(pool.submit(_window_batch_diffs, batches[len(futures)]))
+    except BaseException:
+        for future in futures:
+            future.cancel()
+        raise
+    diff_match_patch().diff_cleanupMerge(diffs)   # 合并窗口边界两侧的同类片段
+    return diffs
+
+
+def compute_diffs(generation_text, source_text, align_mode='char', progress_callback=None, cancel_check=None):
+    """
+    按对齐模式计算生成文本与源文本的差异。
+    progress_callback / cancel_check 见 anchored_diffs，只有 anchored 模式分批执行时会调用。
+    """
+    if align_mode == 'word':
+        return word_level_diffs(generation_text, source_text)
+    if align_mode == 'anchored':
+        return anchored_diffs(generation_text, source_text, progress_callback, cancel_check)
+    if align_mode == 'char':
+        return char_level_diffs(generation_text, source_text)
+    raise ValueError(f"不支持的对齐模式: {align_mode}（可选: {', '.join(ALIGN_MODES)}）")
+
+
 def audio_subtitle_search_diffent_strong(current_language, directory, file_name, generation_subtitle_array,
                                         generation_subtitle_text, source_text_with_info, translate_text_dict,
                                         gen_merge_srt, source_up_order, export_fcpxml, seamless_fcpxml,
-                                        source_srt_path=None, fcpxml_path=None):
-    """主对齐函数"""
+                                        source_srt_path=None, fcpxml_path=None, align_mode='char',
+                                        progress_callback=None, cancel_check=None):
+    """
+    主对齐函数
+
+    :param align_mode: 'char' 字符级全文比较（默认）；'word' 词级比较后只细化不一致区间，长文本更快但结果是近似的；
+        'anchored' 按唯一 n 词组锚点分窗、在进程池中并行做字符级比较，适合超长文本
+    :param progress_callback: progress_callback(已完成窗口数, 窗口总数)，anchored 模式下汇报比较进度
+    :param cancel_check: anchored 模式下每批窗口之后调用，抛出异常即中止对齐
+    """
     source_text_with_no_info = ""
     for content in source_text_with_info["contents"]:
         source_text_with_no_info += word_split_by["en"] + content["content"]
@@ -422,10 +595,8 @@ def audio_subtitle_search_diffent_strong(current_language, directory, file_name,
     generation_subtitle_text = clean_text(generation_subtitle_text)
     source_text_with_no_info = clean_text(source_text_with_no_info)
 
-    dmp = diff_match_patch()
-    dmp.Diff_Timeout = 0
-    diffs = dmp.diff_main(generation_subtitle_text, source_text_with_no_info)
-    dmp.diff_cleanupSemantic(diffs)
+    diffs = compute_diffs(generation_subtitle_text, source_text_with_no_info, align_mode,
+                          progress_callback, cancel_check)
 
     return process_diffs_with_audio_positions_strong({
         "title": file_name,
@@ -444,3 +615,36 @@ def audio_subtitle_search_diffent_strong(current_language, directory, file_name,
         'source_text_with_info': source_text_with_info,
         'generation_subtitle_array': generation_subtitle_array
     })
+
+
+def _benchmark(word_counts, seed=0):
+    """合成长文本（Zipf 分布词表 + 随机增删改）上比较字符级与词级差异的耗时与一致程度"""
+    import time
+    import random
+    rng = random.Random(seed)
+    vocab = [''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(1, 9))) for _ in range(5000)]
+    weights = [1.0 / (k + 1) for k in range(len(vocab))]
+    for n in word_counts:
+        source = rng.choices(vocab, weights, k=n)
+        generated = []
+        for word in source:
+            r = rng.random()
+            if r < 0.03:
+                continue
+            generated.append(rng.choice(vocab) if r < 0.06 else word)
+            if r > 0.98:
+                generated.append(rng.choice(vocab))
+        a, b = ' '.join(generated), ' ' + ' '.join(source)
+        line = [f"词数={n:<7d} 字符数={len(b):<8d}"]
+        for mode in (('word', 'anchored', 'char') if n <= 20000 else ('word', 'anchored')):
+            started = time.time()
+            diffs = compute_diffs(a, b, mode)
+            equal = sum(len(text) for op, text in diffs if op == 0)
+            line.append(f"{mode}={time.time() - started:7.2f}s 相同字符={equal}")
+        print("  ".join(line))
+
+
+if __name__ == '__main__':
+    import sys
+    counts = [int(x) for x in sys.argv[1].split(',')] if len(sys.argv) > 1 else [2000, 10000, 20000, 100000]
+    _benchmark(counts)
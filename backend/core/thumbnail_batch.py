@@ -0,0 +1,286 @@
+"""
+批量首帧截图 - 并行 ffmpeg + 可续跑的清单文件
+
+输出目录下的 .thumbnail_manifest.json 记录每个源文件的大小/mtime 与处理状态：
+重跑时源文件未变化且已成功的直接跳过（不再逐个 stat 输出文件），源文件变化的重新截图。
+处理过程中的进度同时保存在内存中，进度接口优先读内存，其次读清单，不再遍历目录。
+不同子目录下的同名视频在提交前分配不同的输出文件名（后者加路径哈希后缀），并行时不会写同一个文件。
+"""
+import os
+import time
+import hashlib
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from .cache_utils import atomic_write_json, read_json
+
+VIDEO_EXTS = {'.mp4', '.mov', '.mkv', '.avi', '.wmv', '.flv', '.webm', '.m4v',
+              '.mpg', '.mpeg', '.3gp', '.ts', '.mts', '.m2ts', '.vob'}
+MANIFEST_NAME = '.thumbnail_manifest.json'
+MANIFEST_VERSION = 1
+SAVE_INTERVAL = 2.0   # 处理过程中清单落盘的最小间隔（秒）
+
+_active = {}          # 输出目录 -> 正在运行的批次（供进度查询）
+_active_lock = threading.Lock()
+
+
+def default_workers():
+    """并行截图进程数：环境变量 PYMEDIA_THUMBNAIL_WORKERS，默认 CPU 数（最多 8）"""
+    return int(os.environ.get('PYMEDIA_THUMBNAIL_WORKERS', 0)) or max(1, min(8, os.cpu_count() or 1))
+
+
+def manifest_path(output_dir):
+    return os.path.join(output_dir, MANIFEST_NAME)
+
+
+def scan_videos(folder_path):
+    """递归收集视频文件 [(路径, 大小, mtime_ns)]，顺序与 os.walk + 排序一致；stat 结果来自 scandir"""
+    videos = []
+    subdirs = []
+    try:
+        with os.scandir(folder_path) as it:
+            entries = list(it)
+    except OSError:
+        return videos
+    for entry in sorted(entries, key=lambda e: e.name):
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.path)
+            elif os.path.splitext(entry.name)[1].lower() in VIDEO_EXTS and entry.is_file():
+                st = entry.stat()
+                videos.append((entry.path, st.st_size, st.st_mtime_ns))
+        except OSError:
+            continue
+    for subdir in subdirs:
+        videos.extend(scan_videos(subdir))
+    return videos
+
+
+def stat_videos(file_list):
+    """前端传入的文件列表 -> [(路径, 大小, mtime_ns)]，过滤掉不存在或非视频的文件"""
+    videos = []
+    for path in file_list:
+        if os.path.splitext(path)[1].lower() not in VIDEO_EXTS:
+            continue
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        if os.path.isfile(path):
+            videos.append((path, st.st_size, st.st_mtime_ns))
+    return videos
+
+
+def extract_first_frame(video_path, output_path, quality=2, timeout=30):
+    cmd = ['ffmpeg', '-y', '-ss', '0', '-i', video_path, '-frames:v', '1']
+    if not output_path.lower().endswith('.png'):
+        cmd.extend(['-q:v', str(quality)])
+    cmd.append(output_path)
+    subprocess.run(cmd, check=True, capture_output=True, timeout=timeout)
+
+
+class ThumbnailBatch:
+    """一次批量截图：负责清单读写、跳过判断与并行执行"""
+
+    def __init__(self, videos, output_dir, image_format='jpg', quality=2, workers=None):
+        # 同一路径重复出现时只处理一次
+        seen = set()
+        self.videos = [v for v in videos if not (v[0] in seen or seen.add(v[0]))]
+        self.output_dir = output_dir
+        self.out_ext = 'png' if image_format == 'png' else 'jpg'
+        self.quality = quality
+        self.workers = workers or default_workers()
+        self.lock = threading.Lock()
+        self.done = 0
+        self.success = 0
+        self.failed = 0
+        self.running = False
+        self._last_save = 0.0
+        manifest = read_json(manifest_path(output_dir), default=None)
+        if not isinstance(manifest, dict) or manifest.get("version") != MANIFEST_VERSION:
+            manifest = {"version": MANIFEST_VERSION, "files": {}}
+        self.entries = manifest.get("files") or {}
+        self.names = self._assign_names()
+
+    @property
+    def total(self):
+        return len(self.videos)
+
+    def progress(self):
+        with self.lock:
+            return {
+                "total": self.total,
+                "done": self.done,
+                "success": self.success,
+                "failed": self.failed,
+                "running": self.running,
+            }
+
+    def save(self, force=False):
+        now = time.time()
+        with self.lock:
+            if not force and now - self._last_save < SAVE_INTERVAL:
+                return
+            self._last_save = now
+            data = {
+                "version": MANIFEST_VERSION,
+                "updated": now,
+                "total": self.total,
+                "done": self.done,
+                "success": self.success,
+                "failed": self.failed,
+                "running": self.running,
+                "files": dict(self.entries),
+            }
+        try:
+            atomic_write_json(manifest_path(self.output_dir), data)
+        except Exception as e:
+            print(f"[批量截图] 清单保存失败: {e}")
+
+    def _assign_names(self):
+        """
+        为每个视频分配唯一的输出文件名（按不区分大小写比较，兼容 Windows / macOS）。
+        清单中已记录的同格式名称优先沿用；其余默认用原文件名，与已分配的名称冲突时加源路径哈希后缀。
+        """
+        names = {}
+        taken = set()
+        for video_path, _, _ in self.videos:
+            entry = self.entries.get(video_path)
+            name = entry.get("output") if isinstance(entry, dict) else None
+            if name and name.endswith(f".{self.out_ext}") and name.casefold() not in taken:
+                names[video_path] = name
+                taken.add(name.casefold())
+        for video_path, _, _ in self.videos:
+            if video_path in names:
+                continue
+            stem = os.path.splitext(os.path.basename(video_path))[0]
+            name = f"{stem}.{self.out_ext}"
+            if name.casefold() in taken:
+                digest = hashlib.sha1(os.path.realpath(video_path).encode('utf-8', 'surrogateescape')).hexdigest()[:8]
+                name = f"{stem}_{digest}.{self.out_ext}"
+                counter = 1
+                while name.casefold() in taken:
+                    counter += 1
+                    name = f"{stem}_{digest}_{counter}.{self.out_ext}"
+            names[video_path] = name
+            taken.add(name.casefold())
+        return names
+
+    def _output_name(self, video_path):
+        return self.names[video_path]
+
+    def _plan(self):
+        """划分为 (需处理, 可跳过) 两组；输出目录只列一次，不逐个 stat"""
+        try:
+            existing = set(os.listdir(self.output_dir))
+        except OSError:
+            existing = set()
+        todo, skipped = [], []
+        for video_path, size, mtime_ns in self.videos:
+            name = self._output_name(video_path)
+            entry = self.entries.get(video_path)
+            if entry is not None:
+                unchanged = (entry.get("size") == size and entry.get("mtime_ns") == mtime_ns
+                             and entry.get("output") == name)
+                if unchanged and entry.get("status") == "ok" and name in existing:
+                    skipped.append((video_path, name))
+                    continue
+            elif name in existing and os.path.getsize(os.path.join(self.output_dir, name)) > 0:
+                # 旧版本生成、尚未记录在清单中的截图：沿用旧的“已存在即跳过”规则并补记
+                self.entries[video_path] = {"output": name, "size": size, "mtime_ns": mtime_ns, "status": "ok"}
+                skipped.append((video_path, name))
+                continue
+            todo.append((video_path, size, mtime_ns, name))
+        return todo, skipped
+
+    def _process(self, video_path, size, mtime_ns, name):
+        output_path = os.path.join(self.output_dir, name)
+        entry = {"output": name, "size": size, "mtime_ns": mtime_ns}
+        try:
+            extract_first_frame(video_path, output_path, self.quality)
+            entry["status"] = "ok"
+        except subprocess.TimeoutExpired:
+            entry["status"] = "timeout"
+        except subprocess.CalledProcessError as e:
+            entry["status"] = "error"
+            entry["error"] = e.stderr.decode('utf-8', errors='replace')[:200] if e.stderr else str(e)
+        with self.lock:
+            self.entries[video_path] = entry
+            self.done += 1
+            if entry["status"] == "ok":
+                self.success += 1
+            else:
+                self.failed += 1
+        return entry
+
+    def run(self, progress_callback=None, cancel_check=None):
+        """
+        执行批量截图，返回结果列表 [{"file", "output", "status", ...}]（顺序与 videos 一致）。
+
+        :param progress_callback: progress_callback(done, total, message)，在调用线程中执行
+        :param cancel_check: 在调用线程中周期性调用；抛出异常时不再启动新的截图，已完成部分写入清单
+        """
+        todo, skipped = self._plan()
+        with self.lock:
+            self.running = True
+            self.done = self.success = len(skipped)
+        with _active_lock:
+            _active[os.path.realpath(self.output_dir)] = self
+
+        results = {}
+        for video_path, name in skipped:
+            results[video_path] = {"file": os.path.basename(video_path),
+                                   "output": os.path.join(self.output_dir, name), "status": "skipped"}
+        print(f"[批量截图] 共 {self.total} 个视频，跳过 {len(skipped)} 个，待处理 {len(todo)} 个，并行={self.workers}")
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="thumbnail") as executor:
+                futures = {executor.submit(self._process, *item): item[0] for item in todo}
+                pending = set(futures)
+                last_report = 0
+                try:
+                    while pending:
+                        done, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            video_path = futures[future]
+                            entry = future.result()
+                            item = {"file": os.path.basename(video_path), "status": entry["status"]}
+                            if entry["status"] == "ok":
+                                item["output"] = os.path.join(self.output_dir, entry["output"])
+                            elif entry.get("error"):
+                                item["error"] = entry["error"]
+                            results[video_path] = item
+                        if cancel_check:
+                            cancel_check()
+                        progress = self.progress()
+                        if progress_callback:
+                            progress_callback(progress["done"], self.total, f"成功={progress['success']}, 失败={progress['failed']}")
+                        if progress["done"] - last_report >= 100:
+                            last_report = progress["done"]
+                            print(f"[批量截图] 进度: {progress['done']}/{self.total}, 成功={progress['success']}, 失败={progress['failed']}")
+                        self.save()
+                except BaseException:
+                    for future in pending:
+                        future.cancel()
+                    raise
+        finally:
+            with self.lock:
+                self.running = False
+            self.save(force=True)
+            with _active_lock:
+                if _active.get(os.path.realpath(self.output_dir)) is self:
+                    del _active[os.path.realpath(self.output_dir)]
+
+        return [results[path] for path, _, _ in self.videos if path in results]
+
+
+def get_progress(output_dir):
+    """进度查询：优先返回正在运行的批次，其次读取清单；都没有时返回 None"""
+    with _active_lock:
+        batch = _active.get(os.path.realpath(output_dir))
+    if batch is not None:
+        return batch.progress()
+    manifest = read_json(manifest_path(output_dir), default=None)
+    if isinstance(manifest, dict) and "total" in manifest:
+        return {key: manifest.get(key, 0) for key in ("total", "done", "success", "failed", "running")}
+    return None
@@ -0,0 +1,202 @@
+"""
+波形峰值提取 - 流式读取 FFmpeg 输出，NumPy 按块求 min/max，生成多级峰值金字塔
+
+金字塔缓存为 .peaks 文件（按源文件路径/大小/mtime 命名），时间线缩放时只需
+按区间和分辨率从合适的层级取数据，不必重新解码整个文件。
+"""
+import os
+import time
+import tempfile
+import subprocess
+
+import numpy as np
+
+from . import media_probe
+from .cache_utils import atomic_writer, file_signature, signature_cache_path
+
+SAMPLE_RATE = 8000        # 解码采样率（单声道）
+BASE_BLOCK = 128          # 第 0 层每个峰值覆盖的采样数（8kHz 下 16ms）
+LEVEL_FACTOR = 4          # 相邻层级的缩放倍数
+MIN_LEVEL_SIZE = 256      # 层级长度小于该值时不再继续缩小
+READ_BLOCKS = 2048        # 每次从管道读取的块数
+PEAKS_VERSION = 2       # 2: 不再缓存解码失败产生的空/残缺金字塔
+
+
+def _reduce_level(mins, maxs, factor=LEVEL_FACTOR):
+    """把一层峰值按 factor 合并成更粗的一层（末尾不足部分单独成块）"""
+    full = len(mins) // factor * factor
+    new_mins = mins[:full].reshape(-1, factor).min(axis=1)
+    new_maxs = maxs[:full].reshape(-1, factor).max(axis=1)
+    if full < len(mins):
+        new_mins = np.append(new_mins, mins[full:].min())
+        new_maxs = np.append(new_maxs, maxs[full:].max())
+    return new_mins, new_maxs
+
+
+def _decode_base_level(file_path, timeout=600):
+    """
+    流式解码音频，返回 (第 0 层 mins, maxs, 采样总数)，内存只与峰值数量成正比。
+    ffmpeg 失败时抛出 RuntimeError，不返回残缺结果；正常结束但没有采样时返回空数组。
+    """
+    cmd = [
+        'ffmpeg', '-hide_banner', '-loglevel', 'error', '-i', file_path,
+        '-vn', '-ac', '1', '-ar', str(SAMPLE_RATE),
+        '-f', 'f32le', '-'
+    ]
+    # stderr 写入临时文件，避免错误输出过多时管道写满卡住 ffmpeg
+    stderr_file = tempfile.TemporaryFile()
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr_file)
+    block_bytes = BASE_BLOCK * 4
+    chunk_bytes = block_bytes * READ_BLOCKS
+    deadline = time.time() + timeout
+    min_parts, max_parts = [], []
+    pending = b''
+    num_samples = 0
+    try:
+        while True:
+            chunk = proc.stdout.read(chunk_bytes)
+            if not chunk:
+                break
+            if time.time() > deadline:
+                raise subprocess.TimeoutExpired(cmd, timeout)
+            if pending:
+                chunk = pending + chunk
+            usable = len(chunk) // block_bytes * block_bytes
+            pending = chunk[usable:]
+            if usable:
+                blocks = np.frombuffer(chunk, dtype='<f4', count=usable // 4).reshape(-1, BASE_BLOCK)
+                min_parts.append(blocks.min(axis=1))
+                max_parts.append(blocks.max(axis=1))
+                num_samples += usable // 4
+        tail = len(pending) // 4
+        if tail:
+            samples = np.frombuffer(pending, dtype='<f4', count=tail)
+            min_parts.append(samples.min(keepdims=True))
+            max_parts.append(samples.max(keepdims=True))
+            num_samples += tail
+    finally:
+        proc.stdout.close()
+        if proc.poll() is None:
+            proc.kill()
+        proc.wait()
+        stderr_file.seek(0)
+        stderr_output = stderr_file.read().decode('utf-8', errors='replace').strip()
+        stderr_file.close()
+
+    if proc.returncode != 0:
+        raise RuntimeError(f"FFmpeg 解码音频失败 (returncode={proc.returncode}): {stderr_output[-200:]}")
+    if not min_parts:
+        return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.float32), 0
+    return np.concatenate(min_parts), np.concatenate(max_parts), num_samples
+
+
+def build_pyramid(file_path):
+    """解码并生成峰值金字塔：levels[k] = (mins, maxs)，第 k 层每块覆盖 BASE_BLOCK * 4^k 个采样"""
+    mins, maxs, num_samples = _decode_base_level(file_path)
+    levels = [(mins, maxs)]
+    while len(levels[-1][0]) > MIN_LEVEL_SIZE:
+        levels.append(_reduce_level(*levels[-1]))
+    return {"levels": levels, "num_samples": num_samples}
+
+
+def _save_pyramid(path, pyramid):
+    arrays = {"num_samples": np.array([pyramid["num_samples"]], dtype=np.int64)}
+    for k, (mins, maxs) in enumerate(pyramid["levels"]):
+        arrays[f"min{k}"] = mins.astype(np.float32)
+        arrays[f"max{k}"] = maxs.astype(np.float32)
+    with atomic_writer(path) as f:
+        np.savez(f, **arrays)
+
+
+def _load_pyramid(path):
+    with np.load(path) as data:
+        levels = []
+        k = 0
+        while f"min{k}" in data:
+            levels.append((data[f"min{k}"], data[f"max{k}"]))
+            k += 1
+        return {"levels": levels, "num_samples": int(data["num_samples"][0])}
+
+
+def _empty_pyramid():
+    empty = np.zeros(0, dtype=np.float32)
+    return {"levels": [(empty, empty)], "num_samples": 0}
+
+
+def load_or_build_pyramid(file_path):
+    """
+    读取缓存的 .peaks 文件，不存在或源文件已变化时重新生成（解码失败时抛出异常，不写缓存）。
+    没有音频流的文件直接返回空金字塔，不启动 ffmpeg 也不写缓存。
+    """
+    signature = file_signature(file_path)
+    if signature is None:
+        raise FileNotFoundError(file_path)
+    info = media_probe.probe(file_path)
+    if info is not None and media_probe.first_stream(info, "audio") is None:
+        return _empty_pyramid()
+    path = signature_cache_path('peaks', signature, 'peaks', PEAKS_VERSION)
+    if os.path.exists(path):
+        try:
+            return _load_pyramid(path)
+        except Exception as e:
+            print(f"[波形] 峰值缓存损坏，重新生成: {e}")
+    pyramid = build_pyramid(file_path)
+    if pyramid["num_samples"] == 0:
+        return pyramid
+    try:
+        _save_pyramid(path, pyramid)
+    except Exception as e:
+        print(f"[波形] 峰值缓存写入失败: {e}")
+    return pyramid
+
+
+def get_peaks(file_path, num_peaks=300, start=None, end=None):
+    """
+    返回 [start, end) 区间内 num_peaks 个归一化峰值（0~1，按全文件最大值归一化，
+    缩放后高度与整体视图一致），自动选择刚好够用的最粗层级。
+    """
+    pyramid = load_or_build_pyramid(file_path)
+    num_samples = pyramid["num_samples"]
+    base_mins, base_maxs = pyramid["levels"][0]
+    if num_samples == 0 or len(base_mins) == 0:
+        return {"peaks": [], "num_samples": 0, "start": 0.0, "end": 0.0, "level": 0}
+
+    total_seconds = num_samples / SAMPLE_RATE
+    start = min(max(0.0, float(start or 0.0)), total_seconds)
+    end = total_seconds if end is None else min(max(start, float(end)), total_seconds)
+    num_peaks = max(1, int(num_peaks))
+
+    # 第 0 层的块区间
+    base_i0 = int(start * SAMPLE_RATE // BASE_BLOCK)
+    base_i1 = max(base_i0 + 1, -(-int(end * SAMPLE_RATE) // BASE_BLOCK))
+    base_i1 = min(base_i1, len(base_mins))
+
+    # 选择块数仍不少于 num_peaks 的最粗层级
+    level = 0
+    while level + 1 < len(pyramid["levels"]):
+        scale = LEVEL_FACTOR ** (level + 1)
+        if (base_i1 - base_i0) // scale < num_peaks:
+            break
+        level += 1
+    scale = LEVEL_FACTOR ** level
+    mins, maxs = pyramid["levels"][level]
+    i0 = base_i0 // scale
+    i1 = min(len(mins), max(i0 + 1, -(-base_i1 // scale)))
+
+    amplitude = np.maximum(np.abs(mins[i0:i1]), np.abs(maxs[i0:i1]))
+    if len(amplitude) > num_peaks:
+        edges = np.linspace(0, len(amplitude), num_peaks + 1).astype(np.int64)[:-1]
+        amplitude = np.maximum.reduceat(amplitude, edges)
+
+    coarsest_mins, coarsest_maxs = pyramid["levels"][-1]
+    global_max = float(max(np.abs(coarsest_mins).max(), np.abs(coarsest_maxs).max()))
+    if global_max > 0:
+        amplitude = amplitude / global_max
+
+    return {
+        "peaks": [round(float(p), 4) for p in amplitude],
+        "num_samples": num_samples,
+        "start": round(start, 3),
+        "end": round(end, 3),
+        "level": level
+    }
@@ -13,6 +13,8 @@ import threading
 import re
 import subprocess
 import shutil
+import functools
+import multiprocessing
 
 # Windows 控制台 UTF-8 编码支持
 if sys.platform == 'win32':
@@ -35,16 +37,44 @@ for path in (BACKEND_DIR, PROJECT_ROOT):
 # 导入核心模块
 try:
     from core.subtitle_utils import LANGUAGES, change_language, get_language, read_text_with_google_doc, read_object_from_json
-    from core.subtitle_alignment import audio_subtitle_search_diffent_strong
-    from core.gladia_api import transcribe_audio_from_gladia
+    from core.subtitle_alignment import audio_subtitle_search_diffent_strong, ALIGN_MODES
+    from core.gladia_api import (transcribe_audio_from_gladia, transcript_cache_path,
+                                 load_cached_transcript, save_cached_transcript)
     from core.srt_parse import SrtParse
+    from core.job_queue import JobManager, JobCancelled, report_progress, check_cancelled
+    from core import media_probe
+    from core import scene_frames
+    from core import smart_cut
+    from core import thumbnail_batch
+    from core import hash_index
+    from core import perceptual_hash
+    from core import hash_store
+    from core import file_output
+    from core import ffmpeg_batch
+    from core import hw_encoders
+    from core import logo_overlay
+    from core import multi_output
 except ImportError:
     # 如果导入失败，尝试从 pyMediaTools_Unified 导入
     sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '..', 'pyMediaTools_Unified'))
     from pyMediaTools.core.subtitle_utils import LANGUAGES, change_language, get_language, read_text_with_google_doc, read_object_from_json
-    from pyMediaTools.core.subtitle_alignment import audio_subtitle_search_diffent_strong
-    from pyMediaTools.core.gladia_api import transcribe_audio_from_gladia
+    from pyMediaTools.core.subtitle_alignment import audio_subtitle_search_diffent_strong, ALIGN_MODES
+    from pyMediaTools.core.gladia_api import (transcribe_audio_from_gladia, transcript_cache_path,
+                                              load_cached_transcript, save_cached_transcript)
     from pyMediaTools.core.srt_parse import SrtParse
+    from pyMediaTools.core.job_queue import JobManager, JobCancelled, report_progress, check_cancelled
+    from pyMediaTools.core import media_probe
+    from pyMediaTools.core import scene_frames
+    from pyMediaTools.core import smart_cut
+    from pyMediaTools.core import thumbnail_batch
+    from pyMediaTools.core import hash_index
+    from pyMediaTools.core import perceptual_hash
+    from pyMediaTools.core import hash_store
+    from pyMediaTools.core import file_output
+    from pyMediaTools.core import ffmpeg_batch
+    from pyMediaTools.core import hw_encoders
+    from pyMediaTools.core import logo_overlay
+    from pyMediaTools.core import multi_output
 
 app = Flask(__name__)
 CORS(app, resources={r"/api/*": {"origins": "*"}}, supports_credentials=True)
@@ -99,13 +129,44 @@ def handle_preflight():
         response.headers['Access-Control-Allow-Headers'] = 'Content-Type'
         return response
 
-# 全局状态
-processing_status = {
-    "is_processing": False,
-    "progress": "",
-    "result": None,
-    "error": None
-}
+# ==================== 后台任务队列 ====================
+# 长耗时接口在请求体中带 "async": true 时提交到后台队列，立即返回 job_id，
+# 之后通过 /api/jobs/<job_id> 查询进度、/result 取结果、/cancel 取消。
+# 这样大批量任务不会占满 Waitress 的工作线程，也不会被 channel_timeout 打断。
+_media_jobs = JobManager('media', max_workers=int(os.environ.get('PYMEDIA_JOB_WORKERS', 0)) or None)
+
+
+def _async_job(kind):
+    """装饰器：请求体带 "async": true 时把接口放到后台任务队列执行"""
+    def decorator(view):
+        def run_view(payload):
+            # 在后台线程中重放原接口，结果按原接口的 JSON + 状态码保存
+            with app.test_request_context(payload['path'], method='POST', json=payload['data']):
+                response = app.make_response(view())
+            body = response.get_json(silent=True)
+            if response.status_code >= 400:
+                message = body.get('error') if isinstance(body, dict) else None
+                raise RuntimeError(message or f"HTTP {response.status_code}")
+            return {"status_code": response.status_code, "body": body}
+
+        _media_jobs.register(kind, run_view)
+
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method == 'POST':
+                data = request.get_json(silent=True)
+                if isinstance(data, dict) and data.get('async'):
+                    data = {k: v for k, v in data.items() if k != 'async'}
+                    job = _media_jobs.submit(kind, {"path": request.path, "data": data})
+                    return jsonify({
+                        "message": "任务已提交",
+                        "job_id": job.id,
+                        "status": job.status
+                    }), 202
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
@@ -115,9 +176,50 @@ def health_check():
         "status": "ok",
         "message": "Python backend is running",
         "uptime": uptime,
-        "active_threads": threading.active_count()
+        "active_threads": threading.active_count(),
+        "jobs": _media_jobs.stats()
     })
 
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    """列出后台任务"""
+    return jsonify({"jobs": [job.to_dict() for job in _media_jobs.list()]})
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """查询后台任务状态与进度"""
+    job = _media_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "任务不存在"}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/api/jobs/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    """获取后台任务结果（返回原接口的响应内容）"""
+    job = _media_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "任务不存在"}), 404
+    info = job.to_dict(include_result=True)
+    if info["status"] == 'done':
+        result = info["result"]
+        if result is None:
+            # 任务结果只保存在内存中，服务重启后不再可取
+            return jsonify({"error": "任务结果已不可用（服务已重启）", "status": info["status"]}), 410
+        return jsonify(result.get("body")), result.get("status_code", 200)
+    if info["status"] in ('queued', 'running'):
+        return jsonify({"error": "任务尚未完成", "status": info["status"]}), 409
+    return jsonify({"error": info["error"] or "任务未成功完成", "status": info["status"]}), 500
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST', 'OPTIONS'])
+def cancel_job(job_id):
+    """取消后台任务"""
+    if request.method == 'OPTIONS':
+        return '', 204
+    job = _media_jobs.cancel(job_id)
+    if job is None:
+        return jsonify({"error": "任务不存在"}), 404
+    return jsonify(job.to_dict())
+
 @app.route('/assets/<path:filename>', methods=['GET'])
 def serve_assets(filename):
     """提供前端预览使用的资产文件"""
@@ -292,8 +394,13 @@ def get_languages():
 
 @app.route('/api/status', methods=['GET'])
 def get_status():
-    """获取处理状态"""
-    return jsonify(processing_status)
+    """获取处理状态（最近一个字幕任务，多任务请用 /api/subtitle/jobs）"""
+    jobs = _subtitle_jobs.list()
+    if not jobs:
+        return jsonify({"is_processing": False, "progress": "", "result": None, "error": None})
+    latest = _subtitle_job_info(jobs[-1])
+    latest["is_processing"] = any(job.status in ('queued', 'running') for job in jobs)
+    return jsonify(latest)
 
 @app.route('/api/subtitle/generate-with-file', methods=['POST', 'OPTIONS'])
 def generate_subtitle_with_file():
@@ -309,9 +416,9 @@ def generate_subtitle_with_file():
     if not audio_file.filename:
         return jsonify({"error": "文件名为空"}), 400
     
-    # 保存临时文件
-    temp_dir = tempfile.gettempdir()
-    temp_audio_path = os.path.join(temp_dir, f"batch_{int(time.time())}_{audio_file.filename}")
+    # 保存到本次请求独立的临时工作目录，避免并发请求互相覆盖
+    work_dir = tempfile.mkdtemp(prefix="subtitle_batch_")
+    temp_audio_path = os.path.join(work_dir, os.path.basename(audio_file.filename))
     audio_file.save(temp_audio_path)
     
     # 获取其他参数
@@ -329,21 +436,25 @@ def generate_subtitle_with_file():
     source_up_order = request.form.get('source_up_order', '').lower() == 'true'
     export_fcpxml = request.form.get('export_fcpxml', '').lower() == 'true'
     seamless_fcpxml = request.form.get('seamless_fcpxml', '').lower() == 'true'
+    align_mode = request.form.get('align_mode', 'char')
     
     if not source_text:
-        os.remove(temp_audio_path)
+        shutil.rmtree(work_dir, ignore_errors=True)
         return jsonify({"error": "缺少原文本"}), 400
+    if align_mode not in ALIGN_MODES:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        return jsonify({"error": f"不支持的对齐模式: {align_mode}"}), 400
     
     try:
         # 创建文本临时文件
-        source_text_path = os.path.join(temp_dir, f"source_{int(time.time())}.txt")
+        source_text_path = os.path.join(work_dir, "source_text.txt")
         with open(source_text_path, 'w', encoding='utf-8') as f:
             f.write(source_text)
         
         translate_text_dict = {}
         translate_path = None
         if translate_text:
-            translate_path = os.path.join(temp_dir, f"translate_{int(time.time())}.txt")
+            translate_path = os.path.join(work_dir, "translate_text.txt")
             with open(translate_path, 'w', encoding='utf-8') as f:
                 f.write(translate_text)
             translate_text_dict["翻译文本"] = {
@@ -357,11 +468,9 @@ def generate_subtitle_with_file():
         # 使用原始音频文件名（不含临时前缀）
         original_filename = audio_file.filename
         file_name = os.path.splitext(original_filename)[0]
-        log_dir = "./log"
-        os.makedirs(log_dir, exist_ok=True)
-        
-        generation_subtitle_array_path = f"./log/{current_language}_{file_name}_audio_text_whittime.json"
-        generation_subtitle_text_path = f"./log/{current_language}_{file_name}_finally.txt"
+        # 转录中间文件放在任务自己的工作目录，同名文件的并发任务互不覆盖；复用转录结果见下方的转录缓存
+        generation_subtitle_array_path = os.path.join(work_dir, f"{current_language}_{file_name}_audio_text_whittime.json")
+        generation_subtitle_text_path = os.path.join(work_dir, f"{current_language}_{file_name}_finally.txt")
         
         # 如果是 JSON 文件，直接处理
         if temp_audio_path.lower().endswith(".json"):
@@ -405,7 +514,7 @@ def generate_subtitle_with_file():
             with open(generation_subtitle_text_path, 'w', encoding='utf-8') as file:
                 file.write(all_text.lstrip())
                 
-        elif not os.path.exists(generation_subtitle_array_path):
+        else:
             # 通过 Gladia 转录
             progress_generator = transcribe_audio_from_gladia(
                 temp_audio_path,
@@ -413,7 +522,8 @@ def generate_subtitle_with_file():
                 lang_en_name,
                 generation_subtitle_array_path,
                 generation_subtitle_text_path,
-                audio_cut_length
+                audio_cut_length,
+                work_dir=os.path.join(work_dir, "gladia_tmp")
             )
             
             for progress in progress_generator:
@@ -449,7 +559,8 @@ def generate_subtitle_with_file():
             generation_subtitle_array, generation_subtitle_text,
             source_text_with_info, translate_text_dict,
             gen_merge_srt, source_up_order,
-            export_fcpxml, seamless_fcpxml
+            export_fcpxml, seamless_fcpxml,
+            align_mode=align_mode
         )
         
         # 收集生成的文件
@@ -473,13 +584,7 @@ def generate_subtitle_with_file():
             generated_files.append(fcpxml_path)
         
         # 清理临时文件
-        try:
-            os.remove(temp_audio_path)
-            os.remove(source_text_path)
-            if translate_path:
-                os.remove(translate_path)
-        except:
-            pass
+        shutil.rmtree(work_dir, ignore_errors=True)
         
         return jsonify({
             "message": "处理完成",
@@ -492,10 +597,7 @@ def generate_subtitle_with_file():
         print(f"generate-with-file 错误: {e}")
         traceback.print_exc()
         # 清理临时文件
-        try:
-            os.remove(temp_audio_path)
-        except:
-            pass
+        shutil.rmtree(work_dir, ignore_errors=True)
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/subtitle/download-zip', methods=['POST', 'OPTIONS'])
@@ -529,172 +631,235 @@ def download_subtitle_zip():
         download_name=f'subtitles_{int(time.time())}.zip'
     )
 
-@app.route('/api/subtitle/generate', methods=['POST'])
-def generate_subtitle():
-    """生成字幕"""
-    global processing_status
-    
-    if processing_status["is_processing"]:
-        return jsonify({"error": "正在处理中，请稍候"}), 400
-    
-    data = request.json
-    
-    # 必需参数
-    audio_path = data.get('audio_path')
-    source_text = data.get('source_text')
-    language = data.get('language', 'en')
-    
-    # 可选参数
-    translate_text = data.get('translate_text', '')
-    gladia_keys = data.get('gladia_keys', [])
-    audio_cut_length = data.get('audio_cut_length', 5.0)
-    gen_merge_srt = data.get('gen_merge_srt', False)
-    source_up_order = data.get('source_up_order', False)
-    export_fcpxml = data.get('export_fcpxml', False)
-    seamless_fcpxml = data.get('seamless_fcpxml', False)
-    
-    if not audio_path or not source_text:
-        return jsonify({"error": "缺少必需参数: audio_path 和 source_text"}), 400
-    
-    # 在线程中处理
-    def process():
-        global processing_status
-        processing_status = {
-            "is_processing": True,
-            "progress": "开始处理...",
-            "result": None,
-            "error": None
-        }
+def _run_subtitle_job(payload):
+    """字幕生成任务：每个任务使用独立的临时工作目录，可与其他任务并发执行"""
+    audio_path = payload['audio_path']
+    source_text = payload['source_text']
+    language = payload.get('language', 'en')
+    translate_text = payload.get('translate_text', '')
+    gladia_keys = payload.get('gladia_keys', [])
+    audio_cut_length = payload.get('audio_cut_length', 5.0)
+    gen_merge_srt = payload.get('gen_merge_srt', False)
+    source_up_order = payload.get('source_up_order', False)
+    export_fcpxml = payload.get('export_fcpxml', False)
+    seamless_fcpxml = payload.get('seamless_fcpxml', False)
+    align_mode = payload.get('align_mode', 'char')
+
+    report_progress(message="开始处理...")
+    work_dir = tempfile.mkdtemp(prefix="subtitle_job_")
+    try:
+        # 文本写入任务自己的工作目录，避免并发任务互相覆盖
+        source_text_path = os.path.join(work_dir, "source_text.txt")
+        with open(source_text_path, 'w', encoding='utf-8') as f:
+            f.write(source_text)
         
-        try:
-            # 创建临时文件保存文本
-            temp_dir = tempfile.gettempdir()
-            source_text_path = os.path.join(temp_dir, "source_text.txt")
-            with open(source_text_path, 'w', encoding='utf-8') as f:
-                f.write(source_text)
-            
-            # 处理翻译文本
-            translate_text_dict = {}
-            if translate_text:
-                translate_path = os.path.join(temp_dir, "translate_text.txt")
-                with open(translate_path, 'w', encoding='utf-8') as f:
-                    f.write(translate_text)
-                translate_text_dict["翻译文本"] = {
-                    "filename": "翻译文本",
-                    "filepath": translate_path
-                }
+        # 处理翻译文本
+        translate_text_dict = {}
+        if translate_text:
+            translate_path = os.path.join(work_dir, "translate_text.txt")
+            with open(translate_path, 'w', encoding='utf-8') as f:
+                f.write(translate_text)
+            translate_text_dict["翻译文本"] = {
+                "filename": "翻译文本",
+                "filepath": translate_path
+            }
+        
+        current_language = change_language(language) if language in [v["name"] for v in LANGUAGES.values()] else language
+        lang_en_name = get_language(current_language)
+        
+        file_name = os.path.splitext(os.path.basename(audio_path))[0]
+        # 转录中间文件放在任务自己的工作目录，同名文件的并发任务互不覆盖；复用转录结果见下方的转录缓存
+        generation_subtitle_array_path = os.path.join(work_dir, f"{current_language}_{file_name}_audio_text_whittime.json")
+        generation_subtitle_text_path = os.path.join(work_dir, f"{current_language}_{file_name}_finally.txt")
+        
+        # 如果是 JSON 文件，直接处理
+        if audio_path.lower().endswith(".json"):
+            report_progress(message="处理JSON文件...")
+            with open(audio_path, 'r', encoding='utf-8') as file:
+                audio_json = json.load(file)
             
-            current_language = change_language(language) if language in [v["name"] for v in LANGUAGES.values()] else language
-            lang_en_name = get_language(current_language)
+            if "result" in audio_json:
+                transcription = audio_json["result"].get("transcription", {})
+            else:
+                transcription = audio_json.get("transcription", {})
             
-            file_name = os.path.splitext(os.path.basename(audio_path))[0]
-            log_dir = "./log"
-            os.makedirs(log_dir, exist_ok=True)
+            word_time_info = transcription.get("utterances", [])
             
-            generation_subtitle_array_path = f"./log/{current_language}_{file_name}_audio_text_whittime.json"
-            generation_subtitle_text_path = f"./log/{current_language}_{file_name}_finally.txt"
+            all_text = ""
+            new_word_time_info = []
             
-            # 如果是 JSON 文件，直接处理
-            if audio_path.lower().endswith(".json"):
-                processing_status["progress"] = "处理JSON文件..."
-                with open(audio_path, 'r', encoding='utf-8') as file:
-                    audio_json = json.load(file)
-                
-                if "result" in audio_json:
-                    transcription = audio_json["result"].get("transcription", {})
-                else:
-                    transcription = audio_json.get("transcription", {})
-                
-                word_time_info = transcription.get("utterances", [])
-                
-                all_text = ""
-                new_word_time_info = []
+            for single in word_time_info:
+                new_single = {
+                    "audio_start": single["start"],
+                    "audio_end": single["end"],
+                    "text": single["text"],
+                    "words": []
+                }
                 
-                for single in word_time_info:
-                    new_single = {
-                        "audio_start": single["start"],
-                        "audio_end": single["end"],
-                        "text": single["text"],
-                        "words": []
+                words = single.get("words", [])
+                for word in words:
+                    all_text += " " + word["word"].strip()
+                    word_info = {
+                        "word": word["word"].strip(),
+                        "start": word["start"],
+                        "end": word["end"],
+                        "score": word.get("confidence", 0)
                     }
-                    
-                    words = single.get("words", [])
-                    for word in words:
-                        all_text += " " + word["word"].strip()
-                        word_info = {
-                            "word": word["word"].strip(),
-                            "start": word["start"],
-                            "end": word["end"],
-                            "score": word.get("confidence", 0)
-                        }
-                        new_single["words"].append(word_info)
-                    
-                    new_word_time_info.append(new_single)
+                    new_single["words"].append(word_info)
                 
-                with open(generation_subtitle_array_path, 'w', encoding='utf-8') as f:
-                    json.dump(new_word_time_info, f, indent=4, ensure_ascii=False)
+                new_word_time_info.append(new_single)
+            
+            with open(generation_subtitle_array_path, 'w', encoding='utf-8') as f:
+                json.dump(new_word_time_info, f, indent=4, ensure_ascii=False)
+            
+            with open(generation_subtitle_text_path, 'w', encoding='utf-8') as file:
+                file.write(all_text.lstrip())
                 
-                with open(generation_subtitle_text_path, 'w', encoding='utf-8') as file:
-                    file.write(all_text.lstrip())
-                    
-            elif not os.path.exists(generation_subtitle_array_path):
+        else:
+            # 转录结果按音频文件指纹 + 语种缓存：重新生成同一音频的字幕时不再重复转录，
+            # 同名的不同文件也不会误用彼此的结果
+            cache_path = transcript_cache_path(audio_path, lang_en_name)
+            if load_cached_transcript(cache_path, generation_subtitle_array_path, generation_subtitle_text_path):
+                report_progress(message="使用已缓存的转录结果")
+            else:
                 # 通过 Gladia 转录
-                processing_status["progress"] = "通过 Gladia 转录音频..."
-                
+                report_progress(message="通过 Gladia 转录音频...")
+
                 progress_generator = transcribe_audio_from_gladia(
                     audio_path,
                     gladia_keys,
                     lang_en_name,
                     generation_subtitle_array_path,
                     generation_subtitle_text_path,
-                    audio_cut_length
+                    audio_cut_length,
+                    work_dir=os.path.join(work_dir, "gladia_tmp")
                 )
-                
+
                 for progress in progress_generator:
-                    processing_status["progress"] = str(progress)
-            
-            # 读取生成的数据
-            if not os.path.exists(generation_subtitle_array_path) or not os.path.exists(generation_subtitle_text_path):
-                raise Exception("生成文件发生错误")
-            
-            generation_subtitle_array = read_object_from_json(generation_subtitle_array_path)
-            
-            with open(generation_subtitle_text_path, 'r', encoding='utf-8') as f:
-                generation_subtitle_text = f.read().strip()
-            
-            source_text_with_info = read_text_with_google_doc(source_text_path)
-            
-            # 处理翻译文本
-            for k, value in translate_text_dict.items():
-                translate_text_path = value["filepath"]
-                translate_text_with_info = read_text_with_google_doc(translate_text_path)
-                translate_text_dict[k]["translate_text_with_info"] = translate_text_with_info
-                translate_text_dict[k]["trans_srt"] = ""
-            
-            # 执行对齐
-            directory = os.path.dirname(audio_path)
-            result = audio_subtitle_search_diffent_strong(
-                current_language, directory, file_name,
-                generation_subtitle_array, generation_subtitle_text,
-                source_text_with_info, translate_text_dict,
-                gen_merge_srt, source_up_order,
-                export_fcpxml, seamless_fcpxml
-            )
-            
-            processing_status["progress"] = "完成"
-            processing_status["result"] = str(result)
-            
-        except Exception as e:
-            import traceback
-            traceback.print_exc()
-            processing_status["error"] = str(e)
-        finally:
-            processing_status["is_processing"] = False
+                    check_cancelled()
+                    report_progress(message=progress)
+
+                if os.path.exists(generation_subtitle_array_path) and os.path.exists(generation_subtitle_text_path):
+                    save_cached_transcript(cache_path, generation_subtitle_array_path, generation_subtitle_text_path)
+        
+        # 读取生成的数据
+        if not os.path.exists(generation_subtitle_array_path) or not os.path.exists(generation_subtitle_text_path):
+            raise Exception("生成文件发生错误")
+        
+        generation_subtitle_array = read_object_from_json(generation_subtitle_array_path)
+        
+        with open(generation_subtitle_text_path, 'r', encoding='utf-8') as f:
+            generation_subtitle_text = f.read().strip()
+        
+        source_text_with_info = read_text_with_google_doc(source_text_path)
+        
+        # 处理翻译文本
+        for k, value in translate_text_dict.items():
+            translate_text_path = value["filepath"]
+            translate_text_with_info = read_text_with_google_doc(translate_text_path)
+            translate_text_dict[k]["translate_text_with_info"] = translate_text_with_info
+            translate_text_dict[k]["trans_srt"] = ""
+        
+        # 执行对齐
+        check_cancelled()
+        report_progress(message="对齐字幕...")
+        directory = os.path.dirname(audio_path)
+        result = audio_subtitle_search_diffent_strong(
+            current_language, directory, file_name,
+            generation_subtitle_array, generation_subtitle_text,
+            source_text_with_info, translate_text_dict,
+            gen_merge_srt, source_up_order,
+            export_fcpxml, seamless_fcpxml,
+            align_mode=align_mode,
+            progress_callback=lambda done, total: report_progress(done, total, "对齐字幕..."),
+            cancel_check=check_cancelled
+        )
+        
+        report_progress(message="完成")
+        return str(result)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+# 字幕任务注册表：并发上限可通过 PYMEDIA_SUBTITLE_CONCURRENCY 配置，超出的任务排队
+_subtitle_jobs = JobManager('subtitle', max_workers=int(os.environ.get('PYMEDIA_SUBTITLE_CONCURRENCY', 0)) or 2)
+# gladia_keys 只保存在内存中，不随任务状态写入磁盘
+_subtitle_jobs.register('subtitle.generate', _run_subtitle_job, secret_fields=('gladia_keys',))
+
+
+def _subtitle_job_info(job):
+    """字幕任务状态（兼容旧版 /api/status 的字段）"""
+    info = job.to_dict(include_result=True)
+    info["is_processing"] = info["status"] in ('queued', 'running')
+    info["progress"] = info["progress"]["message"]
+    return info
+
+
+@app.route('/api/subtitle/generate', methods=['POST'])
+def generate_subtitle():
+    """
+    生成字幕（后台任务，可多个文件并发处理）
+
+    align_mode：char 字符级全文比较（默认，结果与旧版本一致）；
+    word 词级比较，长文本更快，但差异结果是近似的，字幕时间轴可能与 char 模式不同（黄金用例上单条偏差不超过 1 秒）；
+    anchored 按锚点分窗并行做字符级比较，适合超长文本
+    """
+    data = request.json or {}
     
-    thread = threading.Thread(target=process)
-    thread.start()
+    # 必需参数
+    audio_path = data.get('audio_path')
+    source_text = data.get('source_text')
     
-    return jsonify({"message": "开始处理", "status": "processing"})
+    if not audio_path or not source_text:
+        return jsonify({"error": "缺少必需参数: audio_path 和 source_text"}), 400
+    align_mode = data.get('align_mode', 'char')
+    if align_mode not in ALIGN_MODES:
+        return jsonify({"error": f"不支持的对齐模式: {align_mode}"}), 400
+    
+    payload = {
+        "audio_path": audio_path,
+        "source_text": source_text,
+        "language": data.get('language', 'en'),
+        # 可选参数
+        "translate_text": data.get('translate_text', ''),
+        "gladia_keys": data.get('gladia_keys', []),
+        "audio_cut_length": data.get('audio_cut_length', 5.0),
+        "gen_merge_srt": data.get('gen_merge_srt', False),
+        "source_up_order": data.get('source_up_order', False),
+        "export_fcpxml": data.get('export_fcpxml', False),
+        "seamless_fcpxml": data.get('seamless_fcpxml', False),
+        # 对齐模式：char 字符级（默认）/ word 词级，长文本更快但结果近似 / anchored 锚点分窗并行，超长文本
+        "align_mode": align_mode,
+    }
+    job = _subtitle_jobs.submit('subtitle.generate', payload)
+    
+    return jsonify({"message": "开始处理", "status": "processing", "job_id": job.id})
+
+@app.route('/api/subtitle/jobs', methods=['GET'])
+def list_subtitle_jobs():
+    """列出字幕生成任务"""
+    return jsonify({
+        "max_concurrency": _subtitle_jobs.max_workers,
+        "jobs": [_subtitle_job_info(job) for job in _subtitle_jobs.list()]
+    })
+
+@app.route('/api/subtitle/jobs/<job_id>', methods=['GET'])
+def get_subtitle_job(job_id):
+    """查询单个字幕生成任务的状态"""
+    job = _subtitle_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "任务不存在"}), 404
+    return jsonify(_subtitle_job_info(job))
+
+@app.route('/api/subtitle/jobs/<job_id>/cancel', methods=['POST', 'OPTIONS'])
+def cancel_subtitle_job(job_id):
+    """取消字幕生成任务"""
+    if request.method == 'OPTIONS':
+        return '', 204
+    job = _subtitle_jobs.cancel(job_id)
+    if job is None:
+        return jsonify({"error": "任务不存在"}), 404
+    return jsonify(_subtitle_job_info(job))
 
 @app.route('/api/srt/adjust', methods=['POST'])
 def adjust_srt():
@@ -1764,6 +1929,7 @@ def elevenlabs_tts():
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/elevenlabs/tts-batch', methods=['POST', 'OPTIONS'])
+@_async_job('elevenlabs.tts_batch')
 def elevenlabs_tts_batch():
     """ElevenLabs 批量文本转语音"""
     if request.method == 'OPTIONS':
@@ -1871,6 +2037,8 @@ def elevenlabs_tts_batch():
 
     # 第一轮：正常处理所有任务
     for idx, item in enumerate(items):
+        check_cancelled()
+        report_progress(idx, len(items), f"生成第 {idx + 1} 条")
         if not isinstance(item, dict):
             results[idx] = {"index": idx, "error": "任务格式无效"}
             continue
@@ -1907,6 +2075,7 @@ def elevenlabs_tts_batch():
         for idx, item in failed_tasks:
             if circuit_breaker_triggered:
                 break
+            check_cancelled()
             
             time.sleep(1)  # 等待一会儿
             result, status = try_generate(idx, item)
@@ -1940,9 +2109,12 @@ def elevenlabs_tts_workflow():
     export_mp4 = data.get('export_mp4', False)
     export_fcpxml = data.get('export_fcpxml', True)  # 默认导出 FCPXML
     seamless_fcpxml = data.get('seamless_fcpxml', True)  # 默认无缝字幕
+    align_mode = data.get('align_mode', 'char')
     
     if not text or not voice_id:
         return jsonify({"error": "缺少必要参数"}), 400
+    if align_mode not in ALIGN_MODES:
+        return jsonify({"error": f"不支持的对齐模式: {align_mode}"}), 400
 
     # 兜底互斥：黑屏 MP4 模式下不进行智能拆分
     if export_mp4 and need_split:
@@ -2150,7 +2322,8 @@ def elevenlabs_tts_workflow():
                         False, False,  # gen_merge_srt, source_up_order
                         export_fcpxml, seamless_fcpxml,  # 导出 FCPXML（默认启用）
                         source_srt_path=target_srt_path,
-                        fcpxml_path=target_fcpxml_path
+                        fcpxml_path=target_fcpxml_path,
+                        align_mode=align_mode
                     )
 
                     if os.path.exists(target_srt_path):
@@ -2171,12 +2344,9 @@ def elevenlabs_tts_workflow():
                 mp4_path = os.path.join(video_group, f'{task_prefix}.mp4')
                 
                 # 先获取音频时长
-                duration_cmd = [
-                    'ffprobe', '-v', 'error', '-show_entries', 'format=duration',
-                    '-of', 'default=noprint_wrappers=1:nokey=1', source_path
-                ]
-                duration_result = subprocess.run(duration_cmd, capture_output=True, text=True, timeout=30)
-                audio_duration = float(duration_result.stdout.strip())
+                audio_duration = _get_audio_duration(source_path)
+                if not audio_duration:
+                    raise ValueError(f"无法获取音频时长: {source_path}")
                 
                 # 使用 ffmpeg 生成黑屏视频，精确指定时长
                 cmd = [
@@ -2438,41 +2608,12 @@ def _build_segments(cut_points):
     return segments
 
 def _get_audio_duration(file_path):
-    """获取音频/视频文件的时长（秒），多种方法回退"""
-    ffprobe_cmd = os.environ.get('FFPROBE_PATH', 'ffprobe')
-    
-    # 方法1: format=duration
-    try:
-        result = subprocess.run([
-            ffprobe_cmd, '-v', 'error',
-            '-show_entries', 'format=duration',
-            '-of', 'default=noprint_wrappers=1:nokey=1',
-            file_path
-        ], capture_output=True, text=True, check=True, timeout=30)
-        dur = float(result.stdout.strip())
-        if dur > 0:
-            print(f"[DEBUG] 获取时长: {file_path} -> {dur}s")
-            return dur
-    except Exception as e:
-        print(f"[DEBUG] 获取时长方法1失败 (format=duration): {file_path} -> {e}")
-    
-    # 方法2: stream=duration（某些容器格式 format 级别没有 duration）
-    try:
-        result = subprocess.run([
-            ffprobe_cmd, '-v', 'error',
-            '-select_streams', 'v:0',
-            '-show_entries', 'stream=duration',
-            '-of', 'default=noprint_wrappers=1:nokey=1',
-            file_path
-        ], capture_output=True, text=True, check=True, timeout=30)
-        dur = float(result.stdout.strip())
-        if dur > 0:
-            print(f"[DEBUG] 获取时长方法2成功 (stream=duration): {file_path} -> {dur}s")
-            return dur
-    except Exception as e:
-        print(f"[DEBUG] 获取时长方法2失败 (stream=duration): {file_path} -> {e}")
-    
-    print(f"[ERROR] 所有获取时长方法均失败: {file_path}")
+    """获取音频/视频文件的时长（秒）。走 media_probe 缓存，同一文件只探测一次"""
+    dur = media_probe.get_duration(file_path)
+    if dur:
+        print(f"[DEBUG] 获取时长: {file_path} -> {dur}s")
+        return dur
+    print(f"[ERROR] 获取时长失败: {file_path}")
     return None
 
 def _build_black_mp4_cmd(file_path, output_path, start, duration, size="1280x720", fps=24):
@@ -2512,7 +2653,12 @@ def _build_black_mp4_cmd(file_path, output_path, start, duration, size="1280x720
     
     return cmd
 
+# 不做视频编码的转换模式，调度时使用大并发的 light 池
+_LIGHT_CONVERT_MODES = {'png', 'mp3', 'wav'}
+_MAX_COMBINE_INPUTS = 16
+
 @app.route('/api/media/convert', methods=['POST', 'OPTIONS'])
+@_async_job('media.convert')
 def media_convert():
     """媒体转换 - 支持多种模式"""
     if request.method == 'OPTIONS':
@@ -2577,19 +2723,66 @@ def media_convert():
         'audio_split': {'output_ext': '', 'type': 'audio_split'},
     }
     
+    # 多目标：modes 列出多个模式时每个源文件只解码一次，一条 ffmpeg 命令同时输出全部模式（忽略 mode）
+    targets = data.get('modes')
+    if targets is not None:
+        if not isinstance(targets, list) or not targets:
+            return jsonify({"error": "modes 必须是非空的模式列表"}), 400
+        targets = list(dict.fromkeys(targets))
+        unsupported = [t for t in targets
+                       if t not in multi_output.TARGETS and 'logo_path' not in modes_config.get(t, {})]
+        if unsupported:
+            return jsonify({"error": f"多目标转换不支持的模式: {', '.join(map(str, unsupported))}"}), 400
     # custom_logo 和 watermark 是特殊模式，不在预定义配置中
-    if mode not in modes_config and mode not in ['custom_logo', 'watermark']:
+    elif mode not in modes_config and mode not in ['custom_logo', 'watermark']:
         return jsonify({"error": f"不支持的模式: {mode}"}), 400
+
+    # 视频编码器：auto（检测到的硬件编码器优先）/ software / 具体编码器名；硬件编码失败时逐个文件回退到 libx264
+    encoder = hw_encoders.SOFTWARE_ENCODER
+    light = all(t in _LIGHT_CONVERT_MODES for t in targets) if targets else mode in _LIGHT_CONVERT_MODES
+    if not light:
+        try:
+            encoder = hw_encoders.resolve(data.get('encoder', 'auto'))
+        except ValueError as exc:
+            return jsonify({"error": str(exc)}), 400
+
+    # Logo 模式可把多个输入合并到一个 ffmpeg 进程（combine_inputs 个一组），默认每个文件单独一个进程
+    try:
+        combine_inputs = max(1, min(_MAX_COMBINE_INPUTS, int(data.get('combine_inputs', 1))))
+    except (TypeError, ValueError):
+        return jsonify({"error": "combine_inputs 必须是整数"}), 400
+
+    def _add_task(cmd, output_path, source, duration=None, cost=ffmpeg_batch.COST_ENCODE, extra_outputs=(),
+                  timeout=None):
+        hw_cmd = hw_encoders.apply_encoder(cmd, encoder)
+        tasks.append(ffmpeg_batch.ConvertTask(hw_cmd, output_path, source, duration, cost,
+                                              fallback_cmd=cmd if hw_cmd is not cmd else None,
+                                              extra_outputs=extra_outputs, timeout=timeout))
     
     try:
-        import subprocess
-        converted = []
         config = modes_config.get(mode, {})
         
         # 获取 assets 目录路径
         assets_dir = os.path.join(os.path.dirname(__file__), '..', 'assets')
         
+        # 先为每个文件生成命令（参数错误在任何 ffmpeg 启动前返回），再统一交给调度器并发执行
+        tasks = []
+        logo_jobs = []     # [(输入, 输出)]，循环结束后按 combine_inputs 分组生成叠加命令
+        logo_spec = None   # (logo 路径, 位置)，同一请求内所有文件相同
+        skipped = []       # 多目标模式下因缺少音/视频流而跳过的输出
+
+        # 多目标中各 logo 模式的 (logo 路径, 位置)；logo 文件缺失时为 False（只做格式转换）
+        target_logos = {}
+        for target in targets or []:
+            if 'logo_path' in modes_config.get(target, {}):
+                logo_path = os.path.join(assets_dir, os.path.basename(modes_config[target]['logo_path']))
+                try:
+                    pos = _apply_logo_override(modes_config[target]['logo_pos'], data.get('logo_override', {}))
+                except ValueError as exc:
+                    return jsonify({"error": str(exc)}), 400
+                target_logos[target] = (logo_path, pos) if os.path.exists(logo_path) else False
         for file_path in files:
+            check_cancelled()
             if not os.path.exists(file_path):
                 continue
             
@@ -2597,6 +2790,22 @@ def media_convert():
             ext = os.path.splitext(file_path)[1].lower()
             out_dir = output_dir if output_dir else os.path.dirname(file_path)
             
+            # 多目标：split / asplit 一次解码多路输出
+            if targets:
+                info = media_probe.probe(file_path)
+                cmd, outputs, skipped_targets = multi_output.build_multi_output_cmd(
+                    file_path,
+                    [(t, os.path.join(out_dir, f"{base_name}{modes_config[t]['output_ext']}"), target_logos.get(t))
+                     for t in targets],
+                    has_video=info is None or media_probe.first_stream(info, 'video') is not None,
+                    has_audio=info is None or media_probe.first_stream(info, 'audio') is not None)
+                skipped.extend({"file": file_path, "mode": t, "reason": reason} for t, reason in skipped_targets)
+                if cmd:
+                    _add_task(cmd, outputs[0], file_path, extra_outputs=outputs[1:],
+                              cost=ffmpeg_batch.COST_LIGHT if light else ffmpeg_batch.COST_ENCODE,
+                              timeout=ffmpeg_batch.task_timeout(len(outputs), media_probe.get_duration(file_path)))
+                continue
+            
             # Logo 添加模式(预设)
             if mode in ['hailuo', 'vidu', 'veo', 'heygen', 'dream', 'ai_generated']:
                 logo_path = os.path.join(assets_dir, os.path.basename(config['logo_path']))
@@ -2607,21 +2816,11 @@ def media_convert():
                     return jsonify({"error": str(exc)}), 400
                 output_path = os.path.join(out_dir, f"{base_name}{config['output_ext']}")
                 
-                # 先缩放视频到 1080x1920，再叠加 logo
-                filter_str = (
-                    f"scale=1080:1920:force_original_aspect_ratio=decrease,"
-                    f"pad=1080:1920:(ow-iw)/2:(oh-ih)/2[v];"
-                    f"[1:v]scale={pos['w']}:{pos['h']}[logo];"
-                    f"[v][logo]overlay={pos['x']}:{pos['y']}"
-                )
-                
+                # 先缩放视频到 1080x1920，再叠加预缩放的 logo
                 if os.path.exists(logo_path):
-                    cmd = [
-                        'ffmpeg', '-y', '-i', file_path, '-i', logo_path,
-                        '-filter_complex', filter_str,
-                        '-c:v', 'libx264', '-c:a', 'aac', '-b:a', '128k',
-                        output_path
-                    ]
+                    logo_spec = (logo_path, pos)
+                    logo_jobs.append((file_path, output_path))
+                    continue
                 else:
                     # Logo 不存在，只做格式转换
                     cmd = ['ffmpeg', '-y', '-i', file_path, '-c:v', 'libx264', '-c:a', 'aac', output_path]
@@ -2645,18 +2844,9 @@ def media_convert():
                 output_path = os.path.join(out_dir, f"{base_name}{output_ext}")
                 
                 if logo_path and os.path.exists(logo_path):
-                    filter_str = (
-                        f"scale=1080:1920:force_original_aspect_ratio=decrease,"
-                        f"pad=1080:1920:(ow-iw)/2:(oh-ih)/2[v];"
-                        f"[1:v]scale={logo_w}:{logo_h}[logo];"
-                        f"[v][logo]overlay={pos_x}:{pos_y}"
-                    )
-                    cmd = [
-                        'ffmpeg', '-y', '-i', file_path, '-i', logo_path,
-                        '-filter_complex', filter_str,
-                        '-c:v', 'libx264', '-c:a', 'aac', '-b:a', '128k',
-                        output_path
-                    ]
+                    logo_spec = (logo_path, {'x': pos_x, 'y': pos_y, 'w': logo_w, 'h': logo_h})
+                    logo_jobs.append((file_path, output_path))
+                    continue
                 else:
                     return jsonify({"error": "自定义 Logo 文件不存在"}), 400
             
@@ -2791,14 +2981,12 @@ def media_convert():
                             '-vn', '-c:a', 'libmp3lame', '-b:a', '192k', '-ac', '2',
                             mp3_path
                         ]
-                        subprocess.run(cmd, check=True, capture_output=True, timeout=600)
-                        converted.append(mp3_path)
+                        _add_task(cmd, mp3_path, file_path, cost=ffmpeg_batch.COST_LIGHT)
                     
                     if export_mp4:
                         mp4_path = os.path.join(out_dir, f"{base_name}_black.mp4")
                         cmd = _build_black_mp4_cmd(file_path, mp4_path, 0, None)
-                        subprocess.run(cmd, check=True, capture_output=True, timeout=600)
-                        converted.append(mp4_path)
+                        _add_task(cmd, mp4_path, file_path)
                     
                     continue
 
@@ -2826,38 +3014,60 @@ def media_convert():
                         if duration is not None:
                             cmd.extend(['-t', f"{duration:.3f}"])
                         cmd.append(mp3_path)
-                        subprocess.run(cmd, check=True, capture_output=True, timeout=600)
-                        converted.append(mp3_path)
+                        _add_task(cmd, mp3_path, file_path, duration, cost=ffmpeg_batch.COST_LIGHT)
 
                 # 黑屏 MP4 只生成一个完整的（原始音频，不裁切）
                 if export_mp4:
                     mp4_path = os.path.join(out_dir, f"{base_name}_black.mp4")
                     cmd = _build_black_mp4_cmd(file_path, mp4_path, 0, None)
-                    subprocess.run(cmd, check=True, capture_output=True, timeout=600)
-                    converted.append(mp4_path)
+                    _add_task(cmd, mp4_path, file_path)
 
                 continue
 
             else:
                 continue
             
-            subprocess.run(cmd, check=True, capture_output=True, timeout=600)
-            converted.append(output_path)
+            cost = ffmpeg_batch.COST_LIGHT if mode in _LIGHT_CONVERT_MODES else ffmpeg_batch.COST_ENCODE
+            _add_task(cmd, output_path, file_path, cost=cost)
         
-        # 获取每个文件的时长
-        files_with_duration = []
-        for f in converted:
-            dur = _get_audio_duration(f)
-            files_with_duration.append({
-                "path": f,
-                "duration": round(dur, 2) if dur else None
-            })
+        for start in range(0, len(logo_jobs), combine_inputs):
+            group = logo_jobs[start:start + combine_inputs]
+            cmd = logo_overlay.build_overlay_cmd([src for src, _ in group], [dst for _, dst in group], *logo_spec)
+            if len(group) == 1:
+                _add_task(cmd, group[0][1], group[0][0])
+            else:
+                # 合并命令的进度按最长的输入换算，超时按输入数与总时长放大
+                durations = [media_probe.get_duration(src) or 0 for src, _ in group]
+                _add_task(cmd, group[0][1], None, max(durations) or None,
+                          extra_outputs=[dst for _, dst in group[1:]],
+                          timeout=ffmpeg_batch.task_timeout(len(group), sum(durations)))
         
-        return jsonify({
+        # 按开销分池并发转换，输出时长在工作线程中顺带获取；结果保持提交顺序
+        results = ffmpeg_batch.run_tasks(tasks, progress_callback=report_progress,
+                                         cancel_check=check_cancelled, probe_output=_get_audio_duration)
+        converted = [path for path, _ in results]
+        files_with_duration = [{
+            "path": path,
+            "duration": round(dur, 2) if dur else None
+        } for path, dur in results]
+        
+        fallbacks = sum(1 for task in tasks if task.fell_back)
+        if fallbacks:
+            print(f"[转换] {fallbacks} 个文件的 {encoder} 编码失败，已改用 {hw_encoders.SOFTWARE_ENCODER}")
+        
+        response = {
             "message": f"成功转换 {len(converted)} 个文件",
             "files": converted,
-            "files_info": files_with_duration
-        })
+            "files_info": files_with_duration,
+            "encoder": encoder,
+            "encoder_fallbacks": fallbacks
+        }
+        if targets:
+            response["modes"] = targets
+            response["skipped"] = skipped
+        return jsonify(response)
+    except JobCancelled:
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -2872,52 +3082,36 @@ def get_waveform():
     data = request.json
     file_path = data.get('file_path', '')
     num_peaks = int(data.get('num_peaks', 300))
+    # 可选区间（秒），时间线缩放时只取可见范围
+    start = data.get('start')
+    end = data.get('end')
 
     if not file_path or not os.path.exists(file_path):
         return jsonify({"error": "文件不存在"}), 400
 
     try:
-        import struct
-
-        # 使用 FFmpeg 提取单声道、低采样率的原始 float32 音频数据
-        cmd = [
-            'ffmpeg', '-hide_banner', '-i', file_path,
-            '-ac', '1', '-ar', '8000',
-            '-f', 'f32le', '-'
-        ]
-        result = subprocess.run(cmd, capture_output=True, timeout=120)
-
-        raw_data = result.stdout
-        num_samples = len(raw_data) // 4  # float32 = 4 bytes
-
-        if num_samples == 0:
-            duration = _get_audio_duration(file_path) or 0
-            return jsonify({"peaks": [], "duration": round(duration, 3), "num_peaks": 0})
-
-        samples = struct.unpack(f'{num_samples}f', raw_data)
-
-        # 计算峰值
-        block_size = max(1, num_samples // num_peaks)
-        peaks = []
-        for i in range(min(num_peaks, num_samples // max(block_size, 1))):
-            start_idx = i * block_size
-            end_idx = min(start_idx + block_size, num_samples)
-            block = samples[start_idx:end_idx]
-            peak = max(abs(s) for s in block) if block else 0
-            peaks.append(peak)
+        # 依赖 numpy，按需导入
+        try:
+            from core.waveform import get_peaks, SAMPLE_RATE
+        except ImportError:
+            from pyMediaTools.core.waveform import get_peaks, SAMPLE_RATE
 
-        # 归一化
-        max_peak = max(peaks) if peaks else 1
-        if max_peak > 0:
-            peaks = [round(p / max_peak, 4) for p in peaks]
+        # 首次请求时流式解码并写入多级峰值缓存，之后按区间/分辨率直接取
+        result = get_peaks(file_path, num_peaks=num_peaks,
+                           start=float(start) if start is not None else None,
+                           end=float(end) if end is not None else None)
+        peaks = result["peaks"]
 
-        duration = _get_audio_duration(file_path) or (num_samples / 8000)
+        duration = _get_audio_duration(file_path) or (result["num_samples"] / SAMPLE_RATE)
 
-        print(f"[波形] {os.path.basename(file_path)}: {len(peaks)} peaks, {duration:.1f}s")
+        print(f"[波形] {os.path.basename(file_path)}: {len(peaks)} peaks, {duration:.1f}s "
+              f"(区间 {result['start']}-{result['end']}s, 层级 {result['level']})")
         return jsonify({
             "peaks": peaks,
             "duration": round(duration, 3),
-            "num_peaks": len(peaks)
+            "num_peaks": len(peaks),
+            "start": result["start"],
+            "end": result["end"]
         })
 
     except subprocess.TimeoutExpired:
@@ -2928,6 +3122,9 @@ def get_waveform():
         return jsonify({"error": f"波形提取失败: {str(e)}"}), 500
 
 
+_TRIM_MODE_LABELS = {"fast": "快速", "precise": "精确", "smart": "智能"}
+
+
 @app.route('/api/media/trim', methods=['POST', 'OPTIONS'])
 def media_trim():
     """精确裁切视频/音频文件"""
@@ -2956,36 +3153,16 @@ def media_trim():
         output_filename = f"{base_name}_trimmed_{start_str.replace(':', '.')}-{end_str.replace(':', '.')}{ext}"
         output_path = os.path.join(out_dir, output_filename)
 
-        precise = data.get('precise', True)  # 默认精确模式
-
-        if precise:
-            # ===== 精确模式：-ss 放在 -i 之后（先解码再定位，帧级精度）=====
-            # 音频用 aac，视频用 libx264 crf 18（高质量）
-            cmd = [
-                'ffmpeg', '-y',
-                '-i', file_path,
-                '-ss', f'{start_time:.3f}',
-                '-to', f'{end_time:.3f}',
-                '-c:v', 'libx264', '-crf', '18', '-preset', 'fast',
-                '-c:a', 'aac', '-b:a', '192k',
-                '-avoid_negative_ts', 'make_zero',
-                output_path
-            ]
-            print(f"[裁切-精确] {base_name} [{start_str} -> {end_str}] => {output_filename}")
-        else:
-            # ===== 快速模式：-ss 放在 -i 之前（关键帧级，很快但不精确）=====
-            cmd = [
-                'ffmpeg', '-y',
-                '-ss', f'{start_time:.3f}',
-                '-i', file_path,
-                '-t', f'{duration:.3f}',
-                '-c', 'copy',
-                '-avoid_negative_ts', 'make_zero',
-                output_path
-            ]
-            print(f"[裁切-快速] {base_name} [{start_str} -> {end_str}] => {output_filename}")
-
-        subprocess.run(cmd, check=True, capture_output=True, timeout=300)
+        # mode: fast（流复制，关键帧级）/ precise（重编码，帧级）/ smart（只重编码首尾不完整的 GOP，帧级）
+        # 兼容旧参数 precise（默认精确模式）
+        mode = data.get('mode') or ('precise' if data.get('precise', True) else 'fast')
+        if mode not in _TRIM_MODE_LABELS:
+            return jsonify({"error": f"不支持的裁切模式: {mode}"}), 400
+
+        print(f"[裁切-{_TRIM_MODE_LABELS[mode]}] {base_name} [{start_str} -> {end_str}] => {output_filename}")
+        cut_info = smart_cut.cut(file_path, start_time, end_time, output_path, mode=mode, timeout=300)
+        if mode == 'smart':
+            print(f"[裁切-智能] 实际模式={cut_info['mode']}, 流复制 {cut_info['copied']}s, 重编码 {cut_info['reencoded']}s")
 
         # 获取输出文件时长
         out_duration = _get_audio_duration(output_path)
@@ -2995,7 +3172,8 @@ def media_trim():
             "output_path": output_path,
             "output_filename": output_filename,
             "duration": round(out_duration, 3) if out_duration else round(duration, 3),
-            "mode": "精确" if precise else "快速"
+            "mode": _TRIM_MODE_LABELS[cut_info["mode"]],
+            "cut_info": cut_info
         })
 
     except Exception as e:
@@ -3029,82 +3207,26 @@ def scene_detect():
         if not duration:
             return jsonify({"error": "无法获取视频时长"}), 400
 
-        # 获取视频帧率
-        fps_result = subprocess.run([
-            'ffprobe', '-v', 'error',
-            '-select_streams', 'v:0',
-            '-show_entries', 'stream=r_frame_rate',
-            '-of', 'default=noprint_wrappers=1:nokey=1',
-            file_path
-        ], capture_output=True, text=True, timeout=30)
-        fps_str = fps_result.stdout.strip()
-        try:
-            if '/' in fps_str:
-                num, den = fps_str.split('/')
-                fps = float(num) / float(den)
-            else:
-                fps = float(fps_str)
-        except Exception:
-            fps = 30.0
-
-        # 获取视频分辨率
-        res_result = subprocess.run([
-            'ffprobe', '-v', 'error',
-            '-select_streams', 'v:0',
-            '-show_entries', 'stream=width,height',
-            '-of', 'csv=p=0',
-            file_path
-        ], capture_output=True, text=True, timeout=30)
-        resolution = res_result.stdout.strip()
+        # 获取视频帧率与分辨率（与时长共用同一次 ffprobe 结果）
+        video_info = media_probe.get_video_info(file_path) or {}
+        fps = video_info.get("fps") or 30.0
+        if video_info.get("width") and video_info.get("height"):
+            resolution = f"{video_info['width']},{video_info['height']}"
+        else:
+            resolution = ""
 
         print(f"[场景检测] 开始分析: {file_path}, 阈值={threshold}, 最小间隔={min_interval}s, FPS={fps:.2f}")
 
-        # 使用 FFmpeg select 滤镜检测场景变化
-        # select='gt(scene,THRESHOLD)' 检测场景变化分数大于阈值的帧
-        # 输出每一帧的时间戳和场景分数
-        cmd = [
-            'ffmpeg', '-hide_banner',
-            '-i', file_path,
-            '-vf', f"select='gt(scene,{threshold})',showinfo",
-            '-f', 'null', '-'
-        ]
-
-        result = subprocess.run(
-            cmd, capture_output=True, text=True, timeout=600  # 10分钟超时
-        )
+        # 逐帧场景分数只需解码一次并缓存，之后调整阈值/最小间隔直接在分数数组上筛选
+        scene_scores = _import_scene_scores()
+        times, scores, cached = scene_scores.get_scores(file_path)
+        if cached:
+            print(f"[场景检测] 使用缓存的场景分数 ({len(times)} 帧)")
 
-        # 从 stderr 中解析 showinfo 的输出（FFmpeg 的 showinfo 滤镜输出到 stderr）
-        stderr_output = result.stderr or ''
-        stdout_output = result.stdout or ''
-
-        # 如果 FFmpeg 返回非零且没有任何输出，说明命令执行失败
-        if result.returncode != 0 and not stderr_output.strip():
-            return jsonify({"error": f"FFmpeg 场景检测命令执行失败 (returncode={result.returncode})"}), 500
-
-        scene_points = []
-        last_time = -min_interval  # 用于去重过近的场景点
-
-        for line in stderr_output.splitlines():
-            if 'showinfo' in line and 'pts_time' in line:
-                # 解析 pts_time
-                import re as _re
-                pts_match = _re.search(r'pts_time:\s*([0-9.]+)', line)
-                if pts_match:
-                    pts_time = float(pts_match.group(1))
-                    # 跳过开头（0~0.5秒的通常是视频开始，不是真正的场景切换）
-                    if pts_time < 0.3:
-                        continue
-                    # 如果距离上个场景点太近，跳过
-                    if pts_time - last_time < min_interval:
-                        continue
-                    # 解析场景分数（如果有）
-                    scene_score = None
-                    # showinfo 不直接输出 scene score，只输出被 select 选中的帧
-                    scene_points.append({
-                        "time": round(pts_time, 3),
-                        "time_str": _format_scene_time(pts_time)
-                    })
-                    last_time = pts_time
+        scene_points = [
+            {"time": round(t, 3), "time_str": _format_scene_time(t)}
+            for t in scene_scores.detect_scene_points(times, scores, threshold, min_interval)
+        ]
 
         print(f"[场景检测] 检测到 {len(scene_points)} 个场景切换点")
 
@@ -3137,13 +3259,22 @@ def scene_detect():
         })
 
     except subprocess.TimeoutExpired:
-        return jsonify({"error": "场景检测超时（超过 10 分钟）"}), 500
+        return jsonify({"error": "场景检测超时"}), 500
     except Exception as e:
         import traceback
         traceback.print_exc()
         return jsonify({"error": "场景检测失败，请检查输入文件"}), 500
 
 
+def _import_scene_scores():
+    """场景分数模块依赖 numpy，按需导入"""
+    try:
+        from core import scene_scores
+    except ImportError:
+        from pyMediaTools.core import scene_scores
+    return scene_scores
+
+
 def _format_scene_time(seconds):
     """将秒数格式化为 HH:MM:SS.mmm"""
     h = int(seconds // 3600)
@@ -3155,6 +3286,7 @@ def _format_scene_time(seconds):
 
 
 @app.route('/api/media/scene-split', methods=['POST', 'OPTIONS'])
+@_async_job('media.scene_split')
 def scene_split():
     """按场景切换点将视频拆分为独立片段"""
     if request.method == 'OPTIONS':
@@ -3164,11 +3296,17 @@ def scene_split():
     file_path = data.get('file_path', '')
     segments = data.get('segments', [])
     output_dir = data.get('output_dir', '')
+    mode = data.get('mode', 'precise')  # precise（默认，重编码）/ smart（只重编码首尾 GOP）/ fast（流复制）
+    # parallel: 多个 ffmpeg 进程并行导出各片段; segment: 一次解码由 segment 封装器分段（仅精确模式）
+    split_mode = data.get('split_mode', 'parallel')
+    workers = int(data.get('workers', 0)) or None
 
     if not file_path or not os.path.exists(file_path):
         return jsonify({"error": "文件不存在"}), 400
     if not segments:
         return jsonify({"error": "没有指定要导出的片段"}), 400
+    if mode not in _TRIM_MODE_LABELS:
+        return jsonify({"error": f"不支持的裁切模式: {mode}"}), 400
 
     try:
         base_name = os.path.splitext(os.path.basename(file_path))[0]
@@ -3177,9 +3315,8 @@ def scene_split():
         scene_output_dir = os.path.join(out_dir, f"{base_name}_scenes")
         os.makedirs(scene_output_dir, exist_ok=True)
 
-        exported = []
-        total = len(segments)
-
+        items = []
+        metas = []
         for i, seg in enumerate(segments):
             start = float(seg.get('start', 0))
             end = float(seg.get('end', 0))
@@ -3191,22 +3328,8 @@ def scene_split():
             idx = seg.get('index', i + 1)
             output_filename = f"{base_name}_scene{idx:03d}{ext}"
             output_path = os.path.join(scene_output_dir, output_filename)
-
-            # 使用 ffmpeg 精确切割（重编码，帧级精度）
-            cmd = [
-                'ffmpeg', '-y',
-                '-i', file_path,
-                '-ss', f'{start:.3f}',
-                '-to', f'{end:.3f}',
-                '-c:v', 'libx264', '-crf', '18', '-preset', 'fast',
-                '-c:a', 'aac', '-b:a', '192k',
-                '-avoid_negative_ts', 'make_zero',
-                output_path
-            ]
-
-            print(f"[场景拆分-精确] ({i+1}/{total}) {output_filename} [{_format_scene_time(start)} -> {_format_scene_time(end)}]")
-            subprocess.run(cmd, check=True, capture_output=True, timeout=300)
-            exported.append({
+            items.append((start, end, output_path))
+            metas.append({
                 "path": output_path,
                 "filename": output_filename,
                 "index": idx,
@@ -3215,12 +3338,48 @@ def scene_split():
                 "duration": round(seg_duration, 3)
             })
 
+        total = len(items)
+        use_segment = (split_mode == 'segment' and mode == 'precise'
+                       and smart_cut.plan_segment_split([(s, e) for s, e, _ in items]) is not None)
+        if split_mode == 'segment' and not use_segment:
+            print("[场景拆分] segment 模式仅支持精确模式且片段互不重叠，改为并行导出")
+
+        if use_segment:
+            print(f"[场景拆分-分段] 一次解码导出 {total} 个片段")
+            check_cancelled()
+            report_progress(0, total, "场景拆分（一次解码）")
+            smart_cut.segment_split(file_path, items)
+            statuses = [{"status": "ok"} for _ in items]
+        else:
+            print(f"[场景拆分-{_TRIM_MODE_LABELS[mode]}] 共 {total} 个片段，"
+                  f"并行进程数={min(workers or smart_cut.default_workers(), max(total, 1))}")
+            statuses = smart_cut.cut_many(
+                file_path, items, mode=mode, workers=workers,
+                progress_callback=lambda done, count: report_progress(done, count, "场景拆分"),
+                cancel_check=check_cancelled
+            )
+
+        exported = []
+        failed = []
+        for meta, status in zip(metas, statuses):
+            if status["status"] == "ok":
+                exported.append(meta)
+                print(f"[场景拆分] {meta['filename']} [{_format_scene_time(meta['start'])} -> {_format_scene_time(meta['end'])}]")
+            else:
+                failed.append({"index": meta["index"], "filename": meta["filename"],
+                               "status": status["status"], "error": status.get("error")})
+        if failed and not exported:
+            return jsonify({"error": f"场景拆分失败: {failed[0].get('error') or failed[0]['status']}"}), 500
+
         return jsonify({
             "message": f"成功导出 {len(exported)} 个片段到 {scene_output_dir}",
             "output_dir": scene_output_dir,
-            "files": exported
+            "files": exported,
+            "failed": failed
         })
 
+    except JobCancelled:
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -3228,6 +3387,7 @@ def scene_split():
 
 
 @app.route('/api/media/scene-detect-frames', methods=['POST', 'OPTIONS'])
+@_async_job('media.scene_detect_frames')
 def scene_detect_frames():
     """场景检测 + 导出场景帧：检测场景后在每个场景内平均截取指定数量的帧"""
     if request.method == 'OPTIONS':
@@ -3241,6 +3401,8 @@ def scene_detect_frames():
     output_dir = data.get('output_dir', '')
     image_format = data.get('format', 'jpg')  # jpg 或 png
     quality = int(data.get('quality', 2))      # FFmpeg -q:v
+    extract_mode = data.get('extract_mode', 'batch')  # batch: 一次解码批量截帧; per_frame: 逐帧 seek 截取
+    workers = int(data.get('workers', 0)) or None     # batch 模式并行的 ffmpeg 进程数
 
     file_path = _validate_file_path(file_path)
     if not file_path or not os.path.exists(file_path):
@@ -3262,33 +3424,16 @@ def scene_detect_frames():
         # --- 2) 场景检测 ---
         print(f"[场景帧] 开始场景检测: {file_path}, 阈值={threshold}, 最小间隔={min_interval}s, 每场景={frames_per_scene}帧")
 
-        cmd = [
-            'ffmpeg', '-hide_banner',
-            '-i', file_path,
-            '-vf', f"select='gt(scene,{threshold})',showinfo",
-            '-f', 'null', '-'
-        ]
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=600)
-
-        stderr_output = result.stderr or ''
-        if result.returncode != 0 and not stderr_output.strip():
-            return jsonify({"error": f"FFmpeg 场景检测失败 (returncode={result.returncode})"}), 500
+        scene_scores = _import_scene_scores()
+        times, scores, cached = scene_scores.get_scores(
+            file_path, cancel_check=check_cancelled,
+            progress_callback=lambda t: report_progress(round(t, 1), round(duration, 1), "场景检测")
+        )
+        if cached:
+            print(f"[场景帧] 使用缓存的场景分数 ({len(times)} 帧)")
 
         scene_boundaries = [0.0]  # 第一个场景永远从 0 秒开始
-        last_time = -min_interval
-
-        import re as _re
-        for line in stderr_output.splitlines():
-            if 'showinfo' in line and 'pts_time' in line:
-                pts_match = _re.search(r'pts_time:\s*([0-9.]+)', line)
-                if pts_match:
-                    pts_time = float(pts_match.group(1))
-                    if pts_time < 0.3:
-                        continue
-                    if pts_time - last_time < min_interval:
-                        continue
-                    scene_boundaries.append(pts_time)
-                    last_time = pts_time
+        scene_boundaries.extend(scene_scores.detect_scene_points(times, scores, threshold, min_interval))
         scene_boundaries.append(duration)  # 末尾
 
         num_scenes = len(scene_boundaries) - 1
@@ -3321,58 +3466,61 @@ def scene_detect_frames():
         output_dir = os.path.realpath(output_dir)
         os.makedirs(output_dir, exist_ok=True)
 
-        # --- 5) 逐帧导出 ---
+        # --- 5) 导出 ---
         out_ext = 'png' if image_format == 'png' else 'jpg'
         total = len(extract_points)
-        success = 0
-        failed = 0
-        results = []
-
-        for idx, (scene_idx, frame_idx, t) in enumerate(extract_points):
+        output_names = []
+        for scene_idx, frame_idx, t in extract_points:
             time_label = _format_scene_time(t).replace(':', '.')
             if frames_per_scene == 1:
-                output_filename = f"{base_name}_scene{scene_idx:03d}_{time_label}.{out_ext}"
+                output_names.append(f"{base_name}_scene{scene_idx:03d}_{time_label}.{out_ext}")
             else:
-                output_filename = f"{base_name}_scene{scene_idx:03d}_f{frame_idx}_{time_label}.{out_ext}"
-            output_path = os.path.join(output_dir, output_filename)
-
-            try:
-                cmd = [
-                    'ffmpeg', '-y',
-                    '-ss', f'{t:.3f}',
-                    '-i', file_path,
-                    '-frames:v', '1'
-                ]
-                if out_ext == 'jpg':
-                    cmd.extend(['-q:v', str(quality)])
-                cmd.append(output_path)
+                output_names.append(f"{base_name}_scene{scene_idx:03d}_f{frame_idx}_{time_label}.{out_ext}")
+        output_paths = [os.path.join(output_dir, name) for name in output_names]
+
+        if extract_mode == 'per_frame':
+            statuses = []
+            for idx, (scene_idx, frame_idx, t) in enumerate(extract_points):
+                check_cancelled()
+                report_progress(idx, total, f"场景 {scene_idx} 帧 {frame_idx}")
+                try:
+                    scene_frames.extract_frame(file_path, t, output_paths[idx], quality)
+                    statuses.append({"status": "ok"})
+                except subprocess.TimeoutExpired:
+                    statuses.append({"status": "timeout"})
+                except subprocess.CalledProcessError as e:
+                    statuses.append({
+                        "status": "error",
+                        "error": e.stderr.decode('utf-8', errors='replace')[:200] if e.stderr else str(e)
+                    })
+                if (idx + 1) % 50 == 0 or (idx + 1) == total:
+                    print(f"[场景帧] 进度: {idx+1}/{total}")
+        else:
+            # 一次解码按时间点列表截帧，长视频按时间段拆分给多个 ffmpeg 进程并行
+            statuses = scene_frames.extract_frames(
+                file_path, [t for _, _, t in extract_points], output_paths,
+                quality=quality, workers=workers,
+                progress_callback=lambda done, count: report_progress(done, count, "截取场景帧"),
+                cancel_check=check_cancelled
+            )
 
-                subprocess.run(cmd, check=True, capture_output=True, timeout=30)
+        success = 0
+        failed = 0
+        results = []
+        for idx, ((scene_idx, frame_idx, t), status) in enumerate(zip(extract_points, statuses)):
+            item = {"scene": scene_idx, "frame": frame_idx, "index": idx + 1, "time": round(t, 3)}
+            if status["status"] == "ok":
                 success += 1
-                results.append({
-                    "scene": scene_idx,
-                    "frame": frame_idx,
-                    "index": idx + 1,
-                    "time": round(t, 3),
+                item.update({
                     "time_str": _format_scene_time(t),
-                    "output": output_path,
-                    "filename": output_filename,
+                    "output": output_paths[idx],
+                    "filename": output_names[idx],
                     "status": "ok"
                 })
-            except subprocess.TimeoutExpired:
-                failed += 1
-                results.append({"scene": scene_idx, "frame": frame_idx, "index": idx + 1, "time": round(t, 3), "status": "timeout"})
-            except subprocess.CalledProcessError as e:
+            else:
                 failed += 1
-                results.append({
-                    "scene": scene_idx, "frame": frame_idx, "index": idx + 1,
-                    "time": round(t, 3),
-                    "status": "error",
-                    "error": e.stderr.decode('utf-8', errors='replace')[:200] if e.stderr else str(e)
-                })
-
-            if (idx + 1) % 50 == 0 or (idx + 1) == total:
-                print(f"[场景帧] 进度: {idx+1}/{total}, 成功={success}, 失败={failed}")
+                item.update(status)
+            results.append(item)
 
         print(f"[场景帧] 完成! 成功={success}, 失败={failed}, 总计={total}")
 
@@ -3408,7 +3556,9 @@ def scene_detect_frames():
         })
 
     except subprocess.TimeoutExpired:
-        return jsonify({"error": "场景检测超时（超过 10 分钟）"}), 500
+        return jsonify({"error": "场景检测超时"}), 500
+    except JobCancelled:
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -3734,6 +3884,7 @@ def download_video_batch():
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/media/batch-thumbnail', methods=['POST', 'OPTIONS'])
+@_async_job('media.batch_thumbnail')
 def batch_thumbnail():
     """批量提取视频首帧截图"""
     if request.method == 'OPTIONS':
@@ -3744,35 +3895,22 @@ def batch_thumbnail():
     output_dir = data.get('output_dir', '')
     image_format = data.get('format', 'jpg')  # jpg 或 png
     quality = int(data.get('quality', 2))  # FFmpeg -q:v, 2=高质量, 5=中等, 10=低
+    workers = int(data.get('workers', 0)) or None  # 并行 ffmpeg 进程数，默认按 CPU 数
     # 支持直接传入文件列表（从前端上传的场景）
     file_list = data.get('files', [])
 
     if not folder_path and not file_list:
         return jsonify({"error": "请指定视频文件夹路径或提供文件列表"}), 400
 
-    VIDEO_EXTS = {'.mp4', '.mov', '.mkv', '.avi', '.wmv', '.flv', '.webm', '.m4v',
-                  '.mpg', '.mpeg', '.3gp', '.ts', '.mts', '.m2ts', '.vob'}
-
     try:
-        # 收集视频文件列表
-        video_files = []
-
+        # 收集视频文件列表（附带大小/mtime，用于清单比对）
         if folder_path:
             if not os.path.isdir(folder_path):
                 return jsonify({"error": f"文件夹不存在: {folder_path}"}), 400
-
-            for root, dirs, files in os.walk(folder_path):
-                for fname in sorted(files):
-                    ext = os.path.splitext(fname)[1].lower()
-                    if ext in VIDEO_EXTS:
-                        video_files.append(os.path.join(root, fname))
+            video_files = thumbnail_batch.scan_videos(folder_path)
         else:
             # 使用前端传入的文件列表
-            for fp in file_list:
-                if os.path.isfile(fp):
-                    ext = os.path.splitext(fp)[1].lower()
-                    if ext in VIDEO_EXTS:
-                        video_files.append(fp)
+            video_files = thumbnail_batch.stat_videos(file_list)
 
         if not video_files:
             return jsonify({"error": "未找到任何视频文件"}), 400
@@ -3782,49 +3920,19 @@ def batch_thumbnail():
             if folder_path:
                 output_dir = os.path.join(folder_path, '_thumbnails')
             else:
-                output_dir = os.path.join(os.path.dirname(video_files[0]), '_thumbnails')
+                output_dir = os.path.join(os.path.dirname(video_files[0][0]), '_thumbnails')
         os.makedirs(output_dir, exist_ok=True)
 
-        total = len(video_files)
-        success = 0
-        failed = 0
-        results = []
-
-        print(f"[批量截图] 开始处理 {total} 个视频，输出到: {output_dir}")
+        print(f"[批量截图] 开始处理 {len(video_files)} 个视频，输出到: {output_dir}")
 
-        for i, video_path in enumerate(video_files):
-            base_name = os.path.splitext(os.path.basename(video_path))[0]
-            out_ext = 'png' if image_format == 'png' else 'jpg'
-            output_path = os.path.join(output_dir, f"{base_name}.{out_ext}")
+        # 清单记录每个源文件的状态与 mtime：未变化且已完成的跳过，源文件变化的重做
+        batch = thumbnail_batch.ThumbnailBatch(video_files, output_dir, image_format=image_format,
+                                               quality=quality, workers=workers)
+        results = batch.run(progress_callback=report_progress, cancel_check=check_cancelled)
 
-            # 避免覆盖已生成的截图（加速重跑）
-            if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
-                success += 1
-                results.append({"file": os.path.basename(video_path), "output": output_path, "status": "skipped"})
-                if (i + 1) % 100 == 0:
-                    print(f"[批量截图] 进度: {i+1}/{total} (跳过已存在)")
-                continue
-
-            try:
-                cmd = ['ffmpeg', '-y', '-ss', '0', '-i', video_path, '-frames:v', '1']
-                if out_ext == 'jpg':
-                    cmd.extend(['-q:v', str(quality)])
-                cmd.append(output_path)
-
-                subprocess.run(cmd, check=True, capture_output=True, timeout=30)
-                success += 1
-                results.append({"file": os.path.basename(video_path), "output": output_path, "status": "ok"})
-            except subprocess.TimeoutExpired:
-                failed += 1
-                results.append({"file": os.path.basename(video_path), "status": "timeout"})
-            except subprocess.CalledProcessError as e:
-                failed += 1
-                results.append({"file": os.path.basename(video_path), "status": "error",
-                                "error": e.stderr.decode('utf-8', errors='replace')[:200] if e.stderr else str(e)})
-
-            # 每 100 个输出一次进度
-            if (i + 1) % 100 == 0 or (i + 1) == total:
-                print(f"[批量截图] 进度: {i+1}/{total}, 成功={success}, 失败={failed}")
+        total = batch.total
+        success = sum(1 for r in results if r["status"] in ("ok", "skipped"))
+        failed = total - success
 
         print(f"[批量截图] 完成! 成功={success}, 失败={failed}, 总计={total}")
 
@@ -3837,6 +3945,8 @@ def batch_thumbnail():
             "results": results[:200]  # 避免返回太大的数据，最多返回前 200 条
         })
 
+    except JobCancelled:
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -3856,96 +3966,81 @@ def batch_thumbnail_progress():
     if not folder_path:
         return jsonify({"error": "请指定视频文件夹"}), 400
 
-    VIDEO_EXTS = {'.mp4', '.mov', '.mkv', '.avi', '.wmv', '.flv', '.webm', '.m4v',
-                  '.mpg', '.mpeg', '.3gp', '.ts', '.mts', '.m2ts', '.vob'}
-
     if not output_dir:
         output_dir = os.path.join(folder_path, '_thumbnails')
 
-    total_videos = 0
-    done_thumbnails = 0
-
-    if os.path.isdir(folder_path):
-        for root, dirs, files in os.walk(folder_path):
-            for fname in files:
-                ext = os.path.splitext(fname)[1].lower()
-                if ext in VIDEO_EXTS:
-                    total_videos += 1
-
-    if os.path.isdir(output_dir):
-        for fname in os.listdir(output_dir):
-            if fname.lower().endswith(('.jpg', '.png')) and os.path.getsize(os.path.join(output_dir, fname)) > 0:
-                done_thumbnails += 1
-
-    return jsonify({
-        "total": total_videos,
-        "done": done_thumbnails,
-        "percent": round(done_thumbnails / total_videos * 100, 1) if total_videos > 0 else 0
-    })
+    # 优先读取运行中批次的内存状态，其次读取输出目录中的清单
+    progress = thumbnail_batch.get_progress(output_dir)
+    if progress is None:
+        # 没有清单（尚未开始或旧版本生成的目录）：退回统计目录
+        total_videos = len(thumbnail_batch.scan_videos(folder_path)) if os.path.isdir(folder_path) else 0
+        done_thumbnails = 0
+        if os.path.isdir(output_dir):
+            with os.scandir(output_dir) as it:
+                for entry in it:
+                    if entry.name.lower().endswith(('.jpg', '.png')) and entry.stat().st_size > 0:
+                        done_thumbnails += 1
+        progress = {"total": total_videos, "done": done_thumbnails}
+
+    total_videos = progress.get("total", 0)
+    done_thumbnails = progress.get("done", 0)
+    return jsonify(dict(
+        progress,
+        percent=round(done_thumbnails / total_videos * 100, 1) if total_videos > 0 else 0
+    ))
 
 
 # ==================== 感知哈希画面分类 ====================
 
 def _compute_dhash(image_path, hash_size=8):
     """计算差异哈希 (dHash)，纯 Pillow 实现，无需额外依赖"""
-    from PIL import Image
-    img = Image.open(image_path).convert('L').resize((hash_size + 1, hash_size), Image.LANCZOS)
-    pixels = list(img.getdata())
-    width = hash_size + 1
-
-    hash_val = 0
-    for row in range(hash_size):
-        for col in range(hash_size):
-            idx = row * width + col
-            if pixels[idx] < pixels[idx + 1]:
-                hash_val |= 1 << (row * hash_size + col)
-    return hash_val
+    return perceptual_hash.image_dhash(image_path, hash_size)
 
 
 def _hamming_distance(h1, h2):
     """计算两个哈希值的汉明距离"""
-    return bin(h1 ^ h2).count('1')
+    return hash_index.hamming_distance(h1, h2)
+
+
+def _import_hamming():
+    """汉明距离引擎依赖 numpy，按需导入；numpy 不可用时返回 None"""
+    try:
+        try:
+            from core import hamming
+        except ImportError:
+            from pyMediaTools.core import hamming
+    except ImportError:
+        return None
+    return hamming
 
 
 def _cluster_by_hash(hashes, threshold):
-    """基于 Union-Find 的哈希聚类"""
-    n = len(hashes)
-    parent = list(range(n))
-    rank = [0] * n
-
-    def find(x):
-        while parent[x] != x:
-            parent[x] = parent[parent[x]]
-            x = parent[x]
-        return x
-
-    def union(a, b):
-        ra, rb = find(a), find(b)
-        if ra != rb:
-            if rank[ra] < rank[rb]:
-                ra, rb = rb, ra
-            parent[rb] = ra
-            if rank[ra] == rank[rb]:
-                rank[ra] += 1
-
-    # O(n^2) 两两比较 —— 5000 张约 1250 万次比较，纯整数位操作，很快
-    for i in range(n):
-        for j in range(i + 1, n):
-            if _hamming_distance(hashes[i], hashes[j]) <= threshold:
-                union(i, j)
-
-    # 收集聚类结果
-    clusters = {}
-    for i in range(n):
-        root = find(i)
-        clusters.setdefault(root, []).append(i)
-
-    return list(clusters.values())
+    """
+    哈希聚类：优先用 NumPy 引擎（uint64 数组 + 向量化 XOR/popcount），
+    没有 numpy 时退回纯 Python 的多索引哈希 + Union-Find；两者结果完全一致。
+    """
+    hamming = _import_hamming()
+    if hamming is not None:
+        return hamming.cluster_hashes(hashes, threshold)
+    print("[画面分类] 未安装 numpy，使用纯 Python 哈希聚类（大阈值时较慢）")
+    return hash_index.cluster_hashes(hashes, threshold)
+
+
+def _cluster_by_fingerprint(fingerprints, threshold):
+    """
+    多帧指纹聚类：逐帧距离的中位数 <= threshold 即相连（NumPy 引擎）。
+    没有 numpy 时每个指纹取中间一帧的哈希，退回单哈希聚类。
+    """
+    hamming = _import_hamming()
+    if hamming is not None:
+        return hamming.cluster_fingerprints(fingerprints, threshold)
+    return hash_index.cluster_hashes([fp[len(fp) // 2] for fp in fingerprints], threshold)
 
 
 @app.route('/api/media/image-classify', methods=['POST', 'OPTIONS'])
+@_async_job('media.image_classify')
 def image_classify():
-    """基于感知哈希 (dHash) 的图片/视频画面分类"""
+    """基于感知哈希（默认 dHash，可选 aHash / pHash）的图片/视频画面分类"""
     if request.method == 'OPTIONS':
         return '', 204
 
@@ -3953,11 +4048,27 @@ def image_classify():
     folder_path = data.get('folder_path', '')
     output_dir = data.get('output_dir', '')
     threshold = int(data.get('threshold', 10))  # 汉明距离阈值，越小越严格
-    action = data.get('action', 'copy')  # copy 或 move
+    # copy / move / hardlink / reflink / symlink / manifest（只写分组清单，不动文件）
+    action = data.get('action', 'copy')
     min_group_size = int(data.get('min_group_size', 1))  # 最小分组数量
+    hash_type = data.get('hash_type', 'dhash')  # dhash / ahash / phash
+    use_cache = data.get('use_cache', True)  # 复用上次计算的哈希，只处理新增或修改过的文件
+    # 视频均匀采样的帧数（一次只解关键帧），按逐帧距离的中位数比较；默认 1 只用首帧，
+    # 多帧指纹需显式传入（如 perceptual_hash.VIDEO_FRAMES），且依赖 numpy
+    video_frames = max(1, min(32, int(data.get('video_frames', 1))))
+    if video_frames > 1 and _import_hamming() is None:
+        print("[画面分类] 未安装 numpy，无法比较多帧指纹，视频只取首帧")
+        video_frames = 1
 
     if not folder_path or not os.path.isdir(folder_path):
         return jsonify({"error": "文件夹不存在"}), 400
+    if action not in file_output.ACTIONS:
+        return jsonify({"error": f"不支持的输出方式: {action}"}), 400
+    if hash_type not in perceptual_hash.HASH_ALGORITHMS:
+        return jsonify({"error": f"不支持的哈希类型: {hash_type}"}), 400
+    if hash_type == 'phash' and perceptual_hash.np is None:
+        return jsonify({"error": "pHash 需要安装 numpy"}), 400
+    folder_path = os.path.abspath(folder_path)
 
     IMAGE_EXTS = {'.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.tif', '.webp', '.gif'}
     VIDEO_EXTS = {'.mp4', '.mov', '.mkv', '.avi', '.wmv', '.flv', '.webm', '.m4v',
@@ -3988,57 +4099,67 @@ def image_classify():
             return jsonify({"error": "未找到任何图片或视频文件"}), 400
 
         total = len(all_files)
-        print(f"[画面分类] 扫描到 {total} 个文件，阈值={threshold}")
+        print(f"[画面分类] 扫描到 {total} 个文件，阈值={threshold}，哈希={hash_type}，视频采样={video_frames} 帧")
 
-        # 2. 计算哈希
+        # 2. 计算哈希（视频首帧经管道解码，图片在进程池中并行计算，不落临时文件；
+        #    启用缓存时未变化的文件直接读取上次的结果）
         hashes = []
         hash_errors = []
-        temp_frames = []  # 临时提取的视频帧，用完后清理
+        hash_cached = 0
 
-        for i, finfo in enumerate(all_files):
-            try:
-                if finfo['is_video']:
-                    # 视频：用 FFmpeg 提取首帧到临时文件
-                    fd, temp_path = tempfile.mkstemp(suffix='.jpg')
-                    os.close(fd)
-                    temp_frames.append(temp_path)
-
-                    cmd = ['ffmpeg', '-y', '-ss', '0', '-i', finfo['path'],
-                           '-frames:v', '1', '-q:v', '2', temp_path]
-                    subprocess.run(cmd, check=True, capture_output=True, timeout=30)
+        last_print = [0]
 
-                    h = _compute_dhash(temp_path)
-                else:
-                    # 图片：直接计算
-                    h = _compute_dhash(finfo['path'])
-
-                hashes.append(h)
+        def _on_hash_progress(done, _total):
+            report_progress(done, total, f"计算哈希: {done}/{total}")
+            if done - last_print[0] >= 200:
+                last_print[0] = done
+                print(f"[画面分类] 哈希计算进度: {done}/{total}")
 
+        hash_inputs = [(finfo['path'], finfo['is_video']) for finfo in all_files]
+        store = None
+        if use_cache:
+            try:
+                store = hash_store.get_store()
+            except Exception as e:
+                print(f"[画面分类] 哈希缓存不可用，全部重新计算: {e}")
+        if store is not None:
+            results, hash_cached = hash_store.hash_files(
+                hash_inputs, (hash_type,), store=store, video_frames=video_frames,
+                progress_callback=_on_hash_progress, cancel_check=check_cancelled)
+            try:
+                store.forget_missing(folder_path, {finfo['path'] for finfo in all_files})
             except Exception as e:
+                print(f"[画面分类] 清理哈希缓存失败: {e}")
+        else:
+            results = perceptual_hash.hash_files(
+                hash_inputs, (hash_type,), video_frames=video_frames,
+                progress_callback=_on_hash_progress, cancel_check=check_cancelled)
+        for finfo, (value, error) in zip(all_files, results):
+            h = value[hash_type] if value else None
+            if h is None:
                 # 哈希失败的文件用 -1 标记，后续单独归组
                 hashes.append(-1)
                 hash_errors.append(finfo['name'])
                 if len(hash_errors) <= 10:
-                    print(f"[画面分类] 哈希失败: {finfo['name']} - {str(e)[:100]}")
-
-            if (i + 1) % 200 == 0:
-                print(f"[画面分类] 哈希计算进度: {i+1}/{total}")
-
-        # 清理临时文件
-        for tmp in temp_frames:
-            try:
-                os.remove(tmp)
-            except:
-                pass
+                    print(f"[画面分类] 哈希失败: {finfo['name']} - {str(error)[:100]}")
+            else:
+                hashes.append(h)
 
-        print(f"[画面分类] 哈希计算完成，失败={len(hash_errors)}")
+        print(f"[画面分类] 哈希计算完成，缓存命中={hash_cached}，失败={len(hash_errors)}")
 
         # 3. 聚类（排除哈希失败的文件）
         valid_indices = [i for i, h in enumerate(hashes) if h != -1]
         valid_hashes = [hashes[i] for i in valid_indices]
 
         print(f"[画面分类] 开始聚类 {len(valid_hashes)} 个有效哈希...")
-        clusters_raw = _cluster_by_hash(valid_hashes, threshold)
+        if any(isinstance(h, tuple) for h in valid_hashes):
+            # 有视频指纹：图片的哈希重复为等长指纹，单帧退化的视频同样处理
+            fingerprints = [h if isinstance(h, tuple) and len(h) == video_frames
+                            else (h[0] if isinstance(h, tuple) else h,) * video_frames
+                            for h in valid_hashes]
+            clusters_raw = _cluster_by_fingerprint(fingerprints, threshold)
+        else:
+            clusters_raw = _cluster_by_hash(valid_hashes, threshold)
 
         # 映射回原始索引
         clusters = []
@@ -4063,6 +4184,9 @@ def image_classify():
 
         group_results = []
         files_moved = 0
+        moved_pairs = []  # 移动后的新路径同步到哈希缓存，对输出目录再分类时仍可命中
+        methods_used = {}  # 实际使用的输出方式计数（硬链接 / reflink 不可用时会退回复制）
+        manifest_groups = []
 
         for gidx, cluster in enumerate(clusters):
             group_size = len(cluster)
@@ -4074,32 +4198,40 @@ def image_classify():
             else:
                 group_dir = os.path.join(output_dir, f"group_{gidx+1:04d}_{group_size}张")
 
-            os.makedirs(group_dir, exist_ok=True)
+            if action == 'manifest':
+                manifest_groups.append({
+                    "group": gidx + 1,
+                    "folder": os.path.basename(group_dir),
+                    "files": [all_files[idx]['path'] for idx in cluster]
+                })
+                group_files = [all_files[idx]['name'] for idx in cluster]
+            else:
+                os.makedirs(group_dir, exist_ok=True)
+                group_files = []
 
-            group_files = []
-            for idx in cluster:
-                src = all_files[idx]['path']
-                dst = os.path.join(group_dir, all_files[idx]['name'])
+                for idx in cluster:
+                    src = all_files[idx]['path']
+                    dst = os.path.join(group_dir, all_files[idx]['name'])
 
-                # 避免源和目标相同
-                if os.path.abspath(src) == os.path.abspath(dst):
-                    continue
+                    # 避免源和目标相同
+                    if os.path.abspath(src) == os.path.abspath(dst):
+                        continue
 
-                # 处理同名文件
-                if os.path.exists(dst):
-                    base, ext = os.path.splitext(all_files[idx]['name'])
-                    dst = os.path.join(group_dir, f"{base}_{idx}{ext}")
+                    # 处理同名文件（lexists：已有的符号链接也算）
+                    if os.path.lexists(dst):
+                        base, ext = os.path.splitext(all_files[idx]['name'])
+                        dst = os.path.join(group_dir, f"{base}_{idx}{ext}")
 
-                try:
-                    if action == 'move':
-                        shutil.move(src, dst)
-                    else:
-                        shutil.copy2(src, dst)
-                    files_moved += 1
-                except Exception as e:
-                    print(f"[画面分类] {action}失败: {all_files[idx]['name']} - {e}")
+                    try:
+                        method = file_output.place_file(src, dst, action)
+                        methods_used[method] = methods_used.get(method, 0) + 1
+                        if method == 'move':
+                            moved_pairs.append((src, os.path.abspath(dst)))
+                        files_moved += 1
+                    except Exception as e:
+                        print(f"[画面分类] {action}失败: {all_files[idx]['name']} - {e}")
 
-                group_files.append(all_files[idx]['name'])
+                    group_files.append(all_files[idx]['name'])
 
             if group_size >= min_group_size:
                 group_results.append({
@@ -4109,6 +4241,18 @@ def image_classify():
                     "sample_files": group_files[:5]  # 前 5 个作为样本
                 })
 
+        manifest_paths = None
+        if action == 'manifest':
+            manifest_paths = file_output.write_manifest(output_dir, manifest_groups)
+        elif methods_used.get('copy') and action in ('hardlink', 'reflink'):
+            print(f"[画面分类] {methods_used['copy']} 个文件无法{action}，已改为复制")
+
+        if store is not None and moved_pairs:
+            try:
+                store.move(moved_pairs)
+            except Exception as e:
+                print(f"[画面分类] 同步哈希缓存路径失败: {e}")
+
         # 统计
         large_groups = [g for g in group_results if g['count'] >= 2]
         single_count = sum(1 for c in clusters if len(c) == 1)
@@ -4122,14 +4266,23 @@ def image_classify():
             "single_files": single_count,
             "files_processed": files_moved,
             "hash_errors": len(hash_errors),
+            "hash_cached": hash_cached,
+            "hash_type": hash_type,
+            "video_frames": video_frames,
+            "action": action,
+            "output_methods": methods_used,
             "threshold": threshold,
             "groups": group_results[:100]  # 最多返回前 100 组
         }
+        if manifest_paths:
+            summary["manifest_json"], summary["manifest_csv"] = manifest_paths
 
         print(f"[画面分类] 完成! {total} 文件 → {len(group_results)} 组 ({len(large_groups)} 个多文件组, {single_count} 个独立文件)")
 
         return jsonify(summary)
 
+    except JobCancelled:
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -4137,6 +4290,10 @@ def image_classify():
 
 
 if __name__ == '__main__':
+    multiprocessing.freeze_support()  # 打包后进程池子进程需要
+    _media_jobs.restore()
+    _subtitle_jobs.restore()
+    hw_encoders.detect_in_background()
     port = 5001
     try:
         from waitress import serve
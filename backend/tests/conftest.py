@@ -0,0 +1,7 @@
+import os
+import sys
+
+# 测试以 backend 目录为根导入 core 包，与 server.py 相同
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
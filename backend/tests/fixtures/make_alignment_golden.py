@@ -0,0 +1,155 @@
+"""
+生成字幕对齐的黄金输出 alignment_golden.json。
+
+期望输出必须由重写前的对齐实现产生（基线提交中的 core/subtitle_alignment.py）：
+
+    git show 25976af:backend/core/subtitle_alignment.py > /tmp/base_align.py
+    python tests/fixtures/make_alignment_golden.py /tmp/base_align.py
+
+输入为固定种子合成的转录/原文/译文，覆盖转录丢词、多词、错词、缺时间戳、开头缺失等情况，
+以及 source / translate / merge 三类 SRT 输出与返回值。
+"""
+import os
+import sys
+import copy
+import json
+import random
+import tempfile
+import importlib.util
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+VOCAB_SEED = 2024
+CASE_COUNT = 24
+
+
+def _load_baseline(path):
+    import core  # noqa: F401  基线模块使用相对导入，需挂在 core 包下
+    spec = importlib.util.spec_from_file_location('core._baseline_alignment', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _make_case(rng, vocab, index):
+    paragraphs = []
+    for _ in range(rng.randint(2, 7)):
+        words = [rng.choice(vocab) for _ in range(rng.randint(2, 9))]
+        if rng.random() < 0.4:
+            words[0] = words[0].capitalize()
+        line = ' '.join(words) + rng.choice(['', '.', ',', '!', '?'])
+        if rng.random() < 0.25:
+            line += '##'
+        paragraphs.append(line)
+
+    source_words = ' '.join(p.replace('##', '') for p in paragraphs).lower().split()
+    source_words = [w.strip('.,!?') for w in source_words]
+    generated = []
+    drop_head = index % 5 == 0
+    for i, word in enumerate(source_words):
+        if drop_head and i < 2:
+            continue
+        r = rng.random()
+        if r < 0.06:
+            continue
+        generated.append(rng.choice(vocab) if r < 0.12 else word)
+        if r > 0.94:
+            generated.append(rng.choice(vocab))
+    if not generated:
+        generated = [rng.choice(vocab)]
+
+    utterances = []
+    t = round(rng.uniform(0.0, 1.5), 3)
+    for start in range(0, len(generated), rng.randint(3, 8)):
+        chunk = generated[start:start + rng.randint(3, 8)] or generated[start:start + 1]
+        words = []
+        for word in chunk:
+            length = round(0.08 * len(word) + rng.uniform(0.05, 0.4), 3)
+            info = {"word": word, "start": t, "end": round(t + length, 3), "score": round(rng.random(), 3)}
+            if rng.random() < 0.05:
+                info = {"word": word}
+            words.append(info)
+            t = round(t + length + rng.choice([0.0, 0.05, 0.2, 0.6]), 3)
+        utterances.append({
+            "audio_start": words[0].get("start", t), "audio_end": t,
+            "text": ' '.join(w["word"] for w in words), "words": words
+        })
+    # 分段时可能漏掉尾部的词：以 utterances 中实际出现的词为准
+    generation_words = [w["word"] for u in utterances for w in u["words"]]
+
+    translations = {}
+    for n in range(index % 3):
+        translations[f"trans{n + 1}.txt"] = [f"T{n + 1}-{i + 1} " + ' '.join(rng.choice(vocab) for _ in range(3))
+                                            for i in range(len(paragraphs))]
+    return {
+        "name": f"case{index:02d}",
+        "language": rng.choice(["en", "es", "fr"]),
+        "generation_subtitle_array": utterances,
+        "generation_subtitle_text": ' '.join(generation_words),
+        "source_lines": paragraphs,
+        "translations": translations,
+        "gen_merge_srt": index % 2 == 1,
+        "source_up_order": index % 4 == 3,
+    }
+
+
+def run_case(alignment, case, **kwargs):
+    """按 case 输入运行对齐函数，返回 (返回值, {输出文件名: 内容})"""
+    from core.subtitle_utils import read_text_with_google_doc
+    with tempfile.TemporaryDirectory() as tmp:
+        source_path = os.path.join(tmp, 'source.txt')
+        with open(source_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(case["source_lines"]))
+        translate_text_dict = {}
+        for key, lines in case["translations"].items():
+            path = os.path.join(tmp, key)
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write('\n'.join(lines))
+            translate_text_dict[key] = {
+                "filename": key, "filepath": path,
+                "translate_text_with_info": read_text_with_google_doc(path), "trans_srt": ""
+            }
+        out_dir = os.path.join(tmp, 'out')
+        os.makedirs(out_dir)
+        result = alignment.audio_subtitle_search_diffent_strong(
+            case["language"], out_dir, case["name"],
+            copy.deepcopy(case["generation_subtitle_array"]), case["generation_subtitle_text"],
+            read_text_with_google_doc(source_path), translate_text_dict,
+            case["gen_merge_srt"], case["source_up_order"], False, False, **kwargs
+        )
+        outputs = {}
+        for name in sorted(os.listdir(out_dir)):
+            with open(os.path.join(out_dir, name), 'r', encoding='utf-8') as f:
+                outputs[name] = f.read()
+    return result, outputs
+
+
+def main(baseline_path):
+    alignment = _load_baseline(baseline_path)
+    rng = random.Random(VOCAB_SEED)
+    vocab = [''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(1, 8))) for _ in range(60)]
+    cases = [_make_case(rng, vocab, index) for index in range(CASE_COUNT)]
+    # 转录文本与带时间戳的词对不上时返回错误信息而不写文件
+    broken = copy.deepcopy(cases[1])
+    broken["name"] = "mismatch"
+    broken["generation_subtitle_text"] += " extra"
+    cases.append(broken)
+    # 转录文本带大小写与多余空白（clean_text 会统一处理）
+    noisy = copy.deepcopy(cases[2])
+    noisy["name"] = "noisy"
+    noisy["generation_subtitle_text"] = "  " + noisy["generation_subtitle_text"].title().replace(' ', '\n ', 1)
+    cases.append(noisy)
+    for case in cases:
+        result, outputs = run_case(alignment, case)
+        case["expected"] = {"result": result, "outputs": outputs}
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'alignment_golden.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(cases, f, ensure_ascii=False, indent=1)
+        f.write('\n')
+    print(f"写入 {len(cases)} 个用例: {path}")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1])
@@ -0,0 +1,182 @@
+"""
+本地 Gladia 桩服务 - 模拟上传 / 异步轮询接口，供 gladia_api 的测试与离线测量使用
+
+- POST /audio/text/audio-transcription/：读取上传内容，返回 result_url；
+  upload_errors 中的 key 返回指定的错误响应（如 limit exceeded）；
+  设置 responses 时按上传内容决定该任务的处理时长与 prediction（模拟各分段乱序完成）
+- GET /results/<id>：处理时间未到时返回 status=processing（可带 Retry-After），之后返回带单词时间戳的 prediction；
+  poll_status 非 200 时直接返回该状态码，fail=True 时返回 status=error
+- 测量：在 backend 目录执行 python tests/gladia_stub.py --delay 3 --benchmark 音频文件
+"""
+import json
+import time
+import uuid
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+UPLOAD_PATH = '/audio/text/audio-transcription/'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'    # 支持长连接，与 requests.Session 的连接复用一致
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, code, body, headers=None):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        stub = self.server.stub
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.path != UPLOAD_PATH:
+            self._send_json(404, {"message": "not found"})
+            return
+        api_key = self.headers.get('x-gladia-key', '')
+        with stub.lock:
+            stub.upload_keys.append(api_key)
+        if api_key in stub.upload_errors:
+            code, body = stub.upload_errors[api_key]
+            self._send_json(code, body)
+            return
+        job_id = uuid.uuid4().hex
+        delay, prediction = stub.responses(body) if stub.responses else (stub.delay, stub.prediction)
+        with stub.lock:
+            stub.jobs[job_id] = (time.monotonic() + delay, api_key, prediction)
+            stub.uploads += 1
+            stub.active[api_key] = stub.active.get(api_key, 0) + 1
+            stub.max_active[api_key] = max(stub.max_active.get(api_key, 0), stub.active[api_key])
+        host, port = self.server.server_address[:2]
+        self._send_json(200, {"result_url": f"http://{host}:{port}/results/{job_id}"})
+
+    def do_GET(self):
+        stub = self.server.stub
+        job_id = self.path.rsplit('/', 1)[-1]
+        now = time.monotonic()
+        with stub.lock:
+            job = stub.jobs.get(job_id)
+            stub.polls += 1
+            stub.poll_times.append(now)
+            finished = job is not None and now >= job[0]
+            if finished:
+                # 任务已完成：从在途计数中移除（只计一次）
+                del stub.jobs[job_id]
+                stub.active[job[1]] -= 1
+        if job is None:
+            self._send_json(404, {"message": "not found"})
+        elif stub.poll_status != 200:
+            self._send_json(stub.poll_status, {"message": "server error"})
+        elif not finished:
+            headers = {'Retry-After': str(stub.retry_after)} if stub.retry_after is not None else None
+            self._send_json(200, {"status": "processing"}, headers)
+        elif stub.fail:
+            self._send_json(200, {"status": "error", "message": "transcription failed"})
+        else:
+            self._send_json(200, {"status": "done", "prediction": job[2]})
+
+
+class GladiaStub:
+    """
+    在后台线程运行的桩服务。
+
+    :param delay: 每个上传任务从提交到完成的秒数
+    :param retry_after: 处理中响应附带的 Retry-After 秒数，None 表示不带
+    :param upload_errors: {api_key: (状态码, 响应体)}，这些 key 上传时返回错误
+    :param poll_status: 轮询响应的状态码，非 200 时模拟轮询出错
+    :param fail: 为 True 时任务完成后返回 status=error
+    :param responses: responses(上传请求体) -> (处理秒数, prediction)，None 时所有任务使用 delay 与 prediction
+    """
+
+    def __init__(self, delay=3.0, retry_after=None, upload_errors=None, poll_status=200, fail=False,
+                 responses=None, host='127.0.0.1', port=0):
+        self.delay = delay
+        self.retry_after = retry_after
+        self.upload_errors = upload_errors or {}
+        self.poll_status = poll_status
+        self.fail = fail
+        self.responses = responses
+        self.jobs = {}              # job_id -> (完成时刻, api_key, prediction)
+        self.uploads = 0
+        self.polls = 0
+        self.poll_times = []
+        self.upload_keys = []       # 每次上传使用的 key（含返回错误的）
+        self.active = {}            # api_key -> 已上传但尚未轮询到完成的任务数
+        self.max_active = {}
+        self.lock = threading.Lock()
+        self.prediction = [{
+            "transcription": "hello world",
+            "time_begin": 0.0,
+            "time_end": 1.0,
+            "words": [
+                {"word": " hello", "time_begin": 0.0, "time_end": 0.4, "confidence": 1.0},
+                {"word": " world", "time_begin": 0.5, "time_end": 1.0, "confidence": 1.0},
+            ],
+        }]
+        self.server = ThreadingHTTPServer((host, port), _Handler)
+        self.server.daemon_threads = True
+        self.server.stub = self
+        self._thread = None
+
+    @property
+    def url(self):
+        """上传接口地址，可直接赋给 GLADIA_API_URL"""
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}{UPLOAD_PATH}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name="gladia-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def benchmark(audio_path, delays=(1.0, 3.0, 10.0), retry_after=None):
+    """对每个处理时长测量一次 transcribe_local_audio（上传 + 轮询）的总耗时与轮询次数"""
+    from core import gladia_api
+    for delay in delays:
+        with GladiaStub(delay=delay, retry_after=retry_after) as stub:
+            gladia_api.GLADIA_API_URL = stub.url
+            started = time.monotonic()
+            result = gladia_api.transcribe_local_audio(audio_path, api_key="stub", language_behaviour="manual",
+                                                       language="english", toggle_word_timestamps=True)
+            elapsed = time.monotonic() - started
+            print(f"[Gladia桩] 处理时长={delay:5.1f}s  总耗时={elapsed:6.2f}s  额外等待={elapsed - delay:5.2f}s  "
+                  f"轮询={stub.polls}  {'成功' if result else '失败'}")
+
+
+if __name__ == '__main__':
+    import os
+    import sys
+    import argparse
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    parser = argparse.ArgumentParser(description="本地 Gladia 桩服务")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--delay', type=float, default=3.0, help="每个任务的处理时长（秒）")
+    parser.add_argument('--retry-after', type=float, default=None, help="处理中响应附带的 Retry-After（秒）")
+    parser.add_argument('--benchmark', metavar='AUDIO', help="不启动常驻服务，对该音频测量不同处理时长下的耗时")
+    args = parser.parse_args()
+    if args.benchmark:
+        benchmark(args.benchmark, delays=sorted({1.0, args.delay, 10.0}), retry_after=args.retry_after)
+    else:
+        stub = GladiaStub(delay=args.delay, retry_after=args.retry_after, port=args.port)
+        print(f"[Gladia桩] 监听 {stub.url}，设置 GLADIA_API_URL={stub.url} 后即可离线转录")
+        try:
+            stub.server.serve_forever()
+        except KeyboardInterrupt:
+            stub.server.server_close()
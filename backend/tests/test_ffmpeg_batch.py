@@ -0,0 +1,120 @@
+"""批量 ffmpeg 调度测试：run_ffmpeg 用假实现替换，不需要 ffmpeg"""
+import time
+import threading
+import subprocess
+
+import pytest
+
+from core import ffmpeg_batch
+
+
+class FakeFFmpeg:
+    """按输出文件名决定行为：fail_* 失败，slow_* 等待 stop_event；记录并发数"""
+
+    def __init__(self):
+        self.calls = []
+        self.timeouts = {}
+        self.active = {}
+        self.max_active = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, cmd, duration=None, progress_callback=None, timeout=600, stop_event=None):
+        output, cost = cmd[-1], cmd[1]
+        with self.lock:
+            self.calls.append(output)
+            self.timeouts[output] = timeout
+            self.active[cost] = self.active.get(cost, 0) + 1
+            self.max_active[cost] = max(self.max_active.get(cost, 0), self.active[cost])
+        try:
+            if output.startswith('slow'):
+                if stop_event.wait(5):
+                    raise InterruptedError("ffmpeg 已终止")
+            time.sleep(0.05)
+            if output.startswith('fail'):
+                raise subprocess.CalledProcessError(1, cmd, stderr=b"line 1\nencoder error\n")
+            if progress_callback:
+                progress_callback(1.0)
+        finally:
+            with self.lock:
+                self.active[cost] -= 1
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    fake = FakeFFmpeg()
+    monkeypatch.setattr(ffmpeg_batch, 'run_ffmpeg', fake)
+    return fake
+
+
+def _task(output, cost=ffmpeg_batch.COST_ENCODE, **kwargs):
+    return ffmpeg_batch.ConvertTask(['ffmpeg', cost, output], output, duration=1.0, cost=cost, **kwargs)
+
+
+def _durations(path):
+    return len(path)
+
+
+def test_progress_cmd_inserts_progress_pipe():
+    assert ffmpeg_batch._progress_cmd(['ffmpeg', '-y', '-i', 'a', 'b']) == [
+        'ffmpeg', '-progress', 'pipe:1', '-nostats', '-y', '-i', 'a', 'b']
+
+
+def test_results_keep_task_order(fake):
+    tasks = [_task(f"out{k}.mp4") for k in range(6)] + [_task("m.mp4", extra_outputs=["m2.mp4"])]
+    results = ffmpeg_batch.run_tasks(tasks, workers={ffmpeg_batch.COST_ENCODE: 3}, probe_output=_durations)
+    expected = [f"out{k}.mp4" for k in range(6)] + ["m.mp4", "m2.mp4"]
+    assert results == [(path, len(path)) for path in expected]
+
+
+def test_pools_are_limited_per_cost(fake):
+    tasks = [_task(f"e{k}.mp4") for k in range(6)] + [_task(f"l{k}.wav", ffmpeg_batch.COST_LIGHT) for k in range(6)]
+    ffmpeg_batch.run_tasks(tasks, workers={ffmpeg_batch.COST_ENCODE: 2, ffmpeg_batch.COST_LIGHT: 4},
+                           probe_output=_durations)
+    assert fake.max_active == {ffmpeg_batch.COST_ENCODE: 2, ffmpeg_batch.COST_LIGHT: 4}
+
+
+def test_failed_task_runs_fallback(fake):
+    task = _task("fail.mp4", fallback_cmd=['ffmpeg', ffmpeg_batch.COST_ENCODE, 'fallback.mp4'])
+    results = ffmpeg_batch.run_tasks([task], probe_output=_durations)
+    assert task.fell_back
+    assert fake.calls == ["fail.mp4", "fallback.mp4"]
+    assert results == [("fail.mp4", len("fail.mp4"))]
+
+
+def test_task_timeout_overrides_default(fake):
+    combined = ffmpeg_batch.task_timeout(3, 900.0)
+    tasks = [_task("out.mp4"), _task("combined.mp4", timeout=combined),
+             _task("fail.mp4", fallback_cmd=['ffmpeg', ffmpeg_batch.COST_ENCODE, 'fallback.mp4'], timeout=combined)]
+    ffmpeg_batch.run_tasks(tasks, probe_output=_durations, timeout=30)
+    assert fake.timeouts == {"out.mp4": 30, "combined.mp4": combined, "fail.mp4": combined, "fallback.mp4": combined}
+
+
+def test_task_timeout_scales_with_outputs_and_duration():
+    assert ffmpeg_batch.task_timeout() == ffmpeg_batch.DEFAULT_TIMEOUT
+    assert ffmpeg_batch.task_timeout(4) == 4 * ffmpeg_batch.DEFAULT_TIMEOUT
+    assert ffmpeg_batch.task_timeout(4, 3600.0) == 7200.0
+    assert ffmpeg_batch.task_timeout(0, None) == ffmpeg_batch.DEFAULT_TIMEOUT
+
+
+def test_failure_without_fallback_stops_other_tasks(fake):
+    tasks = [_task("slow.mp4"), _task("fail.mp4")]
+    started = time.monotonic()
+    with pytest.raises(subprocess.CalledProcessError):
+        ffmpeg_batch.run_tasks(tasks, workers={ffmpeg_batch.COST_ENCODE: 2}, probe_output=_durations)
+    assert time.monotonic() - started < 3
+
+
+def test_cancel_check_stops_running_tasks(fake):
+    class Cancelled(Exception):
+        pass
+
+    def cancel_check():
+        raise Cancelled()
+
+    progress = []
+    with pytest.raises(Cancelled):
+        ffmpeg_batch.run_tasks([_task("slow1.mp4"), _task("slow2.mp4"), _task("out.mp4")],
+                               workers={ffmpeg_batch.COST_ENCODE: 2}, cancel_check=cancel_check,
+                               progress_callback=lambda *args: progress.append(args), probe_output=_durations)
+    assert "out.mp4" not in fake.calls
+    assert progress == []
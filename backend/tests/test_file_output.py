@@ -0,0 +1,38 @@
+"""分类结果清单与原子写入测试"""
+import csv
+import json
+import os
+
+from core import file_output
+from core.cache_utils import atomic_writer
+
+
+def test_atomic_writer_passes_newline(tmp_path):
+    path = str(tmp_path / "rows.csv")
+    with atomic_writer(path, 'w', encoding='utf-8', newline='') as f:
+        csv.writer(f).writerow(['a', 'b'])
+    with open(path, 'rb') as f:
+        assert f.read() == b'a,b\r\n'
+
+
+def test_write_manifest(tmp_path):
+    groups = [
+        {"group": 1, "folder": "group_001", "files": ["/media/a.jpg", "/media/b,1.jpg"]},
+        {"group": 2, "folder": "group_002", "files": ["/media/c.jpg"]},
+    ]
+    json_path, csv_path = file_output.write_manifest(str(tmp_path), groups)
+    with open(json_path, encoding='utf-8') as f:
+        assert json.load(f) == {"groups": groups}
+    with open(csv_path, 'rb') as f:
+        raw = f.read()
+    assert raw.startswith(b'\xef\xbb\xbf')
+    assert b'\r\r\n' not in raw
+    with open(csv_path, encoding='utf-8-sig', newline='') as f:
+        rows = list(csv.reader(f))
+    assert rows == [
+        ['group', 'folder', 'file'],
+        ['1', 'group_001', '/media/a.jpg'],
+        ['1', 'group_001', '/media/b,1.jpg'],
+        ['2', 'group_002', '/media/c.jpg'],
+    ]
+    assert not [name for name in os.listdir(tmp_path) if name.startswith('.tmp_')]
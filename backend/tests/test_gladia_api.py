@@ -0,0 +1,254 @@
+"""
+Gladia 接口测试：上传 / 自适应轮询 / key 轮换在本地桩服务上运行，不访问网络。
+"""
+import os
+import json
+import time
+import threading
+from email.utils import formatdate
+
+import pytest
+
+from core import gladia_api
+from gladia_stub import GladiaStub
+
+
+@pytest.fixture
+def audio_file(tmp_path):
+    path = tmp_path / "segment.mp3"
+    path.write_bytes(b"\0" * 2048)
+    return str(path)
+
+
+@pytest.fixture
+def fast_polling(monkeypatch):
+    """缩短轮询间隔并去掉抖动，使间隔序列可预测"""
+    monkeypatch.setattr(gladia_api, 'POLL_FIRST_INTERVAL', 0.1)
+    monkeypatch.setattr(gladia_api, 'POLL_BACKOFF', 2.0)
+    monkeypatch.setattr(gladia_api, 'POLL_JITTER', 0.0)
+
+
+def _run(stub, monkeypatch, audio_file, api_key="key", **kwargs):
+    monkeypatch.setattr(gladia_api, 'GLADIA_API_URL', stub.url)
+    return gladia_api.transcribe_local_audio(audio_file, api_key=api_key, language_behaviour="manual",
+                                             language="english", toggle_word_timestamps=True, **kwargs)
+
+
+def test_poll_backs_off_exponentially(fast_polling, monkeypatch, audio_file):
+    with GladiaStub(delay=1.0) as stub:
+        started = time.monotonic()
+        result = _run(stub, monkeypatch, audio_file)
+        elapsed = time.monotonic() - started
+    assert result["status"] == "done"
+    assert result["prediction"] == stub.prediction
+    # 0.1, 0.2, 0.4, 0.8 秒的等待后完成：4 次轮询，且不会比处理时长多等一个完整间隔
+    assert stub.polls == 4
+    gaps = [b - a for a, b in zip(stub.poll_times, stub.poll_times[1:])]
+    for prev, cur in zip(gaps, gaps[1:]):
+        assert cur == pytest.approx(prev * 2, rel=0.3)
+    assert elapsed < 1.0 + 0.8
+
+
+def _submit(stub):
+    return gladia_api._session().post(stub.url, headers={"x-gladia-key": "key"}).json()["result_url"]
+
+
+def test_poll_interval_is_capped(fast_polling):
+    with GladiaStub(delay=0.9) as stub:
+        url = _submit(stub)
+        assert gladia_api.poll_for_result(url, "key", poll_interval_seconds=0.2, max_attempts=20) is not None
+        gaps = [b - a for a, b in zip(stub.poll_times, stub.poll_times[1:])]
+    assert max(gaps) < 0.2 + 0.1
+
+
+def test_poll_honours_retry_after(fast_polling, monkeypatch, audio_file):
+    with GladiaStub(delay=0.6, retry_after=0.05) as stub:
+        result = _run(stub, monkeypatch, audio_file)
+    assert result is not None
+    gaps = [b - a for a, b in zip(stub.poll_times, stub.poll_times[1:])]
+    assert gaps and max(gaps) < 0.05 + 0.1
+
+
+def test_poll_returns_none_on_error_status(fast_polling, monkeypatch, audio_file):
+    with GladiaStub(delay=0.1, fail=True) as stub:
+        assert _run(stub, monkeypatch, audio_file) is None
+    assert stub.polls == 1
+
+
+def test_poll_returns_none_on_http_error(fast_polling, monkeypatch, audio_file):
+    with GladiaStub(delay=0.1, poll_status=500) as stub:
+        assert _run(stub, monkeypatch, audio_file) is None
+    assert stub.polls == 1
+
+
+def test_poll_gives_up_after_deadline(fast_polling):
+    with GladiaStub(delay=60.0) as stub:
+        url = _submit(stub)
+        started = time.monotonic()
+        assert gladia_api.poll_for_result(url, "key", poll_interval_seconds=0.1, max_attempts=4) is None
+        elapsed = time.monotonic() - started
+    assert 0.4 <= elapsed < 0.8
+
+
+def test_retry_after_parsing():
+    class _Response:
+        def __init__(self, value):
+            self.headers = {'Retry-After': value} if value is not None else {}
+
+    assert gladia_api._retry_after(_Response("2.5")) == 2.5
+    assert gladia_api._retry_after(_Response("-1")) == 0.0
+    assert gladia_api._retry_after(_Response(None)) is None
+    assert gladia_api._retry_after(_Response("soon")) is None
+    assert gladia_api._retry_after(_Response(formatdate(time.time() + 30, usegmt=True))) == pytest.approx(30, abs=2)
+
+
+def test_session_is_per_thread():
+    main_session = gladia_api._session()
+    assert gladia_api._session() is main_session
+    other = []
+    thread = threading.Thread(target=lambda: other.append(gladia_api._session()))
+    thread.start()
+    thread.join()
+    assert other[0] is not main_session
+
+
+def test_limit_exceeded_switches_to_next_key(fast_polling, monkeypatch, audio_file):
+    rotation = gladia_api.KeyRotation(["k1", "k2"])
+    errors = {"k1": (429, {"message": "limit exceeded"})}
+    with GladiaStub(delay=0.1, upload_errors=errors) as stub:
+        result = _run(stub, monkeypatch, audio_file, api_key=rotation.current, rotation=rotation)
+    assert result is not None
+    assert stub.upload_keys == ["k1", "k2"]
+    assert rotation.current == "k2"
+
+
+def test_limit_exceeded_without_spare_key(fast_polling, monkeypatch, audio_file):
+    rotation = gladia_api.KeyRotation(["k1"])
+    with GladiaStub(delay=0.1, upload_errors={"k1": (429, {"message": "limit exceeded"})}) as stub:
+        assert _run(stub, monkeypatch, audio_file, api_key="k1", rotation=rotation) is None
+    assert rotation.current == ""
+
+
+def test_key_rotation_is_per_instance():
+    first = gladia_api.KeyRotation(["a", "b"])
+    second = gladia_api.KeyRotation(["x", "y"])
+    assert first.switch("a") == "b"
+    assert second.current == "x"
+    # 另一个分段迟到的 "a 已用尽" 不会再次切换
+    assert first.switch("a") == "b"
+
+
+def test_concurrency_is_limited_per_key(fast_polling, monkeypatch, audio_file):
+    monkeypatch.setenv('PYMEDIA_GLADIA_CONCURRENCY', '2')
+    api_key = f"limited-{time.monotonic()}"
+    with GladiaStub(delay=0.3) as stub:
+        monkeypatch.setattr(gladia_api, 'GLADIA_API_URL', stub.url)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(
+            gladia_api.transcribe_local_audio(audio_file, api_key=api_key))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    assert len(results) == 5 and all(results)
+    assert stub.max_active[api_key] == 2
+
+
+SEGMENT_DURATIONS = [10.5, 20.25, 7.0]
+SEGMENT_DELAYS = [0.6, 0.1, 0.3]          # 第 0 段最慢：完成顺序为 1, 2, 0
+
+
+def _segment_prediction(index):
+    return [{
+        "transcription": f"seg{index} part{part}",
+        "time_begin": part * 2.0,
+        "time_end": part * 2.0 + 1.5,
+        "words": [
+            {"word": f" seg{index}", "time_begin": part * 2.0, "time_end": part * 2.0 + 0.5, "confidence": 0.9},
+            {"word": f" part{part}", "time_begin": part * 2.0 + 0.6, "time_end": part * 2.0 + 1.5,
+             "confidence": 0.8},
+        ],
+    } for part in range(2)]
+
+
+def _segment_responses(body):
+    """上传内容中带有分段序号，按序号返回各段的处理时长与 prediction"""
+    for index in range(len(SEGMENT_DURATIONS)):
+        if f"segment-{index}".encode() in body:
+            return SEGMENT_DELAYS[index], _segment_prediction(index)
+    raise AssertionError("未知的分段")
+
+
+def _transcribe_segments(monkeypatch, tmp_path, stub, name, max_concurrency):
+    segments = []
+    for index, duration in enumerate(SEGMENT_DURATIONS):
+        path = tmp_path / f"{name}_{index}.mp3"
+        path.write_bytes(f"segment-{index}".encode() * 64)
+        segments.append((str(path), duration))
+    monkeypatch.setattr(gladia_api, 'GLADIA_API_URL', stub.url)
+    monkeypatch.setattr(gladia_api, 'split_audio_on_silence', lambda *args, **kwargs: segments)
+    json_path, txt_path = tmp_path / f"{name}.json", tmp_path / f"{name}.txt"
+    messages = list(gladia_api.transcribe_audio_from_gladia(
+        str(tmp_path / "audio.mp3"), [f"stitch-{name}-{time.monotonic()}"], "english", str(json_path),
+        str(txt_path), work_dir=str(tmp_path / f"work_{name}"), max_concurrency=max_concurrency))
+    indexes = {path: index for index, (path, _) in enumerate(segments)}
+    done_order = [indexes[message.rsplit(':', 1)[0]] for message in messages if message.rsplit(':', 1)[0] in indexes]
+    with open(json_path, 'r', encoding='utf-8') as f:
+        result = json.load(f)
+    with open(txt_path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    return done_order, result, text
+
+
+def test_parallel_segments_stitch_like_serial(fast_polling, monkeypatch, tmp_path):
+    monkeypatch.setenv('PYMEDIA_GLADIA_CONCURRENCY', str(len(SEGMENT_DURATIONS)))
+    with GladiaStub(responses=_segment_responses) as stub:
+        parallel_order, parallel, parallel_text = _transcribe_segments(monkeypatch, tmp_path, stub, "parallel",
+                                                                       len(SEGMENT_DURATIONS))
+        serial_order, serial, serial_text = _transcribe_segments(monkeypatch, tmp_path, stub, "serial", 1)
+
+    assert parallel_order == [1, 2, 0]
+    assert serial_order == [0, 1, 2]
+    assert parallel == serial
+    assert parallel_text == serial_text
+
+    # 按分段顺序拼接，时间加上各段起点（前面各段时长之和）
+    starts = [0.0, 10.5, 30.75]
+    assert [part["text"] for part in parallel] == [f"seg{k} part{p}" for k in range(3) for p in range(2)]
+    assert [part["audio_start"] for part in parallel] == pytest.approx(
+        [starts[k] + p * 2.0 for k in range(3) for p in range(2)])
+    assert [word["start"] for part in parallel for word in part["words"]] == pytest.approx(
+        [starts[k] + p * 2.0 + offset for k in range(3) for p in range(2) for offset in (0.0, 0.6)])
+    assert parallel_text == ' '.join(f"seg{k} part{p}" for k in range(3) for p in range(2))
+
+
+def test_transcript_cache_is_keyed_by_signature_and_language(monkeypatch, tmp_path):
+    monkeypatch.setenv('PYMEDIA_CACHE_DIR', str(tmp_path / "cache"))
+    audio = tmp_path / "audio.mp3"
+    audio.write_bytes(b"\0" * 64)
+    json_path, txt_path = str(tmp_path / "out.json"), str(tmp_path / "out.txt")
+    utterances = [{"text": "hello world", "audio_start": 0.0, "audio_end": 1.0, "words": []}]
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(utterances, f)
+    with open(txt_path, 'w', encoding='utf-8') as f:
+        f.write("hello world")
+
+    cache_path = gladia_api.transcript_cache_path(str(audio), "english")
+    assert not gladia_api.load_cached_transcript(cache_path, json_path, txt_path)
+    gladia_api.save_cached_transcript(cache_path, json_path, txt_path)
+    # 原子写入：缓存目录中只有最终文件，没有残留的临时文件
+    assert os.listdir(os.path.dirname(cache_path)) == [os.path.basename(cache_path)]
+
+    hit_json, hit_txt = str(tmp_path / "hit.json"), str(tmp_path / "hit.txt")
+    assert gladia_api.load_cached_transcript(gladia_api.transcript_cache_path(str(audio), "english"), hit_json, hit_txt)
+    with open(hit_json, 'r', encoding='utf-8') as f:
+        assert json.load(f) == utterances
+    with open(hit_txt, 'r', encoding='utf-8') as f:
+        assert f.read() == "hello world"
+
+    # 其它语种、内容变化后的文件、不存在的文件都不命中
+    assert gladia_api.transcript_cache_path(str(audio), "french") != cache_path
+    audio.write_bytes(b"\1" * 65)
+    assert not gladia_api.load_cached_transcript(gladia_api.transcript_cache_path(str(audio), "english"),
+                                                 hit_json, hit_txt)
+    assert gladia_api.transcript_cache_path(str(tmp_path / "missing.mp3"), "english") is None
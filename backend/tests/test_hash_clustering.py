@@ -0,0 +1,90 @@
+"""哈希聚类测试：多索引哈希 / 按值分组 / 暴力比较的结果必须与逐对比较一致"""
+import random
+
+import pytest
+
+from core import hash_index
+
+np = pytest.importorskip("numpy")
+from core import hamming  # noqa: E402  依赖 numpy
+
+THRESHOLDS = (0, 1, 2, 8, 12)
+
+
+def _clustered_hashes(n, seed):
+    """一半随机哈希，一半是少数中心附近 0~12 位翻转的哈希（含完全重复），每个阈值下都有相连的对"""
+    rng = random.Random(seed)
+    centers = [rng.getrandbits(64) for _ in range(max(1, n // 50))]
+    hashes = []
+    for _ in range(n):
+        if rng.random() < 0.5:
+            hashes.append(rng.getrandbits(64))
+        else:
+            h = rng.choice(centers)
+            for _ in range(rng.randint(0, 12)):
+                h ^= 1 << rng.randrange(64)
+            hashes.append(h)
+    return hashes
+
+
+def _pair_set(chunks):
+    return {(int(i), int(j)) for a, b in chunks for i, j in zip(a, b)}
+
+
+def _python_pairs(hashes, threshold):
+    return {(i, j) for i in range(len(hashes)) for j in range(i + 1, len(hashes))
+            if bin(hashes[i] ^ hashes[j]).count('1') <= threshold}
+
+
+@pytest.mark.parametrize('threshold', THRESHOLDS)
+def test_brute_force_matches_python(threshold):
+    hashes = _clustered_hashes(400, seed=threshold)
+    engine = hamming.HammingEngine(hashes)
+    assert _pair_set(engine.brute_force_pairs(threshold)) == _python_pairs(hashes, threshold)
+
+
+@pytest.mark.parametrize('n', [hamming.BRUTE_FORCE_MAX // 4, hamming.BRUTE_FORCE_MAX + 1000])
+@pytest.mark.parametrize('threshold', THRESHOLDS)
+def test_pairs_match_brute_force(n, threshold):
+    hashes = _clustered_hashes(n, seed=n + threshold)
+    engine = hamming.HammingEngine(hashes)
+    expected = _pair_set(engine.brute_force_pairs(threshold))
+    assert expected, "测试数据应包含相连的对"
+    assert _pair_set(engine.pairs(threshold)) == expected
+    if threshold > 0:
+        # 无论 pairs() 是否选择了多索引，都直接校验多索引路径（含超过稠密表宽度的宽段）
+        assert _pair_set(engine.multi_index_pairs(threshold)) == expected
+
+
+@pytest.mark.parametrize('threshold', [0, 1])
+def test_small_thresholds_use_few_bands(threshold):
+    # 阈值 0 / 1 不应退化为 64 个 1 位的段
+    assert hamming.choose_vector_bands(100000, threshold) == threshold + 1
+
+
+@pytest.mark.parametrize('threshold', THRESHOLDS)
+def test_cluster_engines_agree(threshold):
+    hashes = _clustered_hashes(3000, seed=threshold)
+    expected = hash_index.cluster_hashes(hashes, threshold)
+    assert hamming.cluster_hashes(hashes, threshold) == expected
+    assert sum(len(group) for group in expected) == len(hashes)
+
+
+@pytest.mark.parametrize('threshold', THRESHOLDS)
+def test_python_index_matches_pairwise(threshold):
+    hashes = _clustered_hashes(300, seed=100 + threshold)
+    parent = list(range(len(hashes)))
+
+    def find(x):
+        while parent[x] != x:
+            x = parent[x]
+        return x
+
+    for i, j in sorted(_python_pairs(hashes, threshold)):
+        ri, rj = find(i), find(j)
+        if ri != rj:
+            parent[max(ri, rj)] = min(ri, rj)
+    groups = {}
+    for i in range(len(hashes)):
+        groups.setdefault(find(i), []).append(i)
+    assert hash_index.cluster_hashes(hashes, threshold) == list(groups.values())
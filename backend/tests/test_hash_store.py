@@ -0,0 +1,106 @@
+"""感知哈希缓存库测试：在临时目录中的 SQLite 库上运行"""
+import sqlite3
+
+import pytest
+
+from core import hash_store, perceptual_hash
+
+
+@pytest.fixture
+def store(tmp_path):
+    return hash_store.HashStore(str(tmp_path / "hashes.sqlite3"))
+
+
+def _columns(path):
+    conn = sqlite3.connect(path)
+    try:
+        return {row[1] for row in conn.execute("PRAGMA table_info(hashes)")}
+    finally:
+        conn.close()
+
+
+def test_old_schema_gains_frame_columns(tmp_path):
+    path = str(tmp_path / "old.sqlite3")
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute(hash_store._SCHEMA)
+        conn.execute("INSERT INTO hashes (path, size, mtime_ns, version, dhash, updated) VALUES (?, ?, ?, ?, ?, ?)",
+                     ("/media/a.jpg", 10, 20, perceptual_hash.HASH_VERSION, 42, 0.0))
+    conn.close()
+
+    store = hash_store.HashStore(path)
+    assert {f"{name}_frames" for name in perceptual_hash.HASH_ALGORITHMS} <= _columns(path)
+    assert store.lookup([("/media/a.jpg", 10, 20)]) == {"/media/a.jpg": {"dhash": 42}}
+    # 再次打开不会重复添加列
+    hash_store.HashStore(path)
+
+
+def test_lookup_requires_matching_signature_and_version(store):
+    store.save([("/media/a.jpg", 10, 20, {"dhash": 1})])
+    assert store.lookup([("/media/a.jpg", 10, 20)]) == {"/media/a.jpg": {"dhash": 1}}
+    assert store.lookup([("/media/a.jpg", 11, 20)]) == {}
+    assert store.lookup([("/media/a.jpg", 10, 21)]) == {}
+    assert store.lookup([("/media/a.jpg", 10, 20)], ('dhash', 'ahash')) == {}
+    store.version += 1
+    assert store.lookup([("/media/a.jpg", 10, 20)]) == {}
+
+
+def test_unsigned_hashes_round_trip(store):
+    value = (1 << 64) - 3
+    store.save([("/media/a.jpg", 1, 1, {"dhash": value, "ahash": 1 << 63})])
+    assert store.lookup([("/media/a.jpg", 1, 1)], ('dhash', 'ahash')) == {
+        "/media/a.jpg": {"dhash": value, "ahash": 1 << 63}}
+
+
+def test_save_merges_algorithms_for_unchanged_file(store):
+    store.save([("/media/a.jpg", 10, 20, {"dhash": 1})])
+    store.save([("/media/a.jpg", 10, 20, {"ahash": 2})])
+    assert store.lookup([("/media/a.jpg", 10, 20)], ('dhash', 'ahash')) == {
+        "/media/a.jpg": {"dhash": 1, "ahash": 2}}
+
+
+def test_save_discards_hashes_of_changed_file(store):
+    store.save([("/media/a.jpg", 10, 20, {"dhash": 1, "ahash": 2})])
+    store.save([("/media/a.jpg", 10, 30, {"ahash": 3})])
+    assert store.lookup([("/media/a.jpg", 10, 30)], ('ahash',)) == {"/media/a.jpg": {"ahash": 3}}
+    assert store.lookup([("/media/a.jpg", 10, 30)], ('dhash',)) == {}
+
+
+def test_frames_are_stored_separately(store):
+    fingerprint = (1, 2, (1 << 64) - 1, 4)
+    store.save([("/media/v.mp4", 5, 6, {"dhash": 9}), ("/media/w.mp4", 5, 6, {"dhash": fingerprint})])
+    store.save([("/media/v.mp4", 5, 6, {"dhash": (7,)})])
+    assert store.lookup([("/media/v.mp4", 5, 6)]) == {"/media/v.mp4": {"dhash": 9}}
+    assert store.lookup([("/media/v.mp4", 5, 6), ("/media/w.mp4", 5, 6)], frames=4) == {
+        "/media/v.mp4": {"dhash": (7,)}, "/media/w.mp4": {"dhash": fingerprint}}
+    # 帧数不同的指纹不命中
+    assert store.lookup([("/media/w.mp4", 5, 6)], frames=8) == {}
+
+
+def test_lookup_many_paths(store):
+    items = [(f"/media/{k}.jpg", k, k, {"dhash": k}) for k in range(hash_store._QUERY_CHUNK * 2 + 7)]
+    store.save(items)
+    found = store.lookup([item[:3] for item in items])
+    assert found == {path: {"dhash": value["dhash"]} for path, _, _, value in items}
+
+
+def test_move_replaces_destination_record(store):
+    store.save([("/media/a.jpg", 1, 1, {"dhash": 1}), ("/out/a.jpg", 2, 2, {"dhash": 2})])
+    store.move([("/media/a.jpg", "/out/a.jpg")])
+    assert store.lookup([("/media/a.jpg", 1, 1)]) == {}
+    assert store.lookup([("/out/a.jpg", 1, 1)]) == {"/out/a.jpg": {"dhash": 1}}
+
+
+def test_forget_missing_only_touches_folder(store, tmp_path):
+    folder = tmp_path / "media"
+    folder.mkdir()
+    kept = folder / "kept.jpg"
+    kept.write_bytes(b"x")
+    scanned = str(folder / "scanned.jpg")    # 本次扫描到的路径不检查文件是否存在
+    gone = str(folder / "sub" / "gone.jpg")
+    sibling = str(tmp_path / "media2" / "gone.jpg")
+    store.save([(path, 1, 1, {"dhash": 1}) for path in (str(kept), scanned, gone, sibling)])
+
+    assert store.forget_missing(str(folder), {scanned}) == 1
+    entries = [(path, 1, 1) for path in (str(kept), scanned, gone, sibling)]
+    assert set(store.lookup(entries)) == {str(kept), scanned, sibling}
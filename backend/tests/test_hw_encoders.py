@@ -0,0 +1,80 @@
+"""硬件编码器命令改写测试：只改写命令参数，不需要 ffmpeg"""
+from core import hw_encoders
+
+VAAPI = ['-vaapi_device', hw_encoders.VAAPI_DEVICE]
+
+
+def test_software_encoder_returns_same_command():
+    cmd = ['ffmpeg', '-y', '-i', 'a.mp4', '-c:v', 'libx264', '-crf', '20', 'o.mp4']
+    assert hw_encoders.apply_encoder(cmd, 'libx264') is cmd
+    assert hw_encoders.apply_encoder(cmd, 'unknown') is cmd
+    copy = ['ffmpeg', '-y', '-i', 'a.mp4', '-c', 'copy', 'o.mp4']
+    assert hw_encoders.apply_encoder(copy, 'h264_nvenc') is copy
+
+
+def test_crf_selects_quality_params():
+    cmd = ['ffmpeg', '-y', '-i', 'a.mp4', '-c:v', 'libx264', '-crf', '20', '-c:a', 'aac', 'o.mp4']
+    assert hw_encoders.apply_encoder(cmd, 'h264_nvenc') == [
+        'ffmpeg', '-y', '-i', 'a.mp4', '-c:v', 'h264_nvenc', '-preset', 'fast', '-rc', 'vbr', '-cq', '20',
+        '-c:a', 'aac', 'o.mp4']
+
+
+def test_pix_fmt_is_replaced_for_qsv():
+    cmd = ['ffmpeg', '-y', '-i', 'a.mp4', '-c:v', 'libx264', '-preset', 'fast', '-pix_fmt', 'yuv420p', 'o.mp4']
+    assert hw_encoders.apply_encoder(cmd, 'h264_qsv') == [
+        'ffmpeg', '-y', '-i', 'a.mp4', '-c:v', 'h264_qsv', '-preset', 'veryfast', '-pix_fmt', 'nv12', 'o.mp4']
+
+
+def test_only_rewritten_outputs_lose_their_options():
+    cmd = ['ffmpeg', '-y', '-i', 'a.mp4',
+           '-map', '0:v', '-c:v', 'libx264', '-crf', '20', 'x.mp4',
+           '-map', '0:v', '-c:v', 'libx265', '-preset', 'slow', '-crf', '24', '-pix_fmt', 'yuv420p10le', 'y.mp4',
+           '-map', '0:v', '-c:v', 'libx264', '-preset', 'fast', 'z.mp4']
+    assert hw_encoders.apply_encoder(cmd, 'h264_nvenc') == [
+        'ffmpeg', '-y', '-i', 'a.mp4',
+        '-map', '0:v', '-c:v', 'h264_nvenc', '-preset', 'fast', '-rc', 'vbr', '-cq', '20', 'x.mp4',
+        '-map', '0:v', '-c:v', 'libx265', '-preset', 'slow', '-crf', '24', '-pix_fmt', 'yuv420p10le', 'y.mp4',
+        '-map', '0:v', '-c:v', 'h264_nvenc', '-preset', 'fast', 'z.mp4']
+
+
+def test_vaapi_without_filters_adds_vf():
+    cmd = ['ffmpeg', '-y', '-i', 'a.mp4', '-c:v', 'libx264', '-pix_fmt', 'yuv420p', 'o.mp4']
+    assert hw_encoders.apply_encoder(cmd, 'h264_vaapi') == [
+        'ffmpeg'] + VAAPI + ['-y', '-i', 'a.mp4', '-vf', 'format=nv12,hwupload', '-c:v', 'h264_vaapi', 'o.mp4']
+
+
+def test_vaapi_appends_to_vf():
+    cmd = ['ffmpeg', '-y', '-i', 'a.mp4', '-vf', 'scale=640:-2', '-c:v', 'libx264', 'o.mp4']
+    assert hw_encoders.apply_encoder(cmd, 'h264_vaapi') == [
+        'ffmpeg'] + VAAPI + ['-y', '-i', 'a.mp4', '-vf', 'scale=640:-2,format=nv12,hwupload',
+                             '-c:v', 'h264_vaapi', 'o.mp4']
+
+
+def test_vaapi_labels_unlabelled_graph_output():
+    cmd = ['ffmpeg', '-y', '-i', 'a.mp4', '-i', 'logo.png',
+           '-filter_complex', '[0:v]scale=1080:1920[v];[v][1:v]overlay=0:0',
+           '-c:v', 'libx264', '-c:a', 'aac', 'o.mp4']
+    assert hw_encoders.apply_encoder(cmd, 'h264_vaapi') == [
+        'ffmpeg'] + VAAPI + ['-y', '-i', 'a.mp4', '-i', 'logo.png',
+                             '-filter_complex', '[0:v]scale=1080:1920[v];[v][1:v]overlay=0:0[out];'
+                                                '[out]format=nv12,hwupload[hw0]',
+                             '-map', '[hw0]', '-map', '0:a?', '-c:v', 'h264_vaapi', '-c:a', 'aac', 'o.mp4']
+
+
+def test_vaapi_rewrites_mapped_video_labels():
+    graph = '[0:v]split=2[s0][s1];[0:a]asplit=2[a0][a1];[s1][1:v]overlay=0:0[o1]'
+    cmd = ['ffmpeg', '-y', '-i', 'a.mp4', '-i', 'logo.png', '-filter_complex', graph,
+           '-map', '[a0]', '-map', '[s0]', '-c:v', 'libx264', '-crf', '20', 'x.mp4',
+           '-map', '[o1]', '-map', '[a1]', '-c:v', 'dnxhd', 'y.mov']
+    out = hw_encoders.apply_encoder(cmd, 'h264_vaapi')
+    assert out == [
+        'ffmpeg'] + VAAPI + ['-y', '-i', 'a.mp4', '-i', 'logo.png',
+                             '-filter_complex', graph + ';[s0]format=nv12,hwupload[hw0]',
+                             '-map', '[a0]', '-map', '[hw0]', '-c:v', 'h264_vaapi', '-rc_mode', 'CQP', '-qp', '20',
+                             'x.mp4', '-map', '[o1]', '-map', '[a1]', '-c:v', 'dnxhd', 'y.mov']
+
+
+def test_vaapi_keeps_software_when_video_stream_is_unknown():
+    cmd = ['ffmpeg', '-y', '-i', 'a.mp4', '-filter_complex', '[0:v]scale=640:-2[v]',
+           '-map', '0:v', '-c:v', 'libx264', 'o.mp4']
+    assert hw_encoders.apply_encoder(cmd, 'h264_vaapi') is cmd
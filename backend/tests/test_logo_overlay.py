@@ -0,0 +1,89 @@
+"""Logo 叠加命令构建测试：预缩放通过 monkeypatch 替换，不需要 ffmpeg"""
+import os
+import subprocess
+
+import pytest
+
+from core import logo_overlay
+
+POS = {'x': 10, 'y': 20, 'w': 300, 'h': 100}
+CANVAS = "scale=1080:1920:force_original_aspect_ratio=decrease,pad=1080:1920:(ow-iw)/2:(oh-ih)/2"
+OVERLAY = "overlay=10:20:eof_action=repeat"
+
+
+@pytest.fixture
+def prescaled(monkeypatch):
+    monkeypatch.setattr(logo_overlay, 'prescaled_logo', lambda path, w, h: f"/cache/{w}x{h}.png")
+
+
+@pytest.fixture
+def not_prescaled(monkeypatch):
+    monkeypatch.setattr(logo_overlay, 'prescaled_logo', lambda path, w, h: None)
+
+
+def test_single_input_uses_prescaled_logo(prescaled):
+    cmd = logo_overlay.build_overlay_cmd(['in.mp4'], ['out.mp4'], 'logo.png', POS)
+    assert cmd == ['ffmpeg', '-y', '-i', 'in.mp4', '-i', '/cache/300x100.png',
+                   '-filter_complex', f"[0:v]{CANVAS}[v];[v][1:v]{OVERLAY}",
+                   '-c:v', 'libx264', '-c:a', 'aac', '-b:a', '128k', 'out.mp4']
+
+
+def test_single_input_scales_logo_in_graph(not_prescaled):
+    cmd = logo_overlay.build_overlay_cmd(['in.mp4'], ['out.mp4'], 'logo.png', POS, audio_bitrate='192k')
+    assert cmd == ['ffmpeg', '-y', '-i', 'in.mp4', '-i', 'logo.png',
+                   '-filter_complex', f"[0:v]{CANVAS}[v];[1:v]scale=300:100[logo];[v][logo]{OVERLAY}",
+                   '-c:v', 'libx264', '-c:a', 'aac', '-b:a', '192k', 'out.mp4']
+
+
+def test_combined_inputs_share_one_logo(prescaled):
+    cmd = logo_overlay.build_overlay_cmd(['a.mp4', 'b.mp4'], ['a_out.mp4', 'b_out.mp4'], 'logo.png', POS)
+    graph = ";".join(["[2:v]split=2[l0][l1]",
+                      f"[0:v]{CANVAS}[v0]", f"[v0][l0]{OVERLAY}[o0]",
+                      f"[1:v]{CANVAS}[v1]", f"[v1][l1]{OVERLAY}[o1]"])
+    assert cmd == ['ffmpeg', '-y', '-i', 'a.mp4', '-i', 'b.mp4', '-i', '/cache/300x100.png',
+                   '-filter_complex', graph,
+                   '-map', '[o0]', '-map', '0:a?', '-c:v', 'libx264', '-c:a', 'aac', '-b:a', '128k', 'a_out.mp4',
+                   '-map', '[o1]', '-map', '1:a?', '-c:v', 'libx264', '-c:a', 'aac', '-b:a', '128k', 'b_out.mp4']
+
+
+def test_combined_inputs_scale_before_split(not_prescaled):
+    cmd = logo_overlay.build_overlay_cmd(['a.mp4', 'b.mp4', 'c.mp4'], ['1', '2', '3'], 'logo.png', POS)
+    graph = cmd[cmd.index('-filter_complex') + 1]
+    assert graph.startswith("[3:v]scale=300:100,split=3[l0][l1][l2];")
+    assert cmd[cmd.index('-filter_complex') - 1] == 'logo.png'
+    assert [cmd[k + 1] for k, arg in enumerate(cmd) if arg == '-map'] == [
+        '[o0]', '0:a?', '[o1]', '1:a?', '[o2]', '2:a?']
+
+
+def test_prescaled_logo_missing_file(tmp_path):
+    assert logo_overlay.prescaled_logo(str(tmp_path / "missing.png"), 10, 10) is None
+
+
+def test_prescaled_logo_reuses_cache(tmp_path, monkeypatch):
+    logo = tmp_path / "logo.png"
+    logo.write_bytes(b"png")
+    cached = tmp_path / "cache" / "10x10.png"
+    cached.parent.mkdir()
+    cached.write_bytes(b"scaled")
+    monkeypatch.setattr(logo_overlay, 'signature_cache_path', lambda *args: str(cached))
+
+    def _fail(*args, **kwargs):
+        raise AssertionError("缓存命中时不应启动 ffmpeg")
+
+    monkeypatch.setattr(logo_overlay.subprocess, 'run', _fail)
+    assert logo_overlay.prescaled_logo(str(logo), 10, 10) == str(cached)
+
+
+def test_prescaled_logo_failure_cleans_up(tmp_path, monkeypatch):
+    logo = tmp_path / "logo.png"
+    logo.write_bytes(b"png")
+    cache_dir = tmp_path / "cache"
+    cache_dir.mkdir()
+    monkeypatch.setattr(logo_overlay, 'signature_cache_path', lambda *args: str(cache_dir / "10x10.png"))
+
+    def _fail(cmd, **kwargs):
+        raise subprocess.CalledProcessError(1, cmd)
+
+    monkeypatch.setattr(logo_overlay.subprocess, 'run', _fail)
+    assert logo_overlay.prescaled_logo(str(logo), 10, 10) is None
+    assert os.listdir(cache_dir) == []
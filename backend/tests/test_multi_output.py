@@ -0,0 +1,80 @@
+"""多目标转换命令构建测试：预缩放通过 monkeypatch 替换，不需要 ffmpeg"""
+import pytest
+
+from core import multi_output
+
+POS = {'x': 10, 'y': 20, 'w': 300, 'h': 100}
+
+
+@pytest.fixture(autouse=True)
+def prescaled(monkeypatch):
+    monkeypatch.setattr(multi_output, 'prescaled_logo', lambda path, w, h: f"/cache/{w}x{h}.png")
+
+
+def _maps(cmd):
+    return [cmd[k + 1] for k, arg in enumerate(cmd) if arg == '-map']
+
+
+def test_one_decode_feeds_every_target():
+    cmd, outputs, skipped = multi_output.build_multi_output_cmd(
+        'in.mp4', [('h264', 'a.mp4', None), ('dnxhr', 'b.mov', None), ('mp3', 'c.mp3', None)])
+    assert outputs == ['a.mp4', 'b.mov', 'c.mp3'] and skipped == []
+    assert cmd == (['ffmpeg', '-y', '-i', 'in.mp4',
+                    '-filter_complex', '[0:v]split=2[s0][s1];[0:a]asplit=3[a0][a1][a2]']
+                   + ['-map', '[s0]', '-map', '[a0]'] + multi_output.TARGETS['h264'][2] + ['a.mp4']
+                   + ['-map', '[s1]', '-map', '[a1]'] + multi_output.TARGETS['dnxhr'][2] + ['b.mov']
+                   + ['-map', '[a2]'] + multi_output.TARGETS['mp3'][2] + ['c.mp3'])
+    assert cmd.count('-i') == 1
+
+
+def test_logo_target_gets_its_own_branch():
+    cmd, outputs, _ = multi_output.build_multi_output_cmd(
+        'in.mp4', [('x264', 'a.mp4', None), ('logo_a', 'b.mp4', ('logo.png', POS)), ('wav', 'c.wav', None)])
+    assert cmd[:6] == ['ffmpeg', '-y', '-i', 'in.mp4', '-i', '/cache/300x100.png']
+    graph = cmd[cmd.index('-filter_complex') + 1].split(';')
+    assert graph[0] == '[0:v]split=2[s0][s1]'
+    assert graph[1] == '[0:a]asplit=3[a0][a1][a2]'
+    assert graph[2].startswith('[s1]scale=1080:1920') and graph[2].endswith('[c1]')
+    assert graph[3] == '[c1][1:v]overlay=10:20:eof_action=repeat[o1]'
+    assert _maps(cmd) == ['[s0]', '[a0]', '[o1]', '[a1]', '[a2]']
+    start = cmd.index('a.mp4') + 1
+    assert cmd[start:cmd.index('b.mp4')] == ['-map', '[o1]', '-map', '[a1]'] + multi_output.LOGO_ARGS
+    assert outputs == ['a.mp4', 'b.mp4', 'c.wav']
+
+
+def test_logo_scaled_in_graph_when_prescale_fails(monkeypatch):
+    monkeypatch.setattr(multi_output, 'prescaled_logo', lambda path, w, h: None)
+    cmd, _, _ = multi_output.build_multi_output_cmd('in.mp4', [('logo_a', 'b.mp4', ('logo.png', POS))])
+    assert cmd[4:6] == ['-i', 'logo.png']
+    graph = cmd[cmd.index('-filter_complex') + 1].split(';')
+    assert '[1:v]scale=300:100[l0]' in graph
+    assert graph[-1] == '[c0][l0]overlay=10:20:eof_action=repeat[o0]'
+
+
+def test_missing_logo_file_only_converts():
+    cmd, _, _ = multi_output.build_multi_output_cmd('in.mp4', [('logo_a', 'b.mp4', False)])
+    assert cmd == ['ffmpeg', '-y', '-i', 'in.mp4', '-filter_complex', '[0:v]split=1[s0];[0:a]asplit=1[a0]',
+                   '-map', '[s0]', '-map', '[a0]'] + multi_output.LOGO_ARGS_NO_FILE + ['b.mp4']
+
+
+def test_audio_only_source_skips_video_targets():
+    cmd, outputs, skipped = multi_output.build_multi_output_cmd(
+        'in.wav', [('h264', 'a.mp4', None), ('logo_a', 'b.mp4', ('logo.png', POS)), ('mp3', 'c.mp3', None)],
+        has_video=False)
+    assert outputs == ['c.mp3']
+    assert [mode for mode, _ in skipped] == ['h264', 'logo_a']
+    assert cmd == ['ffmpeg', '-y', '-i', 'in.wav', '-filter_complex', '[0:a]asplit=1[a0]',
+                   '-map', '[a0]'] + multi_output.TARGETS['mp3'][2] + ['c.mp3']
+
+
+def test_silent_source_skips_audio_targets():
+    cmd, outputs, skipped = multi_output.build_multi_output_cmd(
+        'in.mp4', [('h264', 'a.mp4', None), ('wav', 'b.wav', None)], has_audio=False)
+    assert outputs == ['a.mp4'] and skipped == [('wav', "源文件没有音频流")]
+    assert _maps(cmd) == ['[s0]']
+    assert 'asplit' not in cmd[cmd.index('-filter_complex') + 1]
+
+
+def test_nothing_to_output():
+    assert multi_output.build_multi_output_cmd('in.wav', [('h264', 'a.mp4', None)], has_video=False) == (
+        None, [], [('h264', "源文件没有视频流")])
@@ -0,0 +1,84 @@
+"""感知哈希测试：纯 Python 与 numpy 路径结果一致；图片批量计算用线程池代替进程池"""
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from core import perceptual_hash
+
+Image = pytest.importorskip("PIL.Image")
+
+
+def _pixels(count, seed):
+    rng = random.Random(seed)
+    return bytes(rng.randrange(256) for _ in range(count))
+
+
+def test_dhash_bit_layout():
+    # 第 0 行全部递增、其余行全部递减：只有低 8 位置位
+    rows = [bytes(range(9))] + [bytes(range(9, 0, -1))] * 7
+    assert perceptual_hash.dhash_from_pixels(b''.join(rows)) == 0xFF
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_pure_python_matches_numpy(seed, monkeypatch):
+    if perceptual_hash.np is None:
+        pytest.skip("需要 numpy 才能比较两条路径")
+    dhash_pixels, ahash_pixels = _pixels(72, seed), _pixels(64, seed + 100)
+    expected = (perceptual_hash.dhash_from_pixels(dhash_pixels), perceptual_hash.ahash_from_pixels(ahash_pixels))
+    monkeypatch.setattr(perceptual_hash, 'np', None)
+    assert (perceptual_hash.dhash_from_pixels(dhash_pixels),
+            perceptual_hash.ahash_from_pixels(ahash_pixels)) == expected
+
+
+def test_phash_requires_numpy(monkeypatch):
+    monkeypatch.setattr(perceptual_hash, 'np', None)
+    with pytest.raises(RuntimeError):
+        perceptual_hash.phash_from_pixels(bytes(32 * 32))
+
+
+def _write_image(path, seed, size=(120, 90)):
+    rng = random.Random(seed)
+    img = Image.new('RGB', size)
+    img.putdata([(rng.randrange(256), rng.randrange(256), rng.randrange(256)) for _ in range(size[0] * size[1])])
+    img.save(path)
+    return str(path)
+
+
+@pytest.fixture
+def thread_pool(monkeypatch):
+    from core import job_queue
+    executor = ThreadPoolExecutor(max_workers=2)
+    monkeypatch.setattr(job_queue, 'get_process_pool', lambda: executor)
+    monkeypatch.setattr(perceptual_hash, 'IMAGE_CHUNK', 2)
+    yield executor
+    executor.shutdown(wait=True)
+
+
+def test_hash_files_keeps_order_and_reports_errors(tmp_path, thread_pool):
+    paths = [_write_image(tmp_path / f"{k}.png", k) for k in range(5)]
+    broken = tmp_path / "broken.jpg"
+    broken.write_bytes(b"not an image")
+    files = [(path, False) for path in paths[:3]] + [(str(broken), False)] + [(path, False) for path in paths[3:]]
+    seen, progress = [], []
+    results = perceptual_hash.hash_files(files, ('dhash', 'ahash'),
+                                         result_callback=lambda i, item: seen.append(i),
+                                         progress_callback=lambda done, total: progress.append((done, total)))
+
+    assert sorted(seen) == list(range(len(files)))
+    assert progress[-1] == (len(files), len(files))
+    assert results[3][0] is None and results[3][1]
+    for (path, _), (hashes, error) in zip(files, results):
+        if path == str(broken):
+            continue
+        assert error is None
+        assert hashes == perceptual_hash.hash_gray_image(perceptual_hash.load_image_gray(path), ('dhash', 'ahash'))
+
+
+def test_similar_images_have_close_hashes(tmp_path):
+    base = Image.linear_gradient('L').resize((200, 200))
+    base.save(tmp_path / "a.png")
+    base.resize((100, 100)).save(tmp_path / "b.jpg", quality=85)
+    a = perceptual_hash.hash_gray_image(perceptual_hash.load_image_gray(str(tmp_path / "a.png")))['dhash']
+    b = perceptual_hash.hash_gray_image(perceptual_hash.load_image_gray(str(tmp_path / "b.jpg")))['dhash']
+    assert bin(a ^ b).count('1') <= 4
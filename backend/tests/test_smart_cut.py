@@ -0,0 +1,77 @@
+"""智能裁切测试：分段规划为纯函数；首尾重编码 + 中间流复制的拼接需要 ffmpeg"""
+import json
+import shutil
+import subprocess
+
+import pytest
+
+from core import smart_cut, media_probe
+
+needs_ffmpeg = pytest.mark.skipif(not (shutil.which('ffmpeg') and shutil.which('ffprobe')),
+                                  reason="需要 ffmpeg / ffprobe")
+
+
+def test_plan_uses_inner_keyframes():
+    keyframes = [[0.0, 0, True], [2.0, 50, True], [4.0, 100, True], [6.0, 150, True]]
+    assert smart_cut.plan_smart_cut(keyframes, 0.5, 5.5) == (2.0, 4.0, 50)
+    assert smart_cut.plan_smart_cut(keyframes, 2.0, 6.0) == (2.0, 6.0, 100)
+
+
+def test_plan_skips_open_gop_keyframes():
+    keyframes = [[0.0, 0, True], [2.0, 50, False], [4.0, 100, True], [6.0, 150, False], [8.0, 200, True]]
+    assert smart_cut.plan_smart_cut(keyframes, 1.0, 7.5) is None
+    assert smart_cut.plan_smart_cut(keyframes, 1.0, 9.0) == (4.0, 8.0, 100)
+
+
+def test_plan_requires_a_long_enough_copy():
+    keyframes = [[0.0, 0, True], [2.0, 50, True], [2.5, 60, True]]
+    assert smart_cut.plan_smart_cut(keyframes, 1.0, 2.6) is None
+    assert smart_cut.plan_smart_cut(keyframes, 2.1, 2.4) is None
+
+
+def test_keyframe_index_marks_open_gops(tmp_path, monkeypatch):
+    path = tmp_path / "open_gop.mp4"
+    path.write_bytes(b"\0")
+    # 解码顺序：I0 P3 B1 B2 | I4(开放，后面跟着显示更早的 B) B3.8 P6 | I8 P9
+    packets = ["0.0,K_", "0.12,__", "0.04,__", "0.08,__", "4.0,K_", "3.96,__", "4.12,__", "8.0,K_", "8.04,__"]
+
+    class _Result:
+        returncode = 0
+        stdout = "\n".join(packets)
+        stderr = ""
+
+    monkeypatch.setattr(media_probe.subprocess, 'run', lambda *args, **kwargs: _Result())
+    monkeypatch.setattr(media_probe, 'probe', lambda *args, **kwargs: {"format": {"start_time": "0.000000"}})
+    assert media_probe.get_keyframes(str(path)) == [[0.0, 0, True], [4.0, 4, False], [8.0, 7, True]]
+
+
+def test_only_h264_is_smart_cut():
+    assert set(smart_cut.SMART_ENCODERS) == {'h264'}
+
+
+def _count_frames(path):
+    result = subprocess.run(['ffprobe', '-v', 'error', '-select_streams', 'v:0', '-count_frames',
+                             '-show_entries', 'stream=nb_read_frames,duration', '-of', 'json', path],
+                            capture_output=True, text=True, check=True)
+    return int(json.loads(result.stdout)['streams'][0]['nb_read_frames'])
+
+
+@needs_ffmpeg
+def test_smart_cut_concatenates_head_middle_and_tail(tmp_path):
+    source = str(tmp_path / "source.mp4")
+    # 25fps、每秒一个 IDR、带 B 帧：关键帧在 0,1,2,... 秒
+    subprocess.run(['ffmpeg', '-y', '-v', 'error', '-f', 'lavfi', '-i', 'testsrc=size=160x120:rate=25:duration=6',
+                    '-f', 'lavfi', '-i', 'sine=frequency=440:duration=6',
+                    '-c:v', 'libx264', '-g', '25', '-keyint_min', '25', '-sc_threshold', '0', '-bf', '2',
+                    '-pix_fmt', 'yuv420p', '-c:a', 'aac', '-shortest', source], check=True)
+    output = str(tmp_path / "cut.mp4")
+    info = smart_cut.smart_cut(source, 0.52, 4.48, output)
+
+    assert info["mode"] == "smart"
+    assert info["copied"] == pytest.approx(3.0)
+    assert info["reencoded"] == pytest.approx(0.96)
+    # 拼接后的码流能完整解码，帧数与请求区间一致（0.52s..4.48s = 99 帧）
+    decode = subprocess.run(['ffmpeg', '-v', 'error', '-i', output, '-f', 'null', '-'],
+                            capture_output=True, text=True)
+    assert decode.returncode == 0 and not decode.stderr.strip()
+    assert abs(_count_frames(output) - 99) <= 1
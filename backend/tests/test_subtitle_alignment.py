@@ -0,0 +1,170 @@
+"""
+字幕对齐回归测试：当前实现的 SRT 输出与返回值必须与重写前的实现逐字节一致。
+期望输出由 fixtures/make_alignment_golden.py 基于基线实现生成。
+"""
+import os
+import re
+import json
+
+import pytest
+
+from core import subtitle_alignment
+from fixtures.make_alignment_golden import run_case
+
+FIXTURE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'alignment_golden.json')
+
+with open(FIXTURE_PATH, 'r', encoding='utf-8') as f:
+    GOLDEN_CASES = json.load(f)
+
+
+@pytest.mark.parametrize('case', GOLDEN_CASES, ids=[case["name"] for case in GOLDEN_CASES])
+def test_char_mode_matches_baseline(case):
+    result, outputs = run_case(subtitle_alignment, case, align_mode='char')
+    assert result == case["expected"]["result"]
+    assert outputs == case["expected"]["outputs"]
+
+
+def test_golden_cases_cover_all_outputs():
+    names = [name for case in GOLDEN_CASES for name in case["expected"]["outputs"]]
+    assert any(name.endswith('_source.srt') for name in names)
+    assert any(name.endswith('_translate.srt') for name in names)
+    assert any(name.endswith('_merge.srt') for name in names)
+    assert any(not case["expected"]["outputs"] for case in GOLDEN_CASES)
+
+
+def _long_texts(words=12000, seed=1):
+    import random
+    rng = random.Random(seed)
+    vocab = [''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(2, 8))) for _ in range(3000)]
+    source = rng.choices(vocab, k=words)
+    generated = [rng.choice(vocab) if rng.random() < 0.03 else word for word in source]
+    return ' '.join(generated), ' ' + ' '.join(source)
+
+
+class _CountingPool:
+    """用线程池代替进程池，并记录提交的批次数"""
+
+    def __init__(self):
+        from concurrent.futures import ThreadPoolExecutor
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.submitted = 0
+
+    def submit(self, fn, *args):
+        self.submitted += 1
+        return self.executor.submit(fn, *args)
+
+
+@pytest.fixture
+def thread_pool(monkeypatch):
+    from core import job_queue
+    pool = _CountingPool()
+    monkeypatch.setattr(job_queue, 'get_process_pool', lambda: pool)
+    monkeypatch.setattr(job_queue, 'process_pool_workers', lambda: 1)
+    monkeypatch.setattr(subtitle_alignment, 'ANCHOR_BATCH', 1)
+    yield pool
+    pool.executor.shutdown(wait=True)
+
+
+def test_anchored_reports_progress_per_batch(thread_pool):
+    generation_text, source_text = _long_texts()
+    calls = []
+    diffs = subtitle_alignment.compute_diffs(generation_text, source_text, 'anchored',
+                                             progress_callback=lambda done, total: calls.append((done, total)))
+    total = calls[-1][1]
+    assert total > 4
+    assert calls == [(k, total) for k in range(1, total + 1)]
+    assert ''.join(text for op, text in diffs if op <= 0) == generation_text
+    assert ''.join(text for op, text in diffs if op >= 0) == source_text
+
+
+def test_anchored_stops_submitting_after_cancel(thread_pool):
+    generation_text, source_text = _long_texts()
+
+    class Cancelled(Exception):
+        pass
+
+    done_batches = []
+
+    def cancel_check():
+        done_batches.append(1)
+        if len(done_batches) == 2:
+            raise Cancelled()
+
+    with pytest.raises(Cancelled):
+        subtitle_alignment.compute_diffs(generation_text, source_text, 'anchored', cancel_check=cancel_check)
+    # 两批完成后取消：此前最多提交了 2 批 + 在途上限（2 * 进程数）
+    assert thread_pool.submitted <= 2 + 2
+
+
+def _assert_reconstructs(diffs, generation_text, source_text):
+    assert ''.join(text for op, text in diffs if op <= 0) == generation_text
+    assert ''.join(text for op, text in diffs if op >= 0) == source_text
+
+
+@pytest.mark.parametrize('generation_text, source_text', [
+    ("", ""),
+    ("", "only source"),
+    ("only generation", ""),
+    ("the quick brown fox", "the quick brown fox"),
+    ("the quick brown fox", "the slow brown dog"),
+    ("  leading and trailing  ", "leading  and\ttrailing\n"),
+    ("a a a b a a", "a b a a a a"),
+    ("词级 比较 也 支持 中文", "词级 对比 也 支持 中文 文本"),
+])
+def test_word_diffs_reconstruct_both_texts(generation_text, source_text):
+    _assert_reconstructs(subtitle_alignment.word_level_diffs(generation_text, source_text),
+                         generation_text, source_text)
+
+
+def test_word_diffs_reconstruct_random_texts():
+    import random
+    rng = random.Random(7)
+    vocab = ['a', 'an', 'the', 'cat', 'sat', 'on', 'mat', 'dog', ',', '.', 'ünï', '字幕']
+    for _ in range(200):
+        source = ' '.join(rng.choices(vocab, k=rng.randint(0, 40)))
+        words = source.split(' ')
+        generated = ' '.join(rng.choice(vocab) if rng.random() < 0.2 else w for w in words if rng.random() > 0.1)
+        _assert_reconstructs(subtitle_alignment.word_level_diffs(generated, source), generated, source)
+
+
+def test_token_id_matches_are_monotonic_and_equal():
+    import random
+    rng = random.Random(3)
+    for _ in range(200):
+        a = [rng.randint(0, 6) for _ in range(rng.randint(0, 30))]
+        b = [rng.randint(0, 6) for _ in range(rng.randint(0, 30))]
+        matches = subtitle_alignment._match_token_ids(a, b)
+        assert all(a[i] == b[j] for i, j in matches)
+        assert all(i1 < i2 and j1 < j2 for (i1, j1), (i2, j2) in zip(matches, matches[1:]))
+
+
+def test_token_ids_beyond_surrogate_range():
+    # 超过 0xD800 个不同 token 时 id 编码跳过代理区，匹配仍然正确
+    a = list(range(0xD7F0, 0xD830))
+    b = a[:10] + [0xD900] + a[10:]
+    assert subtitle_alignment._match_token_ids(a, b) == [(i, i if i < 10 else i + 1) for i in range(len(a))]
+    encoded = subtitle_alignment._encode_ids(a)
+    assert len(encoded) == len(a) and not any(0xD800 <= ord(c) <= 0xDFFF for c in encoded)
+
+
+_SRT_TIME_RE = re.compile(r'(\d+):(\d+):(\d+),(\d+)')
+WORD_MODE_MAX_DRIFT = 1.0      # word 模式与 char 模式单条字幕时间的最大偏差（秒）
+WORD_MODE_MEAN_DRIFT = 0.1     # 全部黄金用例上的平均偏差（秒）
+
+
+def _cue_times(srt):
+    return [int(h) * 3600 + int(m) * 60 + int(s) + int(ms) / 1000 for h, m, s, ms in _SRT_TIME_RE.findall(srt)]
+
+
+def test_word_mode_cue_times_stay_close_to_char_mode():
+    drifts = []
+    for case in GOLDEN_CASES:
+        _, outputs = run_case(subtitle_alignment, case, align_mode='word')
+        expected = case["expected"]["outputs"]
+        assert sorted(outputs) == sorted(expected), case["name"]
+        for name, srt in expected.items():
+            expected_times, times = _cue_times(srt), _cue_times(outputs[name])
+            assert len(times) == len(expected_times), (case["name"], name)
+            drifts.extend(abs(a - b) for a, b in zip(expected_times, times))
+    assert max(drifts) <= WORD_MODE_MAX_DRIFT
+    assert sum(drifts) / len(drifts) <= WORD_MODE_MEAN_DRIFT
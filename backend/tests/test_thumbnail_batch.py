@@ -0,0 +1,61 @@
+"""批量截图的输出命名与续跑测试（用假的截图函数代替 ffmpeg）"""
+import os
+
+import pytest
+
+from core import thumbnail_batch
+
+
+@pytest.fixture
+def fake_extract(monkeypatch):
+    calls = []
+
+    def extract(video_path, output_path, quality=2, timeout=30):
+        calls.append((video_path, output_path))
+        with open(output_path, 'w') as f:
+            f.write(video_path)
+
+    monkeypatch.setattr(thumbnail_batch, 'extract_first_frame', extract)
+    return calls
+
+
+def _make_videos(root, names):
+    for name in names:
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b'video')
+    return thumbnail_batch.scan_videos(str(root))
+
+
+def test_same_basename_gets_unique_outputs(tmp_path, fake_extract):
+    videos = _make_videos(tmp_path / "src", ["a/clip.mp4", "b/clip.mp4", "c/CLIP.mov", "other.mp4"])
+    out_dir = tmp_path / "thumbs"
+    out_dir.mkdir()
+    batch = thumbnail_batch.ThumbnailBatch(videos + videos[:1], str(out_dir), workers=4)
+    results = batch.run()
+
+    assert [r["status"] for r in results] == ["ok"] * 4
+    outputs = [call[1] for call in fake_extract]
+    assert len(outputs) == 4
+    assert len({path.casefold() for path in outputs}) == 4
+    # 扫描顺序中第一个 clip 沿用原文件名，其余同名者加哈希后缀
+    names = [os.path.basename(r["output"]) for r in results]
+    assert names[0] == "other.jpg" and names[1] == "clip.jpg"
+    assert names[2].startswith("clip_") and names[3].startswith("CLIP_")
+    for result, (video_path, _, _) in zip(results, videos):
+        with open(result["output"]) as f:
+            assert f.read() == video_path
+
+
+def test_rerun_keeps_names_and_skips(tmp_path, fake_extract):
+    videos = _make_videos(tmp_path / "src", ["a/clip.mp4", "b/clip.mp4"])
+    out_dir = tmp_path / "thumbs"
+    out_dir.mkdir()
+    first = thumbnail_batch.ThumbnailBatch(videos, str(out_dir)).run()
+    fake_extract.clear()
+
+    # 顺序颠倒后仍按清单沿用各自的输出名，全部跳过
+    second = thumbnail_batch.ThumbnailBatch(list(reversed(videos)), str(out_dir)).run()
+    assert fake_extract == []
+    assert [r["status"] for r in second] == ["skipped", "skipped"]
+    assert {r["output"] for r in second} == {r["output"] for r in first}
@@ -0,0 +1,75 @@
+"""波形峰值测试：ffmpeg 用 Python 子进程代替，探测结果用 monkeypatch 替换"""
+import os
+import sys
+import subprocess
+
+import pytest
+
+from core import waveform, media_probe
+
+VIDEO_ONLY = {"format": {}, "streams": [{"codec_type": "video", "codec_name": "h264"}]}
+WITH_AUDIO = {"format": {}, "streams": [{"codec_type": "video"}, {"codec_type": "audio"}]}
+
+
+@pytest.fixture
+def media(tmp_path, monkeypatch):
+    path = tmp_path / "clip.mp4"
+    path.write_bytes(b"\0" * 16)
+    cache = tmp_path / "cache.peaks"
+    monkeypatch.setattr(waveform, 'signature_cache_path', lambda *args: str(cache))
+    return str(path), cache
+
+
+def _fake_ffmpeg(monkeypatch, script):
+    """把 ffmpeg 命令换成执行 script 的 Python 进程，返回调用记录"""
+    calls = []
+    real_popen = subprocess.Popen
+
+    def _popen(cmd, **kwargs):
+        calls.append(cmd)
+        return real_popen([sys.executable, '-c', script], **kwargs)
+
+    monkeypatch.setattr(waveform.subprocess, 'Popen', _popen)
+    return calls
+
+
+def test_video_without_audio_returns_empty_peaks(media, monkeypatch):
+    path, cache = media
+    monkeypatch.setattr(media_probe, 'probe', lambda *args, **kwargs: VIDEO_ONLY)
+    calls = _fake_ffmpeg(monkeypatch, "raise SystemExit(1)")
+    result = waveform.get_peaks(path, num_peaks=100)
+    assert result["peaks"] == [] and result["num_samples"] == 0
+    assert calls == []
+    assert not os.path.exists(cache)
+
+
+def test_decode_failure_raises_without_caching(media, monkeypatch):
+    path, cache = media
+    monkeypatch.setattr(media_probe, 'probe', lambda *args, **kwargs: WITH_AUDIO)
+    _fake_ffmpeg(monkeypatch, "import sys; sys.stderr.write('decode error'); raise SystemExit(1)")
+    with pytest.raises(RuntimeError, match="decode error"):
+        waveform.get_peaks(path)
+    assert not os.path.exists(cache)
+
+
+def test_empty_audio_returns_empty_peaks(media, monkeypatch):
+    path, cache = media
+    monkeypatch.setattr(media_probe, 'probe', lambda *args, **kwargs: WITH_AUDIO)
+    _fake_ffmpeg(monkeypatch, "pass")
+    assert waveform.get_peaks(path)["peaks"] == []
+    assert not os.path.exists(cache)
+
+
+def test_peaks_are_cached(media, monkeypatch):
+    path, cache = media
+    monkeypatch.setattr(media_probe, 'probe', lambda *args, **kwargs: WITH_AUDIO)
+    # 1 秒 8kHz 的方波采样：前半 0.5、后半 -1.0
+    script = ("import sys, struct; n = 8000; "
+              "sys.stdout.buffer.write(struct.pack('<%df' % n, *([0.5] * (n // 2) + [-1.0] * (n // 2))))")
+    calls = _fake_ffmpeg(monkeypatch, script)
+    result = waveform.get_peaks(path, num_peaks=2)
+    assert result["num_samples"] == 8000
+    assert result["peaks"] == [0.5, 1.0]
+    assert os.path.exists(cache)
+    assert waveform.get_peaks(path, num_peaks=2)["peaks"] == [0.5, 1.0]
+    assert len(calls) == 1